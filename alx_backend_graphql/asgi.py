@@ -2,6 +2,8 @@
 ASGI config for alx_backend_graphql project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Serve it with an ASGI server, e.g. ``uvicorn alx_backend_graphql.asgi:application``,
+and set ``CRM_GRAPHQL_ASYNC = True`` so ``/graphql`` uses the async view.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
@@ -46,6 +46,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'crm.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -87,6 +88,27 @@ DATABASES = {
 }
 
 
+# Caches. The "graphql" alias holds the GraphQL response cache; in production
+# point it at Redis, e.g. {'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+# 'LOCATION': 'redis://localhost:6379/1'} with maxmemory-policy allkeys-lru.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'graphql': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'crm-graphql',
+        'OPTIONS': {'MAX_ENTRIES': 2000},
+    },
+    'persisted-queries': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'crm-persisted-queries',
+        'OPTIONS': {'MAX_ENTRIES': 1000},
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -128,9 +150,70 @@ STATIC_URL = 'static/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 GRAPHENE = {
-    "SCHEMA": "alx_backend_graphql.schema.schema"  # we’ll create this file next
+    "SCHEMA": "alx_backend_graphql.schema.schema",  # we’ll create this file next
+    "MIDDLEWARE": ["crm.profiling.ResolverProfilingMiddleware"],
 }
 
+# GraphQL transport for cron jobs and Celery tasks (crm.graphql_client):
+# "local" executes against the schema in-process, "http" posts to the URL.
+CRM_GRAPHQL_TRANSPORT = 'local'
+CRM_GRAPHQL_URL = 'http://localhost:8000/graphql'
+
+# Rows per INSERT / lookup batch in bulk mutations
+CRM_BULK_CREATE_BATCH_SIZE = 500
+
+# Rows per transaction for the streaming import (import_crm_data, /crm/import/)
+CRM_IMPORT_BATCH_SIZE = 1000
+
+# Rows per cursor fetch and response chunk for /crm/export/
+CRM_EXPORT_CHUNK_SIZE = 2000
+
+# totalCount on CRM connections: "exact", "capped", "estimate" or "cached"
+CRM_COUNT_STRATEGY = 'exact'
+CRM_COUNT_CAP = 10000
+CRM_COUNT_CACHE_SECONDS = 60
+
+# Backend for name/email filters and `search`: "auto", "fts5", "trigram" or "like"
+CRM_SEARCH_BACKEND = 'auto'
+
+# Resolver/SQL profiling (crm.profiling). Profiles go to the "crm.profiling"
+# logger and, with CRM_PROFILING_EXTENSIONS, into the GraphQL response, which
+# exposes SQL text to clients: keep that off where clients are untrusted.
+CRM_PROFILING = False
+CRM_PROFILING_SAMPLE_RATE = 1.0
+CRM_PROFILING_EXTENSIONS = False
+
+# Cache query responses on /graphql (crm.response_cache) for this many seconds;
+# writes to customers, products or orders invalidate them earlier. With several
+# worker processes the cache must be shared (Redis/Memcached, see CACHES).
+CRM_RESPONSE_CACHE = False
+CRM_RESPONSE_CACHE_ALIAS = 'graphql'
+CRM_RESPONSE_CACHE_TIMEOUT = 30
+
+# Parsed and validated GraphQL documents kept per process (crm.documents), and
+# the cache holding persisted queries (hash -> document) shared by all processes,
+# apart from the response cache, with the seconds a registered query is kept.
+CRM_DOCUMENT_CACHE_SIZE = 500
+CRM_PERSISTED_QUERY_CACHE_ALIAS = 'persisted-queries'
+CRM_PERSISTED_QUERY_TIMEOUT = 86400
+
+# Page size of CRM connections without first/last, and the largest allowed.
+CRM_DEFAULT_PAGE_SIZE = 100
+CRM_MAX_PAGE_SIZE = 100
+
+# Operations on /graphql estimated to resolve more objects, or nest object
+# fields deeper, are rejected before execution (crm.query_cost; None = no limit).
+CRM_QUERY_MAX_COST = 20000
+CRM_QUERY_MAX_DEPTH = 6
+CRM_QUERY_COST_EXTENSIONS = True
+
+# Serve /graphql with the async view (crm.views.AsyncCRMGraphQLView); turn on
+# when running under ASGI (alx_backend_graphql.asgi). The top-level fields of a
+# query then resolve concurrently on a pool of this many threads, each thread
+# with its own database connection.
+CRM_GRAPHQL_ASYNC = False
+CRM_GRAPHQL_ASYNC_THREADS = 8
+
 # Cron Jobs Configuration
 CRONJOBS = [
     ('*/5 * * * *', 'crm.cron.log_crm_heartbeat'),
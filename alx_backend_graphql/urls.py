@@ -14,14 +14,18 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
 from django.contrib import admin
-from django.urls import path
-from graphene_django.views import GraphQLView
+from django.urls import include, path
+from crm.views import AsyncCRMGraphQLView, CRMGraphQLView
 from django.views.decorators.csrf import csrf_exempt
 from .schema import schema
 
+GraphQLView = AsyncCRMGraphQLView if settings.CRM_GRAPHQL_ASYNC else CRMGraphQLView
+
 urlpatterns = [
     path("graphql", csrf_exempt(GraphQLView.as_view(graphiql=True, schema=schema))),
+    path("crm/", include("crm.urls")),
     path("admin/", admin.site.urls),
 ]
 
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Compare BulkCreateCustomers against the old row-by-row path.
+
+Runs against a throwaway test database:
+
+    python benchmarks/bulk_create_customers.py 1000 10000 100000
+"""
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "alx_backend_graphql.settings")
+
+import django
+
+django.setup()
+
+from types import SimpleNamespace
+
+from django.db import connection
+
+from alx_backend_graphql.schema import schema
+from crm.models import Customer
+
+MUTATION = """
+mutation Bulk($customers: [CustomerInput]) {
+    bulkCreateCustomers(customers: $customers) {
+        errors
+    }
+}
+"""
+
+
+def payload(size, prefix):
+    return [
+        {"name": f"Customer {i}", "email": f"{prefix}{i}@example.com"}
+        for i in range(size)
+    ]
+
+
+def row_by_row(customers):
+    """The previous mutation body: an exists() and a save() per input."""
+    for c in customers:
+        if Customer.objects.filter(email=c["email"]).exists():
+            continue
+        Customer(name=c["name"], email=c["email"]).save()
+
+
+def bulk(customers):
+    result = schema.execute(
+        MUTATION,
+        variable_values={"customers": customers},
+        context_value=SimpleNamespace(),
+    )
+    assert result.errors is None, result.errors
+
+
+def timed(fn, customers):
+    Customer.objects.all().delete()
+    started = time.perf_counter()
+    fn(customers)
+    return time.perf_counter() - started
+
+
+def main(sizes):
+    connection.creation.create_test_db(verbosity=0)
+    print(f"{'rows':>8} {'row-by-row':>12} {'bulk':>10} {'speedup':>8}")
+    for size in sizes:
+        before = timed(row_by_row, payload(size, "old"))
+        after = timed(bulk, payload(size, "new"))
+        print(f"{size:>8} {before:>11.3f}s {after:>9.3f}s {before / after:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [1000, 10000, 100000])
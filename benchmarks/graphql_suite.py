@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+Benchmark representative GraphQL operations at several dataset sizes.
+
+Seeds a throwaway test database for each scale (number of orders) with the
+``generate_crm_data`` command, runs every operation against
+``alx_backend_graphql.schema.schema`` and reports latency percentiles, SQL
+queries per call and peak Python memory. Results are compared with a stored
+baseline; any regression makes the script exit non-zero:
+
+    python benchmarks/graphql_suite.py                      # 10k and 100k orders
+    python benchmarks/graphql_suite.py --scales 10000 100000 1000000
+    python benchmarks/graphql_suite.py --update-baseline    # record new numbers
+
+Latency is machine dependent, so refresh the baseline on the machine (or CI
+runner) that runs the comparison. Query counts do not depend on the machine
+and are compared exactly.
+"""
+import argparse
+import io
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "alx_backend_graphql.settings")
+
+import django
+
+django.setup()
+
+from types import SimpleNamespace
+
+from django.core.management import call_command
+from django.db import connection
+from django.utils import timezone
+
+from alx_backend_graphql.schema import schema
+from crm.models import Customer, Product
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+SEED = 20240601
+PRODUCTS = 500
+
+
+def seed(orders):
+    """Generate ``orders`` orders, a fifth as many customers and 500 products."""
+    call_command(
+        "generate_crm_data",
+        "--orders", str(orders),
+        "--customers", str(max(orders // 5, 1)),
+        "--products", str(PRODUCTS),
+        "--seed", str(SEED),
+        stdout=io.StringIO(),
+    )
+
+
+# Each operation returns (document, variables) for one call; ``rng`` is
+# seeded per operation so every run issues the same sequence of calls.
+
+def filtered_orders(rng):
+    return """
+        query($min: Decimal, $since: Date) {
+            allOrders(first: 50, totalAmount_Gte: $min, orderDate_Gte: $since, orderBy: ["-order_date"]) {
+                edges { node { id totalAmount orderDate } }
+            }
+        }
+    """, {
+        "min": str(rng.choice([50, 200, 400])),
+        "since": (timezone.now() - timedelta(days=rng.randint(30, 700))).date().isoformat(),
+    }
+
+
+def nested_orders(rng):
+    return """
+        query($after: String) {
+            allOrders(first: 50, after: $after) {
+                edges {
+                    node {
+                        totalAmount
+                        customer { name email }
+                        products { edges { node { name price } } }
+                    }
+                }
+            }
+        }
+    """, {"after": None}
+
+
+def create_order(rng):
+    customer = Customer.objects.order_by("pk").values_list("pk", flat=True)[rng.randrange(100)]
+    return """
+        mutation($customer: ID!, $items: [OrderItemInput!]) {
+            createOrder(customerId: $customer, items: $items) { order { id totalAmount } }
+        }
+    """, {
+        "customer": str(customer),
+        "items": [{"productId": str(pk), "quantity": 1} for pk in rng.sample(range(1, 101), 2)],
+    }
+
+
+def bulk_create_customers(rng):
+    token = rng.getrandbits(64)
+    return """
+        mutation($customers: [CustomerInput]) {
+            bulkCreateCustomers(customers: $customers) { errors }
+        }
+    """, {
+        "customers": [
+            {"name": f"Bench {i}", "email": f"bench{token}.{i}@example.com"} for i in range(100)
+        ]
+    }
+
+
+def update_low_stock(rng):
+    # Put the same 50 products back under the threshold before each call.
+    Product.objects.filter(pk__lte=50).update(stock=5)
+    return """
+        mutation { updateLowStockProducts(threshold: 10, incrementBy: 10) { message } }
+    """, {}
+
+
+OPERATIONS = {
+    "filtered_all_orders": filtered_orders,
+    "nested_orders": nested_orders,
+    "create_order": create_order,
+    "bulk_create_customers": bulk_create_customers,
+    "update_low_stock_products": update_low_stock,
+}
+
+
+def run(document, variables):
+    result = schema.execute(document, variable_values=variables, context_value=SimpleNamespace())
+    assert result.errors is None, result.errors
+
+
+def measure(prepare, repeat):
+    rng = random.Random(SEED)
+    # Keep stock high enough for createOrder whatever the repeat count.
+    Product.objects.filter(pk__lte=100).update(stock=1_000_000)
+    run(*prepare(rng))  # warm-up: schema build, caches, connection
+
+    queries = []
+    count = [0]
+
+    def counter(execute, sql, params, many, context):
+        count[0] += 1
+        return execute(sql, params, many, context)
+
+    latencies = []
+    with connection.execute_wrapper(counter):
+        for _ in range(repeat):
+            document, variables = prepare(rng)
+            count[0] = 0
+            started = time.perf_counter()
+            run(document, variables)
+            latencies.append((time.perf_counter() - started) * 1000)
+            queries.append(count[0])
+
+    # Memory is traced on a separate call; tracing slows everything down.
+    document, variables = prepare(rng)
+    tracemalloc.start()
+    run(document, variables)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {
+        "p50_ms": round(statistics.median(latencies), 2),
+        "p95_ms": round(cuts[94], 2),
+        "p99_ms": round(cuts[98], 2),
+        "queries": max(queries),
+        "peak_kb": round(peak / 1024, 1),
+    }
+
+
+def compare(results, baseline, tolerance, slack_ms):
+    """Return a list of regressions against ``baseline``.
+
+    Latency is judged on the median, which is far steadier than the tail on
+    a shared machine, and may exceed the baseline by ``tolerance`` plus
+    ``slack_ms``; peak memory by ``tolerance``. Query counts must not grow.
+    """
+    regressions = []
+    for scale, operations in results.items():
+        for name, current in operations.items():
+            before = baseline.get(scale, {}).get(name)
+            if not before:
+                continue
+            if current["queries"] > before["queries"]:
+                regressions.append(f"{scale} {name}: queries {before['queries']} -> {current['queries']}")
+            limits = {
+                "p50_ms": before["p50_ms"] * (1 + tolerance) + slack_ms,
+                "peak_kb": before["peak_kb"] * (1 + tolerance),
+            }
+            for metric, limit in limits.items():
+                if current[metric] > limit:
+                    regressions.append(
+                        f"{scale} {name}: {metric} {before[metric]} -> {current[metric]}"
+                    )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--scales", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=30)
+    parser.add_argument("--only", nargs="+", choices=sorted(OPERATIONS))
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Allowed relative growth of median latency and memory (default 0.25).")
+    parser.add_argument("--slack-ms", type=float, default=2.0,
+                        help="Extra latency allowed on top of --tolerance (default 2ms).")
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args()
+
+    operations = {name: OPERATIONS[name] for name in args.only or OPERATIONS}
+    results = {}
+    print(f"{'orders':>8} {'operation':<26} {'p50':>9} {'p95':>9} {'p99':>9} {'queries':>8} {'peak':>10}")
+    for scale in args.scales:
+        old_name = connection.settings_dict["NAME"]
+        connection.creation.create_test_db(verbosity=0)
+        started = time.perf_counter()
+        seed(scale)
+        print(f"# seeded {scale} orders in {time.perf_counter() - started:.1f}s")
+        results[str(scale)] = {}
+        for name, prepare in operations.items():
+            row = measure(prepare, args.repeat)
+            results[str(scale)][name] = row
+            print(
+                f"{scale:>8} {name:<26} {row['p50_ms']:>7.2f}ms {row['p95_ms']:>7.2f}ms "
+                f"{row['p99_ms']:>7.2f}ms {row['queries']:>8} {row['peak_kb']:>8.1f}kB"
+            )
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    if args.update_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as handle:
+                baseline = json.load(handle)
+        for scale, operations_ in results.items():
+            baseline.setdefault(scale, {}).update(operations_)
+        with open(args.baseline, "w") as handle:
+            json.dump(baseline, handle, indent=2, sort_keys=True)
+            handle.write("\n")
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("No baseline to compare with; run with --update-baseline.")
+        return 0
+    with open(args.baseline) as handle:
+        regressions = compare(results, json.load(handle), args.tolerance, args.slack_ms)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    if not regressions:
+        print("No regressions against the baseline.")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+
+@register(Tags.caches)
+def check_response_cache_backend(app_configs, **kwargs):
+    """The response cache must be shared by every worker process."""
+    if not getattr(settings, "CRM_RESPONSE_CACHE", False):
+        return []
+    alias = getattr(settings, "CRM_RESPONSE_CACHE_ALIAS", "default")
+    backend = settings.CACHES.get(alias, {}).get("BACKEND", "")
+    if not backend.endswith(".LocMemCache"):
+        return []
+    return [Warning(
+        f"CRM_RESPONSE_CACHE uses the local-memory cache '{alias}'.",
+        hint=(
+            "Each process has its own copy, so a write invalidates the cached responses of "
+            "its own process only. Point the cache at Redis or Memcached when running more "
+            "than one worker process."
+        ),
+        id="crm.W001",
+    )]
@@ -0,0 +1,132 @@
+"""
+``totalCount`` for the CRM connections, with selectable counting strategies.
+
+An exact ``COUNT(*)`` over a large filtered table can cost more than the page
+itself, so clients (or the ``CRM_COUNT_STRATEGY`` setting) can pick:
+
+* ``EXACT``    -- ``COUNT(*)``.
+* ``CAPPED``   -- count at most ``CRM_COUNT_CAP`` rows ("at least 10,000").
+* ``ESTIMATE`` -- the query planner's row estimate (PostgreSQL only; other
+  backends fall back to ``CAPPED``).
+* ``CACHED``   -- an exact count cached for ``CRM_COUNT_CACHE_SECONDS``, keyed
+  by the filtered query itself.
+
+When the page itself already needed an exact count (``last`` pagination)
+that count is reused whatever the strategy. The connection reports the
+strategy that actually produced the number and whether it is exact.
+"""
+import hashlib
+import json
+
+import graphene
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+
+class CountStrategy(graphene.Enum):
+    EXACT = "exact"
+    CAPPED = "capped"
+    ESTIMATE = "estimate"
+    CACHED = "cached"
+
+
+def get_default_strategy():
+    return getattr(settings, "CRM_COUNT_STRATEGY", CountStrategy.EXACT.value)
+
+
+def count_exact(queryset):
+    return queryset.count(), CountStrategy.EXACT.value, True
+
+
+def count_capped(queryset):
+    cap = getattr(settings, "CRM_COUNT_CAP", 10000)
+    # COUNT(*) over a LIMIT subquery stops scanning after cap + 1 rows.
+    count = queryset[:cap + 1].count()
+    if count > cap:
+        return cap, CountStrategy.CAPPED.value, False
+    return count, CountStrategy.CAPPED.value, True
+
+
+def count_estimate(queryset):
+    connection = connections[queryset.db]
+    if connection.vendor != "postgresql":
+        return count_capped(queryset)
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"]), CountStrategy.ESTIMATE.value, False
+
+
+def count_cached(queryset):
+    sql, params = queryset.order_by().query.sql_with_params()
+    digest = hashlib.sha1(
+        json.dumps([queryset.db, sql, params], default=str).encode()
+    ).hexdigest()
+    key = f"crm:count:{queryset.model._meta.label_lower}:{digest}"
+    count = cache.get(key)
+    if count is None:
+        count = queryset.count()
+        cache.set(key, count, getattr(settings, "CRM_COUNT_CACHE_SECONDS", 60))
+    return count, CountStrategy.CACHED.value, False
+
+
+STRATEGIES = {
+    CountStrategy.EXACT.value: count_exact,
+    CountStrategy.CAPPED.value: count_capped,
+    CountStrategy.ESTIMATE.value: count_estimate,
+    CountStrategy.CACHED.value: count_cached,
+}
+
+
+def count_connection(connection):
+    """Return ``(count, strategy, exact)`` for a resolved connection."""
+    iterable = getattr(connection, "iterable", None)
+    length = getattr(connection, "length", None)
+    strategy = getattr(connection, "requested_count_strategy", None) or get_default_strategy()
+    strategy = getattr(strategy, "value", strategy)
+    if iterable is None:
+        return len(connection.edges), CountStrategy.EXACT.value, True
+    if isinstance(iterable, list):
+        if not getattr(iterable, "complete", True):
+            # Only the leading rows were loaded (see crm.loaders.LeadingRows).
+            return STRATEGIES[strategy](iterable.queryset)
+        return len(iterable), CountStrategy.EXACT.value, True
+    if length is not None:
+        # The page already paid for an exact count.
+        return length, CountStrategy.EXACT.value, True
+    return STRATEGIES[strategy](iterable)
+
+
+class CRMConnection(graphene.relay.Connection):
+    """Relay connection with an on-demand ``totalCount``."""
+
+    total_count = graphene.Int(
+        description="Number of rows matching the filters, computed with countStrategy."
+    )
+    count_strategy = graphene.Field(
+        CountStrategy, description="Strategy that produced totalCount."
+    )
+    total_count_is_exact = graphene.Boolean(
+        description="False when totalCount is capped, estimated or cached."
+    )
+
+    class Meta:
+        abstract = True
+
+    def _count(self):
+        if not hasattr(self, "_count_result"):
+            self._count_result = count_connection(self)
+        return self._count_result
+
+    def resolve_total_count(self, info):
+        return self._count()[0]
+
+    def resolve_count_strategy(self, info):
+        return self._count()[1]
+
+    def resolve_total_count_is_exact(self, info):
+        return self._count()[2]
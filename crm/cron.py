@@ -5,9 +5,7 @@ import os
 import sys
 import django
 from datetime import datetime
-from gql import Client, gql
-from gql.transport.requests import RequestsHTTPTransport
-import requests
+from crm.graphql_client import execute
 
 def log_crm_heartbeat():
     """
@@ -23,10 +21,10 @@ def log_crm_heartbeat():
         with open('/tmp/crm_heartbeat_log.txt', 'a') as f:
             f.write(log_message)
         
-        # Optionally verify GraphQL endpoint is responsive using gql
+        # Optionally verify the GraphQL schema is responsive
         try:
             # Simple GraphQL query to test endpoint
-            query = gql("""
+            query = """
             query {
                 allCustomers {
                     edges {
@@ -37,19 +35,9 @@ def log_crm_heartbeat():
                     }
                 }
             }
-            """)
+            """
             
-            transport = RequestsHTTPTransport(
-                url="http://localhost:8000/graphql",
-                headers={"Content-Type": "application/json"},
-                use_json=True,
-                verify=True,
-                retries=2,
-                timeout=5,
-            )
-            
-            client = Client(transport=transport, fetch_schema_from_transport=False)
-            result = client.execute(query)
+            result = execute(query, timeout=5)
             
             # Log successful GraphQL response
             with open('/tmp/crm_heartbeat_log.txt', 'a') as f:
@@ -69,29 +57,19 @@ def log_crm_heartbeat():
             pass  # If we can't even log the error, just continue
 
 def update_low_stock():
-    """Call GraphQL mutation to update low stock products and log results using gql."""
+    """Call GraphQL mutation to update low stock products and log results."""
     timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    mutation = gql("""
+    mutation = """
     mutation UpdateLowStock {
       updateLowStockProducts {
         products { name stock }
         message
       }
     }
-    """)
+    """
     
     try:
-        transport = RequestsHTTPTransport(
-            url="http://localhost:8000/graphql",
-            headers={"Content-Type": "application/json"},
-            use_json=True,
-            verify=True,
-            retries=2,
-            timeout=15,
-        )
-        
-        client = Client(transport=transport, fetch_schema_from_transport=False)
-        result = client.execute(mutation)
+        result = execute(mutation, timeout=15)
         
         data = result.get('updateLowStockProducts', {})
         products = data.get('products', [])
@@ -7,9 +7,7 @@ Queries GraphQL endpoint for orders within the last 7 days and logs reminders
 import os
 import sys
 import django
-from datetime import datetime
-from gql import Client, gql
-from gql.transport.requests import RequestsHTTPTransport
+from datetime import datetime, timedelta
 
 # Add the project directory to Python path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
@@ -18,13 +16,32 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'alx_backend_graphql.settings')
 django.setup()
 
+from django.conf import settings
+from django.utils import timezone
+
+from crm.graphql_client import execute
+
+LOG_FILE = '/tmp/order_reminders_log.txt'
+# The largest page the connections accept
+PAGE_SIZE = getattr(settings, "CRM_MAX_PAGE_SIZE", 100)
+WINDOW_DAYS = 7
+
+
 def send_order_reminders():
-    """Query GraphQL for recent orders and log reminders"""
+    """Query GraphQL for orders from the last 7 days and log reminders"""
 
-    query = gql(
-        """
-        query GetRecentOrders {
-            allOrders(orderBy: ["-order_date"]) {
+    query = """
+        query GetRecentOrders($since: Date!, $first: Int!, $after: String) {
+            allOrders(
+                orderDate_Gte: $since
+                orderBy: ["-order_date", "-id"]
+                first: $first
+                after: $after
+            ) {
+                pageInfo {
+                    hasNextPage
+                    endCursor
+                }
                 edges {
                     node {
                         id
@@ -34,48 +51,46 @@ def send_order_reminders():
                 }
             }
         }
-        """
-    )
-
-    transport = RequestsHTTPTransport(
-        url="http://localhost:8000/graphql",
-        headers={"Content-Type": "application/json"},
-        use_json=True,
-        verify=True,
-        retries=2,
-        timeout=10,
-    )
-
-    client = Client(transport=transport, fetch_schema_from_transport=False)
+    """
 
     timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    since = (timezone.now() - timedelta(days=WINDOW_DAYS)).date().isoformat()
     orders_processed = 0
 
-    try:
-        result = client.execute(query)
-        edges = result.get('allOrders', {}).get('edges', [])
-
-        for edge in edges:
-            node = edge.get('node', {})
-            order_id = node.get('id')
-            order_date_str = node.get('orderDate')
-            customer_email = (node.get('customer') or {}).get('email')
-
-            # Log only if we have minimal required fields; server filters last 7 days downstream or we accept all and rely on app logic elsewhere
-            if order_id and customer_email and order_date_str:
-                log_message = f"[{timestamp}] Order ID: {order_id}, Customer: {customer_email}\n"
-                with open('/tmp/order_reminders_log.txt', 'a') as f:
-                    f.write(log_message)
-                orders_processed += 1
-
-        with open('/tmp/order_reminders_log.txt', 'a') as f:
-            f.write(f"[{timestamp}] Order reminders processed! {orders_processed} recent orders found.\n")
-
-        print("Order reminders processed!")
-    except Exception as e:
-        with open('/tmp/order_reminders_log.txt', 'a') as f:
-            f.write(f"[{timestamp}] Error processing reminders: {str(e)}\n")
-        raise
+    # One buffered handle for the whole run instead of a reopen per order
+    with open(LOG_FILE, 'a') as log:
+        try:
+            after = None
+            while True:
+                result = execute(
+                    query,
+                    {"since": since, "first": PAGE_SIZE, "after": after},
+                    timeout=10,
+                )
+                connection = result.get('allOrders') or {}
+
+                for edge in connection.get('edges', []):
+                    node = edge.get('node', {})
+                    order_id = node.get('id')
+                    order_date_str = node.get('orderDate')
+                    customer_email = (node.get('customer') or {}).get('email')
+
+                    # Log only if we have minimal required fields
+                    if order_id and customer_email and order_date_str:
+                        log.write(f"[{timestamp}] Order ID: {order_id}, Customer: {customer_email}\n")
+                        orders_processed += 1
+
+                page_info = connection.get('pageInfo') or {}
+                if not page_info.get('hasNextPage'):
+                    break
+                after = page_info.get('endCursor')
+
+            log.write(f"[{timestamp}] Order reminders processed! {orders_processed} recent orders found.\n")
+
+            print("Order reminders processed!")
+        except Exception as e:
+            log.write(f"[{timestamp}] Error processing reminders: {str(e)}\n")
+            raise
 
 if __name__ == "__main__":
     send_order_reminders()
@@ -0,0 +1,155 @@
+"""
+Parsed-document cache and persisted queries.
+
+Clients send the same few documents over and over, so the ``/graphql``
+view, the response cache and the in-process client (``crm.graphql_client``)
+all get their AST from :func:`get_document`. It parses a query once per
+process and keeps the result in an LRU of ``CRM_DOCUMENT_CACHE_SIZE``
+entries, keyed by the SHA-256 of the query text. Each entry also remembers
+its validation errors for every schema and rule set it was checked against,
+so a hot document is neither parsed nor validated again.
+
+Persisted queries follow the automatic persisted query protocol used by
+Apollo clients: a request carries
+``extensions.persistedQuery.sha256Hash`` and no ``query``. If the hash is
+unknown, the response is a ``PersistedQueryNotFound`` error. The client
+then resends the query with the hash. The server checks the hash and, once
+the document has passed validation and the cost limits, registers it.
+Registered queries live in their own ``CRM_PERSISTED_QUERY_CACHE_ALIAS``
+cache for ``CRM_PERSISTED_QUERY_TIMEOUT`` seconds, so clients cannot evict
+cached responses by registering documents. Hashes resolve from that cache
+only; the AST of a resolved query still comes from the LRU.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from graphql import GraphQLError, parse, validate
+
+PERSISTED_QUERY_NOT_FOUND = "PersistedQueryNotFound"
+
+
+def document_hash(query):
+    return hashlib.sha256(query.encode()).hexdigest()
+
+
+class Document:
+    """A query's AST, with its validation errors per schema and rule set."""
+
+    __slots__ = ("query", "ast", "parse_errors", "validations")
+
+    def __init__(self, query):
+        self.query = query
+        try:
+            self.ast = parse(query)
+            self.parse_errors = []
+        except GraphQLError as error:
+            self.ast = None
+            self.parse_errors = [error]
+        self.validations = {}
+
+    def validate(self, schema, rules=None):
+        """Errors that stop the document from executing; empty if none."""
+        if self.parse_errors:
+            return self.parse_errors
+        key = (id(schema), tuple(rules) if rules else None)
+        errors = self.validations.get(key)
+        if errors is None:
+            # Racing threads may both validate; the results are identical.
+            errors = self.validations[key] = validate(schema, self.ast, rules)
+        return errors
+
+
+class DocumentCache:
+    """Thread-safe LRU of :class:`Document` by query hash."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, query_hash):
+        with self.lock:
+            document = self.entries.get(query_hash)
+            if document is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.entries.move_to_end(query_hash)
+            return document
+
+    def put(self, query_hash, document):
+        with self.lock:
+            self.entries[query_hash] = document
+            self.entries.move_to_end(query_hash)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = self.misses = 0
+
+
+_documents = DocumentCache(getattr(settings, "CRM_DOCUMENT_CACHE_SIZE", 500))
+
+
+def get_document_cache():
+    return _documents
+
+
+def get_document(query):
+    """Parsed :class:`Document` for ``query``, from the LRU when possible."""
+    query_hash = document_hash(query)
+    document = _documents.get(query_hash)
+    if document is None:
+        document = Document(query)
+        _documents.put(query_hash, document)
+    return document
+
+
+def _store():
+    return caches[getattr(settings, "CRM_PERSISTED_QUERY_CACHE_ALIAS", "default")]
+
+
+def _store_key(query_hash):
+    return f"crm:gql:persisted:{query_hash}"
+
+
+def verify(query, query_hash):
+    """Raise ValueError unless ``query_hash`` is the hash of ``query``."""
+    if query_hash.lower() != document_hash(query):
+        raise ValueError("provided sha does not match query")
+
+
+def register(query):
+    """Persist ``query``, a document that validated, and return its hash."""
+    query_hash = document_hash(query)
+    _store().set(
+        _store_key(query_hash), query, getattr(settings, "CRM_PERSISTED_QUERY_TIMEOUT", 86400)
+    )
+    return query_hash
+
+
+def lookup(query_hash):
+    """Query text registered for ``query_hash``, or None."""
+    # Not the LRU: it also holds documents that were never registered,
+    # such as those that failed validation or the cost limits.
+    return _store().get(_store_key(query_hash.lower()))
+
+
+def persisted_query_hash(extensions):
+    """The ``sha256Hash`` of a request's ``extensions``, or None."""
+    persisted = (extensions or {}).get("persistedQuery")
+    if not isinstance(persisted, dict):
+        return None
+    if persisted.get("version", 1) != 1:
+        raise ValueError("Unsupported persisted query version.")
+    query_hash = persisted.get("sha256Hash")
+    if not isinstance(query_hash, str) or not query_hash:
+        raise ValueError("persistedQuery needs a sha256Hash.")
+    return query_hash
@@ -0,0 +1,125 @@
+"""
+Streaming CSV/NDJSON export of customers, products and orders.
+
+Rows are filtered with the same FilterSets as the GraphQL connections and
+read with ``QuerySet.iterator(chunk_size=...)``, which uses a server-side
+cursor where the database has one. Related data is fetched once per chunk
+(a join for an order's customer, one prefetch query for its items), and
+each chunk is encoded and handed to the response before the next is read,
+so memory does not grow with the size of the export.
+"""
+import csv
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Prefetch
+
+from crm.filters import CustomerFilter, OrderFilter, ProductFilter
+from crm.models import Customer, Order, OrderItem, Product
+
+FORMATS = ("csv", "ndjson")
+
+
+class Exporter:
+    model = None
+    filterset_class = None
+    columns = ()
+
+    def get_queryset(self):
+        return self.model.objects.order_by("pk")
+
+    def row(self, instance):
+        return {column: getattr(instance, column) for column in self.columns}
+
+    def csv_row(self, instance):
+        return list(self.row(instance).values())
+
+
+class CustomerExporter(Exporter):
+    model = Customer
+    filterset_class = CustomerFilter
+    columns = ("id", "name", "email", "phone", "created_at")
+
+    def get_queryset(self):
+        return super().get_queryset().only(*self.columns)
+
+
+class ProductExporter(Exporter):
+    model = Product
+    filterset_class = ProductFilter
+    columns = ("id", "name", "price", "stock")
+
+
+class OrderExporter(Exporter):
+    model = Order
+    filterset_class = OrderFilter
+    columns = (
+        "id", "customer_id", "customer_name", "customer_email",
+        "order_date", "total_amount", "items",
+    )
+
+    def get_queryset(self):
+        items = OrderItem.objects.select_related("product").only(
+            "order_id", "quantity", "product__name"
+        ).order_by("product_id")
+        return (
+            super().get_queryset()
+            .select_related("customer")
+            .only("order_date", "total_amount", "customer__name", "customer__email")
+            .prefetch_related(Prefetch("items", queryset=items))
+        )
+
+    def row(self, order):
+        return {
+            "id": order.pk,
+            "customer_id": order.customer_id,
+            "customer_name": order.customer.name,
+            "customer_email": order.customer.email,
+            "order_date": order.order_date,
+            "total_amount": order.total_amount,
+            "items": [
+                {"product_id": item.product_id, "product_name": item.product.name, "quantity": item.quantity}
+                for item in order.items.all()
+            ],
+        }
+
+    def csv_row(self, order):
+        row = self.row(order)
+        # One cell: "product_id:quantity;..."
+        row["items"] = ";".join(f"{item['product_id']}:{item['quantity']}" for item in row["items"])
+        return list(row.values())
+
+
+EXPORTERS = {
+    "customers": CustomerExporter,
+    "products": ProductExporter,
+    "orders": OrderExporter,
+}
+
+
+class _Buffer:
+    """File-like sink that hands back what csv.writer writes to it."""
+
+    def write(self, value):
+        return value
+
+
+def stream_rows(exporter, queryset, format, chunk_size):
+    """Yield the encoded export, one chunk of rows at a time."""
+    writer = csv.writer(_Buffer())
+
+    def encode(instance):
+        if format == "csv":
+            return writer.writerow(exporter.csv_row(instance))
+        return json.dumps(exporter.row(instance), cls=DjangoJSONEncoder) + "\n"
+
+    if format == "csv":
+        yield writer.writerow(exporter.columns)
+    chunk = []
+    for instance in queryset.iterator(chunk_size=chunk_size):
+        chunk.append(encode(instance))
+        if len(chunk) >= chunk_size:
+            yield "".join(chunk)
+            chunk = []
+    if chunk:
+        yield "".join(chunk)
@@ -0,0 +1,173 @@
+from functools import partial
+
+import graphene
+from django.conf import settings
+from django.db.models import QuerySet
+from graphene_django.filter import DjangoFilterConnectionField
+from graphene_django.utils import maybe_queryset
+from graphene.relay.connection import connection_adapter, page_info_adapter
+from graphql_relay import connection_from_array_slice, cursor_to_offset, offset_to_cursor
+
+from crm.counting import CountStrategy
+from crm.loaders import get_loaders
+from crm.pagination import paginate_keyset
+
+# Arguments that shape the page rather than filter rows.
+CONNECTION_ARGS = frozenset(
+    ["first", "last", "before", "after", "offset", "count_strategy"]
+)
+
+
+def is_filtered(args):
+    """True when connection ``args`` carry anything besides pagination."""
+    return any(name not in CONNECTION_ARGS for name in args)
+
+
+def page_end(args):
+    """
+    Rows a list must hold, counted from its start, to serve the page
+    ``args`` ask for plus the row telling whether a next page exists; None
+    when the page is counted back from the end (``last`` or ``before``).
+    """
+    if args.get("first") is None or args.get("last") is not None or args.get("before"):
+        return None
+    after_offset = cursor_to_offset(args["after"]) if args.get("after") else None
+    slice_start = after_offset + 1 if after_offset is not None else 0
+    return slice_start + (args.get("offset") or 0) + args["first"] + 1
+
+
+class CRMConnectionField(DjangoFilterConnectionField):
+    """
+    Filter connection that cooperates with the request loaders.
+
+    Every resolved page is queued on the loaders so nested relations of its
+    nodes are fetched in one batch, and lists already produced by a loader
+    are paginated as-is instead of being run through the filterset.
+
+    ``order_by`` is exposed as a real ``orderBy`` argument for the resolver;
+    DjangoFilterConnectionField would otherwise swallow the keyword. With
+    ``keyset=True`` the field also takes a ``keyset`` argument that switches
+    the request to seek pagination (see :mod:`crm.pagination`).
+
+    Offset pages that do not ask for ``last`` are read with ``LIMIT first + 1``
+    instead of a ``COUNT(*)``; ``totalCount`` is only computed when selected,
+    using ``countStrategy`` (see :mod:`crm.counting`).
+
+    A page without ``first`` or ``last`` holds ``CRM_DEFAULT_PAGE_SIZE``
+    rows; asking for more than ``CRM_MAX_PAGE_SIZE`` is an error.
+    """
+
+    def __init__(self, type_, *args, order_by=None, keyset=False, **kwargs):
+        kwargs.setdefault("max_limit", getattr(settings, "CRM_MAX_PAGE_SIZE", 100))
+        extra_args = dict(kwargs.get("args") or {})
+        extra_args["count_strategy"] = graphene.Argument(
+            CountStrategy,
+            description="How totalCount is computed; defaults to the CRM_COUNT_STRATEGY setting.",
+        )
+        if order_by is not None:
+            extra_args["order_by"] = order_by
+        if keyset:
+            extra_args["keyset"] = graphene.Boolean(
+                default_value=False,
+                description="Use keyset cursors that seek on the sort key instead of an offset.",
+            )
+        kwargs["args"] = extra_args
+        super().__init__(type_, *args, **kwargs)
+
+    @classmethod
+    def resolve_queryset(
+        cls, connection, iterable, info, args, filtering_args, filterset_class
+    ):
+        if isinstance(iterable, list):
+            return iterable
+        return super().resolve_queryset(
+            connection, iterable, info, args, filtering_args, filterset_class
+        )
+
+    @classmethod
+    def resolve_connection(cls, connection, args, iterable, max_limit=None):
+        iterable = maybe_queryset(iterable)
+        if not isinstance(iterable, QuerySet):
+            result = super().resolve_connection(connection, args, iterable, max_limit=max_limit)
+        elif args.get("keyset"):
+            result = paginate_keyset(connection, iterable, args, max_limit=max_limit)
+        elif args.get("last") is not None:
+            # Paging back from the end needs the total up front.
+            result = super().resolve_connection(connection, args, iterable, max_limit=max_limit)
+        else:
+            result = cls.resolve_connection_without_count(
+                connection, args, iterable, max_limit=max_limit
+            )
+        result.requested_count_strategy = args.get("count_strategy")
+        return result
+
+    @classmethod
+    def resolve_connection_without_count(cls, connection, args, queryset, max_limit=None):
+        # Same offset and cursor handling as DjangoConnectionField, but the
+        # slice is read with one extra row to learn whether a next page exists.
+        offset = args.pop("offset", None)
+        after = args.get("after")
+        if offset:
+            if after:
+                offset += cursor_to_offset(after) + 1
+            args["after"] = offset_to_cursor(offset - 1)
+        if max_limit is not None and args.get("first") is None:
+            args["first"] = max_limit
+
+        after_offset = cursor_to_offset(args["after"]) if args.get("after") else None
+        slice_start = after_offset + 1 if after_offset is not None else 0
+        slice_end = None
+        if args.get("first") is not None:
+            slice_end = slice_start + args["first"] + 1
+        if args.get("before"):
+            before_offset = cursor_to_offset(args["before"])
+            if before_offset is not None:
+                slice_end = before_offset if slice_end is None else min(slice_end, before_offset)
+        rows = list(queryset[slice_start:slice_end])
+
+        result = connection_from_array_slice(
+            rows,
+            args,
+            slice_start=slice_start,
+            array_length=slice_start + len(rows),
+            array_slice_length=len(rows),
+            connection_type=partial(connection_adapter, connection),
+            edge_type=connection.Edge,
+            page_info_type=page_info_adapter,
+        )
+        result.iterable = queryset
+        result.length = None
+        return result
+
+    @classmethod
+    def connection_resolver(
+        cls,
+        resolver,
+        connection,
+        default_manager,
+        queryset_resolver,
+        max_limit,
+        enforce_first_or_last,
+        root,
+        info,
+        **args,
+    ):
+        if args.get("first") is None and args.get("last") is None:
+            args["first"] = min(
+                getattr(settings, "CRM_DEFAULT_PAGE_SIZE", 100), max_limit or float("inf")
+            )
+        result = super().connection_resolver(
+            resolver,
+            connection,
+            default_manager,
+            queryset_resolver,
+            max_limit,
+            enforce_first_or_last,
+            root,
+            info,
+            **args,
+        )
+        edges = getattr(result, "edges", None)
+        if edges:
+            get_loaders(info).enqueue(edge.node for edge in edges)
+        return result
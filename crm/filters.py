@@ -1,12 +1,71 @@
+from datetime import datetime, time
+
 import django_filters
+import graphene
+from django.db.models import Count, Exists, OuterRef
+from django.utils import timezone
+from graphene_django.filter import ListFilter, TypedFilter
 from crm.models import Customer, Product, Order
+from crm.search import RANK, get_search_backend
+
+
+class DateTimeBoundFilter(django_filters.DateFilter):
+    """Date filter for a DateTimeField, compared against local midnight.
+
+    Passing the bare date would make Django build a naive datetime (and warn);
+    an aware bound keeps the comparison a plain range on the column.
+    """
+
+    def filter(self, qs, value):
+        if value:
+            value = timezone.make_aware(datetime.combine(value, time.min))
+        return super().filter(qs, value)
+
+
+class ContainsFilter(django_filters.CharFilter):
+    """Case-insensitive substring filter served by the search backend."""
+
+    def filter(self, qs, value):
+        if not value:
+            return qs
+        return get_search_backend(qs.db).contains(qs, self.field_name, value)
+
+
+class SearchFilter(django_filters.CharFilter):
+    """Substring search across ``fields``, ranked by relevance.
+
+    Results are ordered by rank unless the query already has an ordering.
+    """
+
+    def __init__(self, *args, fields=(), **kwargs):
+        self.search_fields = list(fields)
+        super().__init__(*args, **kwargs)
+
+    def filter(self, qs, value):
+        if not value:
+            return qs
+        ordered = bool(qs.query.order_by)
+        qs = get_search_backend(qs.db).search(qs, self.search_fields, value)
+        return qs if ordered else qs.order_by(f"-{RANK}", "pk")
+
+
+def order_products(**lookups):
+    """Rows of the order/product table for the outer order matching ``lookups``.
+
+    Filtering through ``products__...`` joins the M2M table and repeats an
+    order once per matching product; a correlated EXISTS on the (order,
+    product) unique index returns each order once and needs no DISTINCT.
+    """
+    return Order.products.through.objects.filter(order_id=OuterRef("pk"), **lookups)
+
 
 class CustomerFilter(django_filters.FilterSet):
-    name = django_filters.CharFilter(field_name="name", lookup_expr="icontains")
-    email = django_filters.CharFilter(field_name="email", lookup_expr="icontains")
-    created_at__gte = django_filters.DateFilter(field_name="created_at", lookup_expr="gte")
-    created_at__lte = django_filters.DateFilter(field_name="created_at", lookup_expr="lte")
+    name = ContainsFilter(field_name="name")
+    email = ContainsFilter(field_name="email")
+    created_at__gte = DateTimeBoundFilter(field_name="created_at", lookup_expr="gte")
+    created_at__lte = DateTimeBoundFilter(field_name="created_at", lookup_expr="lte")
     phone_pattern = django_filters.CharFilter(method="filter_phone_pattern")
+    search = SearchFilter(fields=["name", "email"])
 
     def filter_phone_pattern(self, queryset, name, value):
         return queryset.filter(phone__startswith=value)
@@ -16,7 +75,8 @@ class CustomerFilter(django_filters.FilterSet):
         fields = ["name", "email", "created_at", "phone"]
 
 class ProductFilter(django_filters.FilterSet):
-    name = django_filters.CharFilter(field_name="name", lookup_expr="icontains")
+    name = ContainsFilter(field_name="name")
+    search = SearchFilter(fields=["name"])
     price__gte = django_filters.NumberFilter(field_name="price", lookup_expr="gte")
     price__lte = django_filters.NumberFilter(field_name="price", lookup_expr="lte")
     stock__gte = django_filters.NumberFilter(field_name="stock", lookup_expr="gte")
@@ -29,14 +89,58 @@ class ProductFilter(django_filters.FilterSet):
 class OrderFilter(django_filters.FilterSet):
     total_amount__gte = django_filters.NumberFilter(field_name="total_amount", lookup_expr="gte")
     total_amount__lte = django_filters.NumberFilter(field_name="total_amount", lookup_expr="lte")
-    order_date__gte = django_filters.DateFilter(field_name="order_date", lookup_expr="gte")
-    order_date__lte = django_filters.DateFilter(field_name="order_date", lookup_expr="lte")
+    order_date__gte = DateTimeBoundFilter(field_name="order_date", lookup_expr="gte")
+    order_date__lte = DateTimeBoundFilter(field_name="order_date", lookup_expr="lte")
+
+    customer_name = ContainsFilter(field_name="customer__name")
+    product_name = django_filters.CharFilter(method="filter_product_name")
+    product_id = django_filters.NumberFilter(method="filter_product_id")
+    product_ids_any = ListFilter(
+        input_type=graphene.List(graphene.ID), method="filter_product_ids_any"
+    )
+    product_ids_all = ListFilter(
+        input_type=graphene.List(graphene.ID), method="filter_product_ids_all"
+    )
+    # The argument the generated M2M filter had, as an EXISTS probe rather
+    # than a join plus DISTINCT.
+    products = TypedFilter(input_type=graphene.ID, method="filter_products")
+    search = SearchFilter(fields=["customer__name", "customer__email"])
+
+    def filter_product_name(self, queryset, name, value):
+        products = get_search_backend(queryset.db).contains(
+            Product.objects.using(queryset.db), "name", value
+        )
+        return queryset.filter(Exists(order_products(product_id__in=products.values("pk"))))
+
+    def filter_product_id(self, queryset, name, value):
+        return queryset.filter(Exists(order_products(product_id=value)))
+
+    @staticmethod
+    def product_pks(value):
+        return {Product._meta.pk.to_python(pk) for pk in value}
+
+    def filter_product_ids_any(self, queryset, name, value):
+        if not value:
+            return queryset.none()
+        return queryset.filter(Exists(order_products(product_id__in=self.product_pks(value))))
+
+    def filter_products(self, queryset, name, value):
+        return self.filter_product_ids_any(queryset, name, [value])
 
-    customer_name = django_filters.CharFilter(field_name="customer__name", lookup_expr="icontains")
-    product_name = django_filters.CharFilter(field_name="products__name", lookup_expr="icontains")
-    product_id = django_filters.NumberFilter(field_name="products__id", lookup_expr="exact")
+    def filter_product_ids_all(self, queryset, name, value):
+        ids = self.product_pks(value)
+        if not ids:
+            return queryset
+        # One probe per order: count its rows among the requested products.
+        matches = (
+            order_products(product_id__in=ids)
+            .values("order_id")
+            .annotate(matched=Count("product_id"))
+            .filter(matched=len(ids))
+        )
+        return queryset.filter(Exists(matches))
 
     class Meta:
         model = Order
-        fields = ["total_amount", "order_date", "customer", "products"]
+        fields = ["total_amount", "order_date", "customer"]
 
@@ -0,0 +1,98 @@
+"""
+Shared GraphQL executor for cron jobs and Celery tasks.
+
+By default operations run in-process against
+``alx_backend_graphql.schema.schema``, skipping JSON encoding, the loopback
+TCP hop and the web worker that would otherwise serve the request. Set
+``CRM_GRAPHQL_TRANSPORT = "http"`` to go through ``CRM_GRAPHQL_URL`` instead,
+as a persisted query: only the document's hash is sent once the server has
+seen it. Either way the caller gets the ``data`` dict back, and GraphQL errors
+raise ``gql.transport.exceptions.TransportQueryError``.
+"""
+from types import SimpleNamespace
+
+from django.conf import settings
+from gql.transport.exceptions import TransportQueryError, TransportServerError
+from graphql import ExecutionResult, execute_sync
+
+from crm.documents import PERSISTED_QUERY_NOT_FOUND, document_hash, get_document
+
+DEFAULT_URL = "http://localhost:8000/graphql"
+
+
+def get_transport_name():
+    return getattr(settings, "CRM_GRAPHQL_TRANSPORT", "local")
+
+
+def execute_local(query, variables=None):
+    from alx_backend_graphql.schema import schema
+
+    # Jobs send the same handful of documents over and over; each is parsed
+    # and validated once per process (crm.documents).
+    document = get_document(query)
+    errors = document.validate(schema.graphql_schema)
+    if errors:
+        result = ExecutionResult(data=None, errors=list(errors))
+    else:
+        result = execute_sync(
+            schema.graphql_schema,
+            document.ast,
+            variable_values=variables,
+            context_value=SimpleNamespace(),
+        )
+    if result.errors:
+        errors = [error.formatted for error in result.errors]
+        raise TransportQueryError(
+            str(errors[0]), errors=errors, data=result.data
+        )
+    return result.data
+
+
+def execute_http(query, variables=None, timeout=15):
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    # Send the hash alone; the full document goes out only when the server
+    # does not know it yet (crm.documents).
+    payload = {
+        "variables": variables,
+        "extensions": {"persistedQuery": {"version": 1, "sha256Hash": document_hash(query)}},
+    }
+    url = getattr(settings, "CRM_GRAPHQL_URL", DEFAULT_URL)
+    retry = Retry(
+        total=2, backoff_factor=0.1, status_forcelist=[500, 502, 503, 504], allowed_methods=None
+    )
+    with requests.Session() as session:
+        session.mount("http://", HTTPAdapter(max_retries=retry))
+        session.mount("https://", HTTPAdapter(max_retries=retry))
+        body = _post(session, url, payload, timeout)
+        if any(
+            error.get("message") == PERSISTED_QUERY_NOT_FOUND for error in body.get("errors") or ()
+        ):
+            body = _post(session, url, {**payload, "query": query}, timeout)
+
+    if body.get("errors"):
+        errors = body["errors"]
+        raise TransportQueryError(str(errors[0]), errors=errors, data=body.get("data"))
+    return body.get("data")
+
+
+def _post(session, url, payload, timeout):
+    response = session.post(url, json=payload, timeout=timeout)
+    try:
+        body = response.json()
+    except ValueError:
+        body = None
+    if not isinstance(body, dict) or not ("data" in body or "errors" in body):
+        raise TransportServerError(
+            f"{response.status_code} {response.reason}", response.status_code
+        )
+    return body
+
+
+def execute(query, variables=None, timeout=15):
+    """Run ``query`` with the configured transport and return its data."""
+    if get_transport_name() == "http":
+        return execute_http(query, variables, timeout=timeout)
+    return execute_local(query, variables)
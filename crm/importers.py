@@ -0,0 +1,213 @@
+"""
+Streaming bulk import of customers and products from NDJSON or CSV.
+
+Records are read one line at a time, validated with the model's own field
+validation, and upserted in fixed-size batches, so memory stays flat
+however large the input is. Each batch is its own transaction; after it
+commits the running totals are reported, which the management command
+uses to print progress and write a checkpoint and the HTTP endpoint
+streams back to the client.
+
+Customers are matched on ``email`` (a single ``INSERT ... ON CONFLICT``
+per batch); products on ``name``. A row replaces every imported field
+of an existing record; missing columns take the default.
+"""
+import csv
+import json
+from dataclasses import dataclass, field
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from crm import response_cache
+from crm.models import Customer, Product
+
+FORMATS = ("ndjson", "csv")
+
+# Row errors kept for the report; the rest are only counted.
+MAX_REPORTED_ERRORS = 100
+
+
+def guess_format(name):
+    return "csv" if str(name).lower().endswith(".csv") else "ndjson"
+
+
+def read_records(lines, format, header=None, start=1):
+    """
+    Yield ``(row_number, record)`` from an iterable of byte lines.
+
+    ``record`` is a dict, or a ValidationError for a line that cannot be
+    parsed. CSV input takes its column names from the first line unless
+    ``header`` is given; ``header`` and ``start`` are for resuming in the
+    middle of a file.
+    """
+    text = (line.decode("utf-8-sig") for line in lines)
+    if format == "csv":
+        reader = csv.DictReader(text, fieldnames=header)
+        for number, row in enumerate(reader, start=start):
+            # Empty cells fall back to the model defaults.
+            yield number, {key: value for key, value in row.items() if key and value != ""}
+        return
+
+    number = start - 1
+    for line in text:
+        if not line.strip():
+            continue
+        number += 1
+        try:
+            record = json.loads(line)
+        except ValueError as error:
+            yield number, ValidationError(f"Invalid JSON: {error}")
+            continue
+        if not isinstance(record, dict):
+            yield number, ValidationError("Each line must be a JSON object.")
+            continue
+        yield number, record
+
+
+def read_csv_header(line):
+    return next(csv.reader([line.decode("utf-8-sig")]))
+
+
+def error_message(error):
+    if hasattr(error, "error_dict"):
+        return "; ".join(
+            f"{name}: {' '.join(messages)}" for name, messages in error.message_dict.items()
+        )
+    return " ".join(error.messages)
+
+
+class Importer:
+    model = None
+    key = None
+    fields = ()
+
+    def build(self, record):
+        """Return a validated, unsaved instance for ``record``."""
+        instance = self.model(**{name: record[name] for name in self.fields if name in record})
+        # Uniqueness is resolved by the upsert, not with a query per row.
+        instance.full_clean(validate_unique=False, validate_constraints=False)
+        return instance
+
+    def upsert(self, instances):
+        raise NotImplementedError
+
+
+class CustomerImporter(Importer):
+    model = Customer
+    key = "email"
+    fields = ("name", "email", "phone")
+
+    def upsert(self, instances):
+        Customer.objects.bulk_create(
+            instances,
+            update_conflicts=True,
+            unique_fields=["email"],
+            update_fields=["name", "phone"],
+        )
+
+
+class ProductImporter(Importer):
+    model = Product
+    key = "name"
+    fields = ("name", "price", "stock")
+
+    def build(self, record):
+        product = super().build(record)
+        if product.price <= 0:
+            raise ValidationError({"price": ["Price must be positive."]})
+        return product
+
+    def upsert(self, instances):
+        existing = dict(
+            Product.objects.filter(name__in=[p.name for p in instances])
+            .order_by("-pk")
+            .values_list("name", "pk")
+        )
+        updates = []
+        inserts = []
+        for product in instances:
+            product.pk = existing.get(product.name)
+            (updates if product.pk else inserts).append(product)
+        Product.objects.bulk_update(updates, ["price", "stock"])
+        Product.objects.bulk_create(inserts)
+
+
+IMPORTERS = {
+    "customers": CustomerImporter,
+    "products": ProductImporter,
+}
+
+
+@dataclass
+class ImportResult:
+    rows: int = 0
+    imported: int = 0
+    error_count: int = 0
+    errors: list = field(default_factory=list)
+
+    def add_error(self, row, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"row": row, "message": message})
+
+    def as_dict(self):
+        return {
+            "rows": self.rows,
+            "imported": self.imported,
+            "error_count": self.error_count,
+            "errors": self.errors,
+        }
+
+
+def import_batches(importer, records, batch_size, skip=0, result=None):
+    """
+    Validate and upsert ``records`` (from :func:`read_records`) in batches.
+
+    Yields the running :class:`ImportResult` after each committed batch;
+    ``result.rows`` is then the number of records fully handled, i.e. the
+    point to resume from. The first ``skip`` records are passed over
+    without being validated.
+    """
+    result = result or ImportResult()
+    batch = {}
+
+    def flush():
+        if batch:
+            with transaction.atomic():
+                importer.upsert(list(batch.values()))
+                response_cache.invalidate(importer.model)
+            result.imported += len(batch)
+            batch.clear()
+
+    pending = 0
+    for number, record in records:
+        if number <= skip:
+            continue
+        try:
+            if isinstance(record, ValidationError):
+                raise record
+            instance = importer.build(record)
+        except ValidationError as error:
+            result.add_error(number, error_message(error))
+        else:
+            # A key repeated within one batch keeps its last row.
+            batch[getattr(instance, importer.key)] = instance
+        result.rows = number
+        pending += 1
+        if pending >= batch_size:
+            flush()
+            pending = 0
+            yield result
+    if pending or not result.rows:
+        flush()
+        yield result
+
+
+def run_import(importer, records, batch_size, skip=0, result=None, on_batch=None):
+    """Run :func:`import_batches` to the end and return the result."""
+    result = result or ImportResult()
+    for result in import_batches(importer, records, batch_size, skip=skip, result=result):
+        if on_batch:
+            on_batch(result)
+    return result
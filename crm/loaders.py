@@ -0,0 +1,244 @@
+"""
+Per-request batching loaders for the CRM GraphQL types.
+
+Graphene executes synchronously here, so instead of deferring loads to the
+end of a tick (the JavaScript DataLoader model) the loaders are *primed*:
+whenever a connection page or a batched relation is resolved, its nodes are
+queued on every loader that can start from them. The first ``load()`` on a
+loader then fetches the whole queue with a single query and caches the result
+for the rest of the request.
+"""
+from collections import defaultdict
+
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+
+from crm.models import Customer, Product, Order, OrderItem
+
+
+class DataLoader:
+    """Collect keys, resolve them in one batch and cache the results."""
+
+    # Model whose instances can be queued on this loader, and the attribute
+    # holding the key on those instances.
+    source_model = None
+    source_key = "pk"
+
+    def __init__(self, loaders):
+        self.loaders = loaders
+        self._cache = {}
+        self._queue = {}
+
+    def batch_load(self, keys):
+        """Return a dict mapping each key in ``keys`` to its value."""
+        raise NotImplementedError
+
+    def missing(self):
+        """Value cached for keys the batch did not return."""
+        return None
+
+    def enqueue(self, instances):
+        for instance in instances:
+            # Reading a column left out by only() would cost a query per row.
+            if self.source_key in instance.get_deferred_fields():
+                continue
+            key = getattr(instance, self.source_key)
+            if key not in self._cache:
+                self._queue[key] = None
+
+    def prime(self, key, value):
+        self._cache.setdefault(key, value)
+        self._queue.pop(key, None)
+
+    def load(self, key):
+        if key not in self._cache:
+            self._queue[key] = None
+            self.dispatch()
+        return self._cache[key]
+
+    def load_many(self, keys):
+        keys = list(keys)
+        for key in keys:
+            if key not in self._cache:
+                self._queue[key] = None
+        if self._queue:
+            self.dispatch()
+        return [self._cache[key] for key in keys]
+
+    def dispatch(self):
+        keys = list(self._queue)
+        self._queue.clear()
+        results = self.batch_load(keys)
+        for key in keys:
+            self._cache[key] = results[key] if key in results else self.missing()
+
+
+class CustomerLoader(DataLoader):
+    """Customer by primary key; primed from ``Order.customer_id``."""
+
+    source_model = Order
+    source_key = "customer_id"
+
+    def batch_load(self, keys):
+        return Customer.objects.in_bulk(keys)
+
+
+class ProductLoader(DataLoader):
+    """Product by primary key; primed by :class:`OrderProductsLoader`."""
+
+    def batch_load(self, keys):
+        return Product.objects.in_bulk(keys)
+
+
+class OrderItemsLoader(DataLoader):
+    """Items of an order, read from the M2M through table in one join."""
+
+    source_model = Order
+
+    def missing(self):
+        return []
+
+    def batch_load(self, keys):
+        items = (
+            OrderItem.objects.filter(order_id__in=keys)
+            .select_related("product")
+            .order_by("order_id", "product_id")
+        )
+        products = self.loaders.products
+        grouped = defaultdict(list)
+        for item in items:
+            products.prime(item.product_id, item.product)
+            grouped[item.order_id].append(item)
+        return grouped
+
+
+class OrderProductsLoader(DataLoader):
+    """Products of an order, taken from :class:`OrderItemsLoader`."""
+
+    source_model = Order
+
+    def missing(self):
+        return []
+
+    def batch_load(self, keys):
+        products = self.loaders.products
+        return {
+            key: [products.load(item.product_id) for item in items]
+            for key, items in zip(keys, self.loaders.order_items.load_many(keys))
+        }
+
+
+class LeadingRows(list):
+    """
+    The first rows of ``queryset``. Unless ``complete``, more rows may
+    follow, so the list's length is not the total.
+    """
+
+    def __init__(self, rows, queryset, complete):
+        super().__init__(rows)
+        self.queryset = queryset
+        self.complete = complete
+
+
+class CustomerOrdersLoader(DataLoader):
+    """
+    Leading orders of a customer (the reverse ``Customer.orders`` relation).
+
+    Keys are ``(customer_pk, limit)``: the orders are numbered per customer
+    in SQL and only the first ``limit`` of each are read, so a page of
+    customers never loads every order they ever placed. Queued customers are
+    batched with the limit of the first load.
+    """
+
+    source_model = Customer
+
+    def __init__(self, loaders):
+        super().__init__(loaders)
+        self._customers = {}
+
+    def missing(self):
+        return []
+
+    def enqueue(self, instances):
+        for instance in instances:
+            self._customers[instance.pk] = None
+
+    def load(self, key):
+        limit = key[1]
+        for pk in self._customers:
+            if (pk, limit) not in self._cache:
+                self._queue[(pk, limit)] = None
+        return super().load(key)
+
+    def batch_load(self, keys):
+        customers = defaultdict(list)
+        for pk, limit in keys:
+            customers[limit].append(pk)
+        grouped = {}
+        for limit, pks in customers.items():
+            row = Window(RowNumber(), partition_by=F("customer_id"), order_by=F("pk").asc())
+            orders = list(
+                Order.objects.filter(customer_id__in=pks)
+                .annotate(customer_row=row)
+                .filter(customer_row__lte=limit)
+                .order_by("pk")
+            )
+            self.loaders.enqueue(orders)
+            rows = defaultdict(list)
+            for order in orders:
+                rows[order.customer_id].append(order)
+            for pk, customer_orders in rows.items():
+                grouped[(pk, limit)] = LeadingRows(
+                    customer_orders,
+                    Order.objects.filter(customer_id=pk).order_by("pk"),
+                    complete=len(customer_orders) < limit,
+                )
+        return grouped
+
+
+class Loaders:
+    """The set of loaders shared by every resolver of one request."""
+
+    def __init__(self):
+        self.customers = CustomerLoader(self)
+        self.products = ProductLoader(self)
+        self.order_items = OrderItemsLoader(self)
+        self.order_products = OrderProductsLoader(self)
+        self.customer_orders = CustomerOrdersLoader(self)
+
+    def __iter__(self):
+        return iter(
+            (
+                self.customers,
+                self.products,
+                self.order_items,
+                self.order_products,
+                self.customer_orders,
+            )
+        )
+
+    def enqueue(self, instances):
+        """Queue ``instances`` on every loader that can start from them."""
+        instances = list(instances)
+        if not instances:
+            return
+        model = type(instances[0])
+        for loader in self:
+            if loader.source_model is model:
+                loader.enqueue(instances)
+
+
+def get_loaders(info):
+    """Return the loaders bound to the current request (``info.context``).
+
+    Without a context object there is nothing to share state on, so every
+    call gets fresh loaders; results stay correct, only batching is lost.
+    """
+    context = info.context
+    if context is None:
+        return Loaders()
+    loaders = getattr(context, "crm_loaders", None)
+    if loaders is None:
+        loaders = Loaders()
+        context.crm_loaders = loaders
+    return loaders
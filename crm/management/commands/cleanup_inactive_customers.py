@@ -0,0 +1,67 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from crm.models import Customer, Order
+
+
+class Command(BaseCommand):
+    help = "Delete customers with no orders in the last year, in bounded chunks."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=365,
+            help="Customers without an order in this many days are inactive (default: 365).",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1000,
+            help="Customers deleted per transaction (default: 1000).",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report how many customers would be deleted without deleting them.",
+        )
+
+    def handle(self, *args, days, chunk_size, dry_run, **options):
+        if days <= 0:
+            raise CommandError("--days must be positive.")
+        if chunk_size <= 0:
+            raise CommandError("--chunk-size must be positive.")
+
+        cutoff = timezone.now() - timedelta(days=days)
+        recent_orders = Order.objects.filter(
+            customer=OuterRef("pk"), order_date__gte=cutoff
+        )
+        inactive = Customer.objects.filter(~Exists(recent_orders)).order_by("pk")
+
+        if dry_run:
+            self.stdout.write(f"Would delete {inactive.count()} inactive customers")
+            return
+
+        # Each chunk is its own short transaction so the table is never
+        # locked for the whole run.
+        deleted = 0
+        last_pk = 0
+        while True:
+            ids = list(
+                inactive.filter(pk__gt=last_pk).values_list("pk", flat=True)[:chunk_size]
+            )
+            if not ids:
+                break
+            last_pk = ids[-1]
+            # Re-check inactivity at delete time in case an order came in
+            # since the ids were read.
+            with transaction.atomic():
+                _, per_model = inactive.filter(pk__in=ids).delete()
+            deleted += per_model.get(Customer._meta.label, 0)
+            self.stdout.write(f"Deleted {deleted} inactive customers so far")
+
+        self.stdout.write(f"Deleted {deleted} inactive customers")
@@ -0,0 +1,237 @@
+import multiprocessing
+import random
+import time
+from bisect import bisect
+from contextlib import contextmanager
+from datetime import date, datetime, time as dt_time, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from itertools import accumulate
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, router, transaction
+from django.utils import timezone
+
+from crm import response_cache
+from crm.models import Customer, Order, OrderItem, Product
+from crm.services import create_orders
+
+# Orders generated (and committed) per unit of work. Each chunk has its own
+# random stream derived from the seed, so the data does not depend on how
+# chunks are spread over workers.
+CHUNK_SIZE = 10000
+
+# Set in the parent before forking workers; see Generator.
+_generator = None
+
+
+@contextmanager
+def explicit_dates():
+    """Let generated created_at/order_date values through auto_now_add."""
+    fields = [Customer._meta.get_field("created_at"), Order._meta.get_field("order_date")]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+class Generator:
+    """
+    Deterministic synthetic CRM data.
+
+    * Product popularity follows a Zipf law: a few best sellers, a long tail.
+    * Customer activity is Pareto-distributed, so most orders come from
+      repeat customers and many customers order once or never.
+    * Customers sign up over ``years``; each order falls between its
+      customer's sign-up and now, weighted towards recent dates.
+    * Orders have 1-6 distinct products (mostly one or two), quantities
+      mostly 1.
+    """
+
+    def __init__(self, seed, years, batch_size, until):
+        self.seed = seed
+        self.years = years
+        self.batch_size = batch_size
+        self.now = until
+        self.span = timedelta(days=365 * years).total_seconds()
+
+    def rng(self, *key):
+        return random.Random(f"{self.seed}:{':'.join(map(str, key))}")
+
+    def create_products(self, count):
+        rng = self.rng("products")
+        Product.objects.bulk_create(
+            (
+                Product(
+                    name=f"Product {self.seed}-{i}",
+                    # Median around 33, mostly between 10 and 100.
+                    price=Decimal(f"{min(max(rng.lognormvariate(3.5, 1.0), 0.99), 99999.99):.2f}"),
+                    stock=rng.randint(0, 500),
+                )
+                for i in range(count)
+            ),
+            batch_size=self.batch_size,
+        )
+
+    def create_customers(self, count):
+        rng = self.rng("customers")
+        Customer.objects.bulk_create(
+            (
+                Customer(
+                    name=f"Customer {self.seed}-{i}",
+                    email=f"customer{i}.{self.seed}@example.com",
+                    phone=f"+1{rng.randint(2000000000, 9999999999)}" if rng.random() < 0.7 else None,
+                    created_at=self.now - timedelta(seconds=rng.random() * self.span),
+                )
+                for i in range(count)
+            ),
+            batch_size=self.batch_size,
+        )
+
+    def load(self):
+        """Read back the generated rows and build the sampling tables."""
+        products = list(
+            Product.objects.filter(name__startswith=f"Product {self.seed}-")
+            .order_by("pk")
+            .values_list("pk", "price")
+        )
+        rng = self.rng("popularity")
+        rng.shuffle(products)
+        self.products = products
+        self.product_weights = list(accumulate(1 / rank ** 1.1 for rank in range(1, len(products) + 1)))
+
+        customers = list(
+            Customer.objects.filter(email__endswith=f".{self.seed}@example.com")
+            .order_by("pk")
+            .values_list("pk", "created_at")
+        )
+        self.customers = [pk for pk, _ in customers]
+        self.signed_up = [created.timestamp() for _, created in customers]
+        rng = self.rng("activity")
+        self.customer_weights = list(accumulate(rng.paretovariate(1.2) for _ in customers))
+
+    def pick(self, rng, cumulative):
+        return bisect(cumulative, rng.random() * cumulative[-1])
+
+    def create_orders(self, chunk, count):
+        rng = self.rng("orders", chunk)
+        now = self.now.timestamp()
+        orders, lines = [], []
+        for _ in range(count):
+            customer = self.pick(rng, self.customer_weights)
+            start = self.signed_up[customer]
+            order_date = start + (now - start) * rng.random() ** 0.6
+            picked = {}
+            for _ in range(min(1 + int(rng.expovariate(1.2)), 6)):
+                pk, price = self.products[self.pick(rng, self.product_weights)]
+                picked[pk] = (price, 1 if rng.random() < 0.8 else rng.randint(2, 5))
+            orders.append(Order(
+                customer_id=self.customers[customer],
+                order_date=datetime.fromtimestamp(order_date, tz=dt_timezone.utc),
+                total_amount=sum(price * quantity for price, quantity in picked.values()),
+            ))
+            lines.append(picked)
+        with transaction.atomic():
+            create_orders(orders, router.db_for_write(Order), self.batch_size)
+            OrderItem.objects.bulk_create(
+                (
+                    OrderItem(order=order, product_id=pk, quantity=quantity)
+                    for order, picked in zip(orders, lines)
+                    for pk, (_, quantity) in picked.items()
+                ),
+                batch_size=self.batch_size,
+            )
+        return count
+
+
+def _create_orders(task):
+    # Runs in a forked worker, which opens its own database connection.
+    chunk, count = task
+    with explicit_dates():
+        return _generator.create_orders(chunk, count)
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate a deterministic synthetic dataset of customers, products and "
+        "orders for development and load testing."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--customers", type=int, default=10000)
+        parser.add_argument("--products", type=int, default=1000)
+        parser.add_argument("--orders", type=int, default=100000)
+        parser.add_argument("--seed", type=int, default=1, help="Same seed, same data (default: 1).")
+        parser.add_argument("--years", type=int, default=3, help="Years of history (default: 3).")
+        parser.add_argument(
+            "--until",
+            type=date.fromisoformat,
+            help="Last day of history, YYYY-MM-DD (default: today). Fix it to reproduce a dataset exactly.",
+        )
+        parser.add_argument("--batch-size", type=int, default=5000, help="Rows per INSERT (default: 5000).")
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Processes inserting orders in parallel (PostgreSQL; SQLite always uses 1).",
+        )
+
+    def handle(self, *args, customers, products, orders, seed, years, until, batch_size, workers, **options):
+        global _generator
+
+        for name, value in [("--customers", customers), ("--products", products),
+                            ("--years", years), ("--batch-size", batch_size), ("--workers", workers)]:
+            if value <= 0:
+                raise CommandError(f"{name} must be positive.")
+        if orders < 0:
+            raise CommandError("--orders cannot be negative.")
+        if Customer.objects.filter(email__endswith=f".{seed}@example.com").exists():
+            raise CommandError(f"Data for seed {seed} already exists; pick another --seed.")
+        if workers > 1 and connection.vendor == "sqlite":
+            self.stdout.write("SQLite allows a single writer; using 1 worker.")
+            workers = 1
+
+        started = time.perf_counter()
+        until = datetime.combine(until or timezone.localdate(), dt_time.max, tzinfo=dt_timezone.utc)
+        generator = Generator(seed, years, batch_size, until.replace(microsecond=0))
+        with explicit_dates():
+            generator.create_products(products)
+            generator.create_customers(customers)
+        generator.load()
+        self.stdout.write(
+            f"Created {products} products and {customers} customers "
+            f"in {time.perf_counter() - started:.1f}s"
+        )
+
+        tasks = [
+            (chunk, min(CHUNK_SIZE, orders - start))
+            for chunk, start in enumerate(range(0, orders, CHUNK_SIZE))
+        ]
+        _generator = generator
+        done = 0
+        if workers == 1:
+            results = map(_create_orders, tasks)
+            pool = None
+        else:
+            # Forked workers inherit the sampling tables but must not share
+            # the parent's connection.
+            connections.close_all()
+            pool = multiprocessing.get_context("fork").Pool(workers)
+            results = pool.imap_unordered(_create_orders, tasks)
+        try:
+            for count in results:
+                done += count
+                self.stdout.write(f"Created {done} of {orders} orders")
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+            _generator = None
+        response_cache.invalidate(Customer, Product, Order)
+
+        self.stdout.write(
+            f"Generated {customers} customers, {products} products and {orders} orders "
+            f"in {time.perf_counter() - started:.1f}s"
+        )
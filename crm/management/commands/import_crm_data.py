@@ -0,0 +1,139 @@
+import json
+import os
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from crm.importers import (
+    FORMATS,
+    IMPORTERS,
+    ImportResult,
+    guess_format,
+    read_csv_header,
+    read_records,
+    run_import,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream customers or products from an NDJSON or CSV file into the "
+        "database in batches, with a resumable checkpoint."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("model", choices=sorted(IMPORTERS))
+        parser.add_argument("path", help="File to import, or - for standard input.")
+        parser.add_argument(
+            "--format",
+            choices=FORMATS,
+            help="Input format (default: csv for *.csv files, otherwise ndjson).",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=getattr(settings, "CRM_IMPORT_BATCH_SIZE", 1000),
+            help="Rows validated and upserted per transaction.",
+        )
+        parser.add_argument(
+            "--checkpoint",
+            help="Checkpoint file (default: <path>.checkpoint).",
+        )
+        parser.add_argument(
+            "--resume",
+            action="store_true",
+            help="Continue after the last batch recorded in the checkpoint.",
+        )
+
+    def handle(self, *args, model, path, format, batch_size, checkpoint, resume, **options):
+        if batch_size <= 0:
+            raise CommandError("--batch-size must be positive.")
+        format = format or guess_format(path)
+        if path == "-":
+            checkpoint = checkpoint or None
+            stream = sys.stdin.buffer
+        else:
+            checkpoint = checkpoint or f"{path}.checkpoint"
+            try:
+                stream = open(path, "rb")
+            except OSError as error:
+                raise CommandError(f"Cannot open {path}: {error}")
+
+        state = self.load_checkpoint(checkpoint, model, path) if resume else None
+        with stream:
+            self.import_stream(
+                stream, model, path, format, batch_size, checkpoint, state
+            )
+
+    def load_checkpoint(self, checkpoint, model, path):
+        if not checkpoint or not os.path.exists(checkpoint):
+            raise CommandError("No checkpoint to resume from.")
+        with open(checkpoint) as handle:
+            state = json.load(handle)
+        if state.get("model") != model or state.get("path") != os.path.abspath(path):
+            raise CommandError(f"{checkpoint} belongs to another import.")
+        return state
+
+    def import_stream(self, stream, model, path, format, batch_size, checkpoint, state):
+        seekable = stream.seekable()
+        header = None
+        result = ImportResult()
+        skip = 0
+        start = 1
+        if state:
+            result = ImportResult(
+                rows=state["rows"],
+                imported=state["imported"],
+                error_count=state["error_count"],
+            )
+            header = state.get("header")
+            if seekable:
+                # Jump straight to the first row after the checkpoint.
+                stream.seek(state["offset"])
+                start = state["rows"] + 1
+            else:
+                skip = state["rows"]
+        elif format == "csv" and seekable:
+            # Read the header here so it can be stored in the checkpoint.
+            header = read_csv_header(stream.readline())
+
+        def on_batch(result):
+            if checkpoint:
+                self.save_checkpoint(checkpoint, {
+                    "model": model,
+                    "path": os.path.abspath(path),
+                    "header": header,
+                    "offset": stream.tell() if seekable else None,
+                    "rows": result.rows,
+                    "imported": result.imported,
+                    "error_count": result.error_count,
+                })
+            self.stdout.write(
+                f"Processed {result.rows} rows: {result.imported} imported, "
+                f"{result.error_count} errors"
+            )
+
+        records = read_records(stream, format, header=header, start=start)
+        importer = IMPORTERS[model]()
+        result = run_import(
+            importer, records, batch_size, skip=skip, result=result, on_batch=on_batch
+        )
+
+        for error in result.errors:
+            self.stderr.write(f"Row {error['row']}: {error['message']}")
+        if result.error_count > len(result.errors):
+            self.stderr.write(f"... and {result.error_count - len(result.errors)} more errors")
+        if checkpoint and os.path.exists(checkpoint):
+            os.remove(checkpoint)
+        self.stdout.write(
+            f"Imported {result.imported} {model} from {result.rows} rows "
+            f"({result.error_count} errors)"
+        )
+
+    def save_checkpoint(self, checkpoint, state):
+        # Write-then-rename so a crash never leaves a half-written checkpoint.
+        temporary = f"{checkpoint}.tmp"
+        with open(temporary, "w") as handle:
+            json.dump(state, handle)
+        os.replace(temporary, checkpoint)
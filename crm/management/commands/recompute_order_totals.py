@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from crm.models import Order
+from crm.services import order_total, refresh_order_totals
+
+
+class Command(BaseCommand):
+    help = "Recompute Order.total_amount from the order items, in bounded chunks."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1000,
+            help="Orders checked per transaction (default: 1000).",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report how many orders have a wrong total without fixing them.",
+        )
+
+    def handle(self, *args, chunk_size, dry_run, **options):
+        if chunk_size <= 0:
+            raise CommandError("--chunk-size must be positive.")
+
+        if dry_run:
+            wrong = Order.objects.exclude(total_amount=order_total()).count()
+            self.stdout.write(f"Would fix {wrong} order totals")
+            return
+
+        # Walk the table by primary key; each chunk is one UPDATE with a
+        # correlated aggregate, in its own short transaction.
+        orders = Order.objects.order_by("pk")
+        fixed = 0
+        last_pk = 0
+        while True:
+            ids = list(
+                orders.filter(pk__gt=last_pk).values_list("pk", flat=True)[:chunk_size]
+            )
+            if not ids:
+                break
+            with transaction.atomic():
+                fixed += refresh_order_totals(
+                    Order.objects.filter(pk__gte=ids[0], pk__lte=ids[-1])
+                )
+            last_pk = ids[-1]
+            self.stdout.write(f"Fixed {fixed} order totals so far")
+
+        self.stdout.write(f"Fixed {fixed} order totals")
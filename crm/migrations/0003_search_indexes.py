@@ -0,0 +1,107 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:38
+
+import crm.models
+from django.db import migrations, models
+
+# (source table, FTS5 table, indexed columns)
+SEARCH_TABLES = [
+    ("crm_customer", "crm_customer_fts", ["name", "email"]),
+    ("crm_product", "crm_product_fts", ["name"]),
+]
+
+
+def sqlite_has_fts5_trigram(connection):
+    if connection.Database.sqlite_version_info < (3, 34):
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("PRAGMA compile_options")
+        return "ENABLE_FTS5" in {row[0] for row in cursor.fetchall()}
+
+
+def create_search_indexes(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == "sqlite" and sqlite_has_fts5_trigram(connection):
+        for table, fts, columns in SEARCH_TABLES:
+            cols = ", ".join(columns)
+            new = ", ".join(f"new.{c}" for c in columns)
+            old = ", ".join(f"old.{c}" for c in columns)
+            schema_editor.execute(
+                f"CREATE VIRTUAL TABLE {fts} USING fts5({cols}, "
+                f"content='{table}', content_rowid='id', tokenize='trigram')"
+            )
+            schema_editor.execute(
+                f"CREATE TRIGGER {fts}_ai AFTER INSERT ON {table} BEGIN "
+                f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new}); END"
+            )
+            schema_editor.execute(
+                f"CREATE TRIGGER {fts}_ad AFTER DELETE ON {table} BEGIN "
+                f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old}); END"
+            )
+            schema_editor.execute(
+                # Only the indexed columns: stock updates are the hottest writes.
+                f"CREATE TRIGGER {fts}_au AFTER UPDATE OF {cols} ON {table} BEGIN "
+                f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old}); "
+                f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new}); END"
+            )
+            schema_editor.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+    elif connection.vendor == "postgresql":
+        # Django's icontains compiles to UPPER(col::text) LIKE UPPER(%s), which
+        # a trigram GIN index on the same expression can serve directly.
+        schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        for table, _, columns in SEARCH_TABLES:
+            for column in columns:
+                schema_editor.execute(
+                    f"CREATE INDEX IF NOT EXISTS {table}_{column}_trgm ON {table} "
+                    f"USING gin ((UPPER({column}::text)) gin_trgm_ops)"
+                )
+
+
+def drop_search_indexes(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == "sqlite":
+        for _, fts, _ in SEARCH_TABLES:
+            for suffix in ("ai", "ad", "au"):
+                schema_editor.execute(f"DROP TRIGGER IF EXISTS {fts}_{suffix}")
+            schema_editor.execute(f"DROP TABLE IF EXISTS {fts}")
+    elif connection.vendor == "postgresql":
+        for table, _, columns in SEARCH_TABLES:
+            for column in columns:
+                schema_editor.execute(f"DROP INDEX IF EXISTS {table}_{column}_trgm")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0002_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerSearchIndex',
+            fields=[
+                ('rowid', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('document', crm.models.SearchDocumentField(db_column='crm_customer_fts')),
+                ('name', models.TextField()),
+                ('email', models.TextField()),
+                ('rank', models.FloatField()),
+            ],
+            options={
+                'db_table': 'crm_customer_fts',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductSearchIndex',
+            fields=[
+                ('rowid', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('document', crm.models.SearchDocumentField(db_column='crm_product_fts')),
+                ('name', models.TextField()),
+                ('rank', models.FloatField()),
+            ],
+            options={
+                'db_table': 'crm_product_fts',
+                'managed': False,
+            },
+        ),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -1,4 +1,7 @@
+from decimal import Decimal
+
 from django.db import models
+from django.db.models import F, Sum
 
 class Customer(models.Model):
     name = models.CharField(max_length=100)
@@ -6,6 +9,12 @@ class Customer(models.Model):
     phone = models.CharField(max_length=20, blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["created_at"], name="crm_customer_created_idx"),
+            models.Index(fields=["phone"], name="crm_customer_phone_idx"),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -14,20 +23,101 @@ class Product(models.Model):
     price = models.DecimalField(max_digits=10, decimal_places=2)
     stock = models.PositiveIntegerField(default=0)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["price"], name="crm_product_price_idx"),
+            models.Index(fields=["stock"], name="crm_product_stock_idx"),
+        ]
+
     def __str__(self):
         return self.name
 
 class Order(models.Model):
-    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name="orders")
-    products = models.ManyToManyField(Product)
+    # Indexed as the leading column of crm_order_cust_date_idx.
+    customer = models.ForeignKey(
+        Customer, on_delete=models.CASCADE, related_name="orders", db_index=False
+    )
+    products = models.ManyToManyField(Product, through="OrderItem")
     total_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     order_date = models.DateTimeField(auto_now_add=True)
 
-    def save(self, *args, **kwargs):
-        # Automatically calculate total amount
-        self.total_amount = sum(product.price for product in self.products.all())
-        super().save(*args, **kwargs)
+    class Meta:
+        indexes = [
+            # A customer's orders by date: Customer.orders, the inactive
+            # customer cleanup and customer + date window filters.
+            models.Index(fields=["customer", "order_date"], name="crm_order_cust_date_idx"),
+            # Date windows and orderBy order_date, with the id tiebreaker
+            # used by keyset cursors.
+            models.Index(fields=["order_date", "id"], name="crm_order_date_id_idx"),
+            models.Index(fields=["total_amount"], name="crm_order_total_idx"),
+        ]
+
+    def calculate_total(self):
+        """Sum of the items at current prices, in one aggregate query.
+
+        ``total_amount`` is kept up to date when products are added or
+        removed (see crm.signals); this is for checking or repairing it.
+        """
+        total = self.items.aggregate(total=Sum(F("quantity") * F("product__price")))["total"]
+        return total or Decimal("0")
 
     def __str__(self):
         return f"Order {self.id} for {self.customer.name}"
 
+
+class OrderItem(models.Model):
+    """A product on an order: the through table of ``Order.products``."""
+
+    # The table was created as Django's auto-generated through table, which
+    # has a 32-bit key.
+    id = models.AutoField(primary_key=True)
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name="items")
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="+")
+    quantity = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        db_table = "crm_order_products"
+        unique_together = [("order", "product")]
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product_id} on order {self.order_id}"
+
+
+# Full-text search indexes (SQLite FTS5, see crm.search). The virtual tables
+# are created by migration only on SQLite, so these models are unmanaged.
+
+class SearchDocumentField(models.TextField):
+    """The hidden column named after an FTS5 table; the target of MATCH."""
+
+
+@SearchDocumentField.register_lookup
+class Match(models.Lookup):
+    lookup_name = "match"
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f"{lhs} MATCH {rhs}", lhs_params + rhs_params
+
+
+class CustomerSearchIndex(models.Model):
+    rowid = models.BigIntegerField(primary_key=True)
+    document = SearchDocumentField(db_column="crm_customer_fts")
+    name = models.TextField()
+    email = models.TextField()
+    rank = models.FloatField()
+
+    class Meta:
+        managed = False
+        db_table = "crm_customer_fts"
+
+
+class ProductSearchIndex(models.Model):
+    rowid = models.BigIntegerField(primary_key=True)
+    document = SearchDocumentField(db_column="crm_product_fts")
+    name = models.TextField()
+    rank = models.FloatField()
+
+    class Meta:
+        managed = False
+        db_table = "crm_product_fts"
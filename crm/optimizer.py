@@ -0,0 +1,79 @@
+"""
+Shape connection querysets after the GraphQL selection set.
+
+Only the columns a client actually selected on ``edges { node { ... } }`` are
+loaded (``only()``) and forward foreign keys that are selected are joined in
+the same query (``select_related()``). To-many relations are left to the
+request loaders in :mod:`crm.loaders`, which already batch them per page.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from graphene.utils.str_converters import to_snake_case
+from graphql.language import FieldNode, FragmentSpreadNode, InlineFragmentNode
+
+
+def collect_fields(info, selection_sets):
+    """Map snake-cased field names to the selection sets nested under them."""
+    fields = {}
+    for selection_set in selection_sets:
+        if selection_set is None:
+            continue
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                nested = fields.setdefault(to_snake_case(selection.name.value), [])
+                if selection.selection_set is not None:
+                    nested.append(selection.selection_set)
+            elif isinstance(selection, FragmentSpreadNode):
+                fragment = info.fragments[selection.name.value]
+                _merge(fields, collect_fields(info, [fragment.selection_set]))
+            elif isinstance(selection, InlineFragmentNode):
+                _merge(fields, collect_fields(info, [selection.selection_set]))
+    return fields
+
+
+def _merge(fields, other):
+    for name, nested in other.items():
+        fields.setdefault(name, []).extend(nested)
+
+
+def node_fields(info):
+    """Fields selected on the nodes of the connection being resolved."""
+    connection = collect_fields(
+        info, [field_node.selection_set for field_node in info.field_nodes]
+    )
+    edges = collect_fields(info, connection.get("edges", []))
+    return collect_fields(info, edges.get("node", []))
+
+
+def _project(info, model, fields, prefix, only, related):
+    only.add(prefix + model._meta.pk.name)
+    for name, nested in fields.items():
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            continue
+        if not field.concrete or field.many_to_many:
+            continue
+        if field.is_relation:
+            path = prefix + name
+            only.add(path)
+            related.add(path)
+            _project(
+                info,
+                field.related_model,
+                collect_fields(info, nested),
+                path + "__",
+                only,
+                related,
+            )
+        else:
+            only.add(prefix + field.name)
+
+
+def optimize_queryset(queryset, info):
+    """Restrict ``queryset`` to the columns and joins the query selects."""
+    only = set()
+    related = set()
+    _project(info, queryset.model, node_fields(info), "", only, related)
+    if related:
+        queryset = queryset.select_related(*sorted(related))
+    return queryset.only(*sorted(only))
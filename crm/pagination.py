@@ -0,0 +1,153 @@
+"""
+Keyset (seek) pagination for the CRM connections.
+
+Offset cursors make the database walk and discard every row before the
+requested page. Keyset cursors instead carry the sort key of the last row
+seen, and ``after``/``before`` become range predicates on the ordering
+columns, so a page deep in the table costs the same as the first one.
+"""
+import base64
+import datetime
+import decimal
+import json
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from graphene.relay import PageInfo
+
+CURSOR_PREFIX = "keyset:"
+
+
+def get_ordering(queryset):
+    """Return ``[(field, descending), ...]`` ending with the primary key."""
+    meta = queryset.model._meta
+    terms = list(queryset.query.order_by or meta.ordering or [])
+    ordering = []
+    for term in terms:
+        if not isinstance(term, str):
+            raise ValidationError("Keyset pagination only supports ordering by field name.")
+        descending = term.startswith("-")
+        name = term.lstrip("-")
+        try:
+            field = meta.pk if name == "pk" else meta.get_field(name)
+        except FieldDoesNotExist:
+            field = None
+        if field is None or field.null or not field.concrete or "__" in name:
+            raise ValidationError(
+                f"Keyset pagination cannot order by '{name}'; use a non-null field of {meta.object_name}."
+            )
+        ordering.append((field, descending))
+        if field.primary_key:
+            return ordering
+    # The primary key makes every sort key unique.
+    descending = ordering[-1][1] if ordering else False
+    ordering.append((meta.pk, descending))
+    return ordering
+
+
+def _cursor_value(value):
+    # Full precision: DjangoJSONEncoder would cut datetimes to milliseconds.
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    return value
+
+
+def encode_cursor(instance, ordering):
+    values = [_cursor_value(getattr(instance, field.attname)) for field, _ in ordering]
+    payload = CURSOR_PREFIX + json.dumps(values)
+    return base64.b64encode(payload.encode()).decode()
+
+
+def decode_cursor(cursor, ordering):
+    try:
+        payload = base64.b64decode(cursor.encode()).decode()
+        if not payload.startswith(CURSOR_PREFIX):
+            raise ValueError
+        values = json.loads(payload[len(CURSOR_PREFIX):])
+        if len(values) != len(ordering):
+            raise ValueError
+        return [field.to_python(value) for (field, _), value in zip(ordering, values)]
+    except (ValueError, UnicodeDecodeError, ValidationError):
+        raise ValidationError(f"Invalid keyset cursor '{cursor}'.")
+
+
+def seek_filter(ordering, values, forward):
+    """Predicate for rows strictly after (or before) ``values`` in ``ordering``."""
+    condition = Q()
+    equal = Q()
+    for (field, descending), value in zip(ordering, values):
+        lookup = "lt" if descending == forward else "gt"
+        condition |= equal & Q(**{f"{field.attname}__{lookup}": value})
+        equal &= Q(**{field.attname: value})
+    # A redundant bound on the leading column lets the planner use a range
+    # scan on its index before evaluating the OR expansion.
+    field, descending = ordering[0]
+    bound = "lte" if descending == forward else "gte"
+    return Q(**{f"{field.attname}__{bound}": values[0]}) & condition
+
+
+def order_terms(ordering):
+    return [f"{'-' if descending else ''}{field.attname}" for field, descending in ordering]
+
+
+def paginate_keyset(connection_type, queryset, args, max_limit=None):
+    """Build a relay connection page from ``queryset`` with keyset cursors."""
+    if args.get("offset"):
+        raise ValidationError("offset cannot be combined with keyset pagination.")
+    first = args.get("first")
+    last = args.get("last")
+    after = args.get("after")
+    before = args.get("before")
+    if first is None and last is None:
+        first = max_limit
+
+    ordering = get_ordering(queryset)
+    queryset = queryset.order_by(*order_terms(ordering))
+    loaded, deferred = queryset.query.deferred_loading
+    if loaded and not deferred:
+        # Cursors read the sort key from every row, so it must not be deferred.
+        queryset = queryset.only(*loaded, *(field.name for field, _ in ordering))
+    matching = queryset
+    if after:
+        queryset = queryset.filter(seek_filter(ordering, decode_cursor(after, ordering), True))
+    if before:
+        queryset = queryset.filter(seek_filter(ordering, decode_cursor(before, ordering), False))
+
+    has_previous_page = has_next_page = False
+    if last is not None and first is None:
+        # Read backwards from the end (or from ``before``) and flip the page.
+        rows = list(queryset.reverse()[:last + 1])
+        has_previous_page = len(rows) > last
+        nodes = rows[:last][::-1]
+        has_next_page = bool(before)
+    else:
+        if first is not None:
+            rows = list(queryset[:first + 1])
+            has_next_page = len(rows) > first
+            nodes = rows[:first]
+        else:
+            nodes = list(queryset)
+        if last is not None and len(nodes) > last:
+            nodes = nodes[-last:]
+            has_previous_page = True
+        has_previous_page = has_previous_page or bool(after)
+
+    edges = [
+        connection_type.Edge(node=node, cursor=encode_cursor(node, ordering))
+        for node in nodes
+    ]
+    connection = connection_type(
+        edges=edges,
+        page_info=PageInfo(
+            start_cursor=edges[0].cursor if edges else None,
+            end_cursor=edges[-1].cursor if edges else None,
+            has_previous_page=has_previous_page,
+            has_next_page=has_next_page,
+        ),
+    )
+    # totalCount counts every matching row, not just those past the cursor.
+    connection.iterable = matching
+    connection.length = None
+    return connection
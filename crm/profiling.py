@@ -0,0 +1,238 @@
+"""
+Per-request profiling of GraphQL resolvers and the SQL they issue.
+
+Enabled with the ``CRM_PROFILING`` setting (sampled at
+``CRM_PROFILING_SAMPLE_RATE``). Two middlewares cooperate:
+
+* :class:`ProfilingMiddleware` (Django) starts a :class:`Profile` for the
+  request, wraps every database connection so each query is timed, and
+  writes the finished profile as one JSON line to the ``crm.profiling``
+  logger.
+* :class:`ResolverProfilingMiddleware` (graphene) times every resolver and
+  marks it as the current one, so queries are attributed to the field path
+  that issued them (``allOrders.edges.node.customer``). List indexes are
+  dropped from paths, so a field resolved once per row is one entry whose
+  ``calls`` and ``queries`` expose an N+1.
+
+Queries are grouped by SQL text: a statement run more than once shows up
+under ``duplicates`` with the paths that ran it. With
+``CRM_PROFILING_EXTENSIONS`` the profile is also returned in the response's
+``extensions.profile`` (see :class:`crm.views.CRMGraphQLView`), which also
+measures the time spent encoding the response.
+
+Database connections belong to a thread, and the async view
+(:class:`crm.views.AsyncCRMGraphQLView`) resolves fields in several
+threads, so a profile times the queries of whichever thread runs inside
+:meth:`Profile.connections` and tracks the current resolver per thread.
+"""
+import json
+import logging
+import random
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger("crm.profiling")
+
+# Longest SQL text kept in a report.
+MAX_SQL_LENGTH = 500
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 3)
+
+
+class Profile:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.duration = None
+        self.serialization = 0.0
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.resolvers = defaultdict(lambda: {"calls": 0, "time": 0.0, "queries": 0, "sql_time": 0.0})
+        self.statements = {}
+        self.query_count = 0
+        self.sql_time = 0.0
+
+    @property
+    def current(self):
+        """Path of the resolver running in this thread, or None."""
+        return getattr(self.local, "current", None)
+
+    @current.setter
+    def current(self, path):
+        self.local.current = path
+
+    @contextmanager
+    def connections(self):
+        """Time the queries this thread runs on any database."""
+        if getattr(self.local, "wrapped", False):
+            yield
+            return
+        self.local.wrapped = True
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(self.execute_wrapper))
+                yield
+        finally:
+            self.local.wrapped = False
+
+    def resolve(self, path, resolver, *args, **kwargs):
+        """Call ``resolver`` as the current resolver for ``path``."""
+        outer = self.current
+        self.current = path
+        started = time.perf_counter()
+        try:
+            return resolver(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - started
+            with self.lock:
+                entry = self.resolvers[path]
+                entry["calls"] += 1
+                entry["time"] += elapsed
+            self.current = outer
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.record_query(sql, params, time.perf_counter() - started)
+
+    def record_query(self, sql, params, elapsed):
+        with self.lock:
+            self._record_query(sql, params, elapsed)
+
+    def _record_query(self, sql, params, elapsed):
+        self.query_count += 1
+        self.sql_time += elapsed
+        path = self.current or "<request>"
+        if self.current:
+            entry = self.resolvers[path]
+            entry["queries"] += 1
+            entry["sql_time"] += elapsed
+        statement = self.statements.setdefault(
+            sql, {"count": 0, "time": 0.0, "params": set(), "paths": set()}
+        )
+        statement["count"] += 1
+        statement["time"] += elapsed
+        statement["params"].add(repr(params))
+        statement["paths"].add(path)
+
+    def finish(self):
+        self.duration = time.perf_counter() - self.started
+
+    def as_dict(self):
+        duration = self.duration if self.duration is not None else time.perf_counter() - self.started
+        resolvers = sorted(self.resolvers.items(), key=lambda item: -item[1]["time"])
+        duplicates = sorted(
+            (
+                (sql, statement)
+                for sql, statement in self.statements.items()
+                if statement["count"] > 1
+            ),
+            key=lambda item: -item[1]["count"],
+        )
+        return {
+            "duration_ms": _ms(duration),
+            "serialization_ms": _ms(self.serialization),
+            "resolvers": [
+                {
+                    "path": path,
+                    "calls": entry["calls"],
+                    "time_ms": _ms(entry["time"]),
+                    "queries": entry["queries"],
+                    "sql_time_ms": _ms(entry["sql_time"]),
+                }
+                for path, entry in resolvers
+            ],
+            "sql": {
+                "count": self.query_count,
+                "time_ms": _ms(self.sql_time),
+                "duplicates": [
+                    {
+                        "sql": sql[:MAX_SQL_LENGTH],
+                        "count": statement["count"],
+                        # Fewer distinct parameter sets than runs means the
+                        # very same query was repeated.
+                        "distinct_params": len(statement["params"]),
+                        "time_ms": _ms(statement["time"]),
+                        "paths": sorted(statement["paths"]),
+                    }
+                    for sql, statement in duplicates
+                ],
+            },
+        }
+
+
+def get_profile(request):
+    return getattr(request, "crm_profile", None)
+
+
+def field_path(info):
+    return ".".join(str(key) for key in info.path.as_list() if not isinstance(key, int))
+
+
+class ProfilingMiddleware:
+    """Django middleware that profiles a sample of requests."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        profile = self.start(request)
+        if profile is None:
+            return self.get_response(request)
+        with profile.connections():
+            response = self.get_response(request)
+        return self.finish(request, response, profile)
+
+    async def __acall__(self, request):
+        # No query runs on the event loop: the async view wraps the
+        # connections of the threads it hands work to.
+        profile = self.start(request)
+        response = await self.get_response(request)
+        if profile is None:
+            return response
+        return self.finish(request, response, profile)
+
+    def start(self, request):
+        if not getattr(settings, "CRM_PROFILING", False):
+            return None
+        if random.random() >= getattr(settings, "CRM_PROFILING_SAMPLE_RATE", 1.0):
+            return None
+        request.crm_profile = Profile()
+        return request.crm_profile
+
+    def finish(self, request, response, profile):
+        profile.finish()
+        logger.info(json.dumps({
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            **profile.as_dict(),
+        }))
+        return response
+
+
+class ResolverProfilingMiddleware:
+    """Graphene middleware that times resolvers for a profiled request."""
+
+    def resolve(self, next, root, info, **args):
+        profile = get_profile(info.context)
+        if profile is None:
+            return next(root, info, **args)
+        return profile.resolve(field_path(info), next, root, info, **args)
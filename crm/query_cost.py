@@ -0,0 +1,175 @@
+"""
+Static cost and depth analysis of GraphQL operations.
+
+:class:`crm.views.CRMGraphQLView` analyses every operation after
+validation and before execution, and rejects one whose estimated cost
+exceeds ``CRM_QUERY_MAX_COST`` or whose depth exceeds
+``CRM_QUERY_MAX_DEPTH`` (None disables a limit). The numbers are reported
+under ``extensions.cost`` of the response.
+
+The cost estimates how many objects the operation can resolve:
+
+* a connection costs its page size, ``first`` or ``last`` (from literals or
+  variables), else ``CRM_DEFAULT_PAGE_SIZE``, times the number of parents
+  it is resolved for, which multiplies down the tree;
+* a list field is counted like a connection of the default page size;
+* a single related object (``order.customer``) costs nothing itself: it
+  adds at most one object per parent, loaded in one batch with the others;
+* scalars, and the relay plumbing (``edges``, ``node``, ``pageInfo``),
+  cost nothing.
+
+So ``allCustomers(first: 100) { edges { node { orders(first: 100) { ... } } } }``
+costs 100 + 100 * 100, with or without ``customer`` on each order. Depth counts nested object fields the same way,
+without the relay plumbing: ``allOrders { edges { node { customer { name } } } }``
+has depth 2.
+"""
+from django.conf import settings
+from graphene.relay.connection import Connection
+from graphql import (
+    FieldNode,
+    FragmentDefinitionNode,
+    FragmentSpreadNode,
+    GraphQLError,
+    InlineFragmentNode,
+    IntValueNode,
+    VariableNode,
+    get_named_type,
+    get_nullable_type,
+    get_operation_ast,
+    is_composite_type,
+    is_list_type,
+)
+
+
+def default_page_size():
+    return getattr(settings, "CRM_DEFAULT_PAGE_SIZE", 100)
+
+
+class QueryCost:
+    def __init__(self, cost, depth):
+        self.cost = cost
+        self.depth = depth
+        self.max_cost = getattr(settings, "CRM_QUERY_MAX_COST", None)
+        self.max_depth = getattr(settings, "CRM_QUERY_MAX_DEPTH", None)
+
+    def errors(self):
+        errors = []
+        if self.max_depth is not None and self.depth > self.max_depth:
+            errors.append(GraphQLError(
+                f"Query depth {self.depth} exceeds the maximum of {self.max_depth}.",
+                extensions={"code": "QUERY_TOO_DEEP"},
+            ))
+        if self.max_cost is not None and self.cost > self.max_cost:
+            errors.append(GraphQLError(
+                f"Query cost {self.cost} exceeds the maximum of {self.max_cost}; "
+                "request smaller pages with first or last.",
+                extensions={"code": "QUERY_TOO_COMPLEX"},
+            ))
+        return errors
+
+    def as_dict(self):
+        return {
+            "estimated": self.cost,
+            "depth": self.depth,
+            "max_cost": self.max_cost,
+            "max_depth": self.max_depth,
+        }
+
+
+def _is_subclass(graphql_type, base):
+    graphene_type = getattr(graphql_type, "graphene_type", None)
+    return isinstance(graphene_type, type) and issubclass(graphene_type, base)
+
+
+class _Analyzer:
+    def __init__(self, schema, document, variables):
+        self.schema = schema
+        self.variables = variables or {}
+        self.fragments = {
+            definition.name.value: definition
+            for definition in document.definitions
+            if isinstance(definition, FragmentDefinitionNode)
+        }
+        self.defaults = {}
+
+    def page_size(self, node):
+        for argument in node.arguments:
+            if argument.name.value not in ("first", "last"):
+                continue
+            value = argument.value
+            if isinstance(value, IntValueNode):
+                return max(int(value.value), 0)
+            if isinstance(value, VariableNode):
+                name = value.name.value
+                size = self.variables.get(name, self.defaults.get(name))
+                if isinstance(size, int):
+                    return max(size, 0)
+        return default_page_size()
+
+    def fields(self, parent_type, selection_set, visited=()):
+        """(field node, parent type) for every field, through fragments."""
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                yield selection, parent_type
+            elif isinstance(selection, InlineFragmentNode):
+                condition = selection.type_condition
+                fragment_type = (
+                    self.schema.get_type(condition.name.value) if condition else parent_type
+                )
+                yield from self.fields(fragment_type, selection.selection_set, visited)
+            elif isinstance(selection, FragmentSpreadNode):
+                name = selection.name.value
+                fragment = self.fragments.get(name)
+                if fragment is None or name in visited:
+                    continue
+                fragment_type = self.schema.get_type(fragment.type_condition.name.value)
+                yield from self.fields(
+                    fragment_type, fragment.selection_set, (*visited, name)
+                )
+
+    def measure(self, parent_type, selection_set, multiplier, wrappers=0):
+        """
+        Return (cost, depth) of ``selection_set`` resolved ``multiplier`` times.
+
+        ``wrappers`` is the number of relay plumbing levels still to cross
+        before reaching nodes: 2 in a connection (``edges``/``pageInfo``),
+        1 in an edge (``node``).
+        """
+        cost = depth = 0
+        for node, node_parent in self.fields(parent_type, selection_set):
+            fields = getattr(node_parent, "fields", None) or {}
+            field = fields.get(node.name.value)
+            if field is None or node.selection_set is None:
+                continue
+            field_type = get_nullable_type(field.type)
+            named = get_named_type(field_type)
+            if not is_composite_type(named):
+                continue
+            inner = 0
+            if wrappers:
+                count, own_cost, level, inner = multiplier, 0, 0, wrappers - 1
+            elif _is_subclass(named, Connection):
+                count = multiplier * self.page_size(node)
+                own_cost, level, inner = count, 1, 2
+            elif is_list_type(field_type):
+                count = multiplier * default_page_size()
+                own_cost, level = count, 1
+            else:
+                count, own_cost, level = multiplier, 0, 1
+            child_cost, child_depth = self.measure(named, node.selection_set, count, inner)
+            cost += own_cost + child_cost
+            depth = max(depth, level + child_depth)
+        return cost, depth
+
+
+def analyze(schema, document, operation_name=None, variables=None):
+    """:class:`QueryCost` of the operation ``operation_name`` in ``document``."""
+    operation = get_operation_ast(document, operation_name)
+    if operation is None:
+        return QueryCost(0, 0)
+    analyzer = _Analyzer(schema, document, variables)
+    for definition in operation.variable_definitions:
+        if isinstance(definition.default_value, IntValueNode):
+            analyzer.defaults[definition.variable.name.value] = int(definition.default_value.value)
+    root = schema.get_root_type(operation.operation)
+    return QueryCost(*analyzer.measure(root, operation.selection_set, 1))
@@ -0,0 +1,199 @@
+"""
+Response cache for read-only GraphQL operations on the ``/graphql`` view.
+
+Dashboards poll the same queries over and over; with ``CRM_RESPONSE_CACHE``
+on, :class:`crm.views.CRMGraphQLView` stores the encoded JSON body of every
+successful query operation (never a mutation) in the
+``CRM_RESPONSE_CACHE_ALIAS`` cache for ``CRM_RESPONSE_CACHE_TIMEOUT``
+seconds. Eviction is the cache backend's: ``LocMemCache`` drops the least
+recently used entries past ``MAX_ENTRIES``, Redis follows its
+``maxmemory-policy`` (``allkeys-lru``).
+
+The key is a digest of the normalized document (re-printed from its AST,
+so whitespace and comments do not matter), the variables, the operation
+name, the user and the current *generation* of every model the document
+reads. Models are found from the types of the selected fields
+(``DjangoObjectType`` models, connection nodes, or a ``cache_models``
+attribute on other types). :func:`invalidate` bumps a model's generation,
+which orphans every entry built from it; the orphans age out with the TTL.
+
+Generations are bumped by ``post_save``/``post_delete``/``m2m_changed``
+receivers (``crm.signals``) and explicitly by the set-based write paths
+that send no signals (``update()``, ``bulk_create()``, raw SQL). Inside a
+transaction the bump is repeated on commit, so a response computed from
+data read before the commit cannot be stored under the new generation.
+
+Hits and misses are counted in the cache too, so :func:`stats` adds up
+every process sharing it.
+
+Generations live in the same cache, so every worker process must share
+it (Redis, Memcached): with a per-process ``LocMemCache`` a write only
+invalidates the responses cached by the process that made it. The
+``crm.W001`` system check warns about that configuration.
+"""
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from graphql import (
+    OperationType,
+    TypeInfo,
+    TypeInfoVisitor,
+    Visitor,
+    get_named_type,
+    get_operation_ast,
+    print_ast,
+    visit,
+)
+
+from crm.documents import get_document
+
+PREFIX = "crm:gql"
+
+
+def is_enabled():
+    return getattr(settings, "CRM_RESPONSE_CACHE", False)
+
+
+def get_cache():
+    return caches[getattr(settings, "CRM_RESPONSE_CACHE_ALIAS", "default")]
+
+
+def _generation_key(label):
+    return f"{PREFIX}:gen:{label}"
+
+
+def _bump(labels):
+    cache = get_cache()
+    for label in labels:
+        try:
+            cache.incr(_generation_key(label))
+        except ValueError:
+            # Never set, or evicted: start from a value no old entry used.
+            cache.set(_generation_key(label), time.time_ns(), None)
+
+
+def invalidate(*models, using=None):
+    """
+    Make every cached response that reads ``models`` stale.
+
+    Call it after the write: outside a transaction the bump is immediate.
+    """
+    if not is_enabled():
+        return
+    labels = sorted({model._meta.label_lower for model in models})
+    _bump(labels)
+    if transaction.get_connection(using).in_atomic_block:
+        transaction.on_commit(lambda: _bump(labels), using=using)
+
+
+def generations(models):
+    cache = get_cache()
+    keys = {_generation_key(model._meta.label_lower): model for model in models}
+    current = cache.get_many(list(keys))
+    for key in keys:
+        if key not in current:
+            cache.add(key, time.time_ns(), None)
+            current[key] = cache.get(key)
+    return [current[key] for key in sorted(keys)]
+
+
+def _models_for(graphql_type):
+    graphene_type = getattr(graphql_type, "graphene_type", None)
+    if graphene_type is None:
+        return ()
+    if hasattr(graphene_type, "cache_models"):
+        return graphene_type.cache_models
+    meta = getattr(graphene_type, "_meta", None)
+    node = getattr(meta, "node", None)
+    if node is not None:
+        meta = node._meta
+    model = getattr(meta, "model", None)
+    return (model,) if model is not None else ()
+
+
+def read_models(schema, document):
+    """Models whose rows can appear in the response to ``document``."""
+    type_info = TypeInfo(schema)
+    models = set()
+
+    class Collector(Visitor):
+        def enter_field(self, node, *args):
+            field_type = type_info.get_type()
+            if field_type is not None:
+                models.update(_models_for(get_named_type(field_type)))
+
+    visit(document, TypeInfoVisitor(type_info, Collector()))
+    return models
+
+
+def response_key(request, schema, query, variables, operation_name, pretty=False):
+    """
+    Cache key for a request, or None when its response must not be cached
+    (not a query operation, or a document that does not parse).
+    """
+    if not query:
+        return None
+    document = get_document(query).ast
+    if document is None:
+        return None
+    operation = get_operation_ast(document, operation_name)
+    if operation is None or operation.operation != OperationType.QUERY:
+        return None
+    models = read_models(schema, document)
+    user = getattr(request, "user", None)
+    payload = json.dumps(
+        [
+            print_ast(document),
+            variables or {},
+            operation_name,
+            user.pk if user is not None and user.is_authenticated else None,
+            pretty,
+            generations(models),
+        ],
+        sort_keys=True,
+        default=str,
+    )
+    return f"{PREFIX}:response:{hashlib.sha256(payload.encode()).hexdigest()}"
+
+
+def fetch(key):
+    cache = get_cache()
+    body = cache.get(key)
+    _count("hits" if body is not None else "misses")
+    return body
+
+
+def store(key, body):
+    get_cache().set(key, body, getattr(settings, "CRM_RESPONSE_CACHE_TIMEOUT", 30))
+
+
+def _count(name):
+    cache = get_cache()
+    key = f"{PREFIX}:stats:{name}"
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, None):
+            cache.incr(key)
+
+
+def stats():
+    cache = get_cache()
+    counts = cache.get_many([f"{PREFIX}:stats:hits", f"{PREFIX}:stats:misses"])
+    hits = counts.get(f"{PREFIX}:stats:hits", 0)
+    misses = counts.get(f"{PREFIX}:stats:misses", 0)
+    total = hits + misses
+    return {
+        "enabled": is_enabled(),
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": round(hits / total, 4) if total else None,
+    }
+
+
+def reset_stats():
+    get_cache().delete_many([f"{PREFIX}:stats:hits", f"{PREFIX}:stats:misses"])
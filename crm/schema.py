@@ -1,38 +1,119 @@
 import graphene
 from graphene_django import DjangoObjectType
-from graphene_django.filter import DjangoFilterConnectionField
 from crm.models import Customer
 from crm.models import Product
 from crm.models import Order
+from crm.models import OrderItem
+from crm import response_cache
 from crm.filters import CustomerFilter, ProductFilter, OrderFilter
+from crm.counting import CRMConnection
+from crm.fields import CRMConnectionField, is_filtered, page_end
+from crm.loaders import get_loaders
+from crm.optimizer import optimize_queryset
+from crm.services import place_order, place_orders, restock_low_stock
+from django.conf import settings
 from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Count, DecimalField, Q, Sum
+from django.db.models.functions import Coalesce, Trunc
 
 
 # DjangoObjectType Definitions
 
 class CustomerType(DjangoObjectType):
+    orders = CRMConnectionField(lambda: OrderType, required=True)
+
     class Meta:
         model = Customer
         filterset_class = CustomerFilter
         interfaces = (graphene.relay.Node,)
+        connection_class = CRMConnection
         fields = "__all__"
 
+    @classmethod
+    def get_node(cls, info, id):
+        return get_loaders(info).customers.load(Customer._meta.pk.to_python(id))
+
+    def resolve_orders(self, info, **kwargs):
+        limit = page_end(kwargs)
+        if is_filtered(kwargs) or limit is None:
+            return self.orders.all()
+        return get_loaders(info).customer_orders.load((self.pk, limit))
+
 
 class ProductType(DjangoObjectType):
     class Meta:
         model = Product
         filterset_class = ProductFilter
         interfaces = (graphene.relay.Node,)
+        connection_class = CRMConnection
         fields = "__all__"
 
+    @classmethod
+    def get_node(cls, info, id):
+        return get_loaders(info).products.load(Product._meta.pk.to_python(id))
+
+
+class OrderItemType(DjangoObjectType):
+    # Items change with their order (crm.response_cache).
+    cache_models = (Order,)
+
+    class Meta:
+        model = OrderItem
+        fields = ("product", "quantity")
+
+    def resolve_product(self, info):
+        return get_loaders(info).products.load(self.product_id)
+
 
 class OrderType(DjangoObjectType):
+    products = CRMConnectionField(ProductType, required=True)
+    items = graphene.List(graphene.NonNull(OrderItemType), required=True)
+
     class Meta:
         model = Order
         filterset_class = OrderFilter
         interfaces = (graphene.relay.Node,)
+        connection_class = CRMConnection
         fields = "__all__"
 
+    def resolve_customer(self, info):
+        if Order.customer.is_cached(self):
+            return self.customer
+        return get_loaders(info).customers.load(self.customer_id)
+
+    def resolve_products(self, info, **kwargs):
+        if is_filtered(kwargs):
+            return self.products.all()
+        return get_loaders(info).order_products.load(self.pk)
+
+    def resolve_items(self, info):
+        return get_loaders(info).order_items.load(self.pk)
+
+
+# Summary Types
+
+class SummaryPeriod(graphene.Enum):
+    DAY = "day"
+    WEEK = "week"
+    MONTH = "month"
+
+
+class CRMSummaryPeriodType(graphene.ObjectType):
+    period = graphene.DateTime()
+    order_count = graphene.Int()
+    revenue = graphene.Decimal()
+
+
+class CRMSummaryType(graphene.ObjectType):
+    # Aggregated from these tables (crm.response_cache).
+    cache_models = (Customer, Order)
+
+    customer_count = graphene.Int()
+    order_count = graphene.Int()
+    revenue = graphene.Decimal()
+    breakdown = graphene.List(CRMSummaryPeriodType)
+
 
 # Input Objects
 
@@ -64,20 +145,41 @@ class CreateCustomer(graphene.Mutation):
 class BulkCreateCustomers(graphene.Mutation):
     class Arguments:
         customers = graphene.List(lambda: CustomerInput)
+        batch_size = graphene.Int()
 
     created_customers = graphene.List(CustomerType)
     errors = graphene.List(graphene.String)
 
-    def mutate(self, info, customers):
-        created = []
+    def mutate(self, info, customers, batch_size=None):
+        batch_size = batch_size or getattr(settings, "CRM_BULK_CREATE_BATCH_SIZE", 500)
+        if batch_size <= 0:
+            raise ValidationError("batch_size must be positive.")
+
+        # One email__in lookup per batch keeps each query under the
+        # backend's bound-parameter limit.
+        emails = list(dict.fromkeys(c.email for c in customers))
+        taken = set()
+        for start in range(0, len(emails), batch_size):
+            taken.update(
+                Customer.objects.filter(
+                    email__in=emails[start:start + batch_size]
+                ).values_list("email", flat=True)
+            )
+
+        # Repeats within the payload are reported like rows that already
+        # exist, exactly as the row-by-row version did.
+        pending = []
         errors = []
         for c in customers:
-            if Customer.objects.filter(email=c.email).exists():
+            if c.email in taken:
                 errors.append(f"Email {c.email} already exists.")
                 continue
-            customer = Customer(name=c.name, email=c.email, phone=c.phone)
-            customer.save()
-            created.append(customer)
+            taken.add(c.email)
+            pending.append(Customer(name=c.name, email=c.email, phone=c.phone))
+
+        with transaction.atomic():
+            created = Customer.objects.bulk_create(pending, batch_size=batch_size)
+            response_cache.invalidate(Customer)
         return BulkCreateCustomers(created_customers=created, errors=errors)
 
 
@@ -99,51 +201,103 @@ class CreateProduct(graphene.Mutation):
         return CreateProduct(product=product)
 
 
+class OrderItemInput(graphene.InputObjectType):
+    product_id = graphene.ID(required=True)
+    quantity = graphene.Int(default_value=1)
+
+
+def order_quantities(product_ids=None, items=None):
+    """Merge ``productIds`` (one of each) and ``items`` into ``{pk: quantity}``."""
+    quantities = {}
+    entries = [(pk, 1) for pk in product_ids or []]
+    entries += [(item.product_id, item.quantity) for item in items or []]
+    for product_id, quantity in entries:
+        if quantity is None or quantity <= 0:
+            raise ValidationError("Quantity must be positive.")
+        pk = Product._meta.pk.to_python(product_id)
+        quantities[pk] = quantities.get(pk, 0) + quantity
+    if not quantities:
+        raise ValidationError("At least one product must be selected.")
+    return quantities
+
+
 class CreateOrder(graphene.Mutation):
     class Arguments:
         customer_id = graphene.ID(required=True)
-        product_ids = graphene.List(graphene.ID, required=True)
+        product_ids = graphene.List(graphene.ID)
+        items = graphene.List(graphene.NonNull(OrderItemInput))
 
     order = graphene.Field(OrderType)
 
-    def mutate(self, info, customer_id, product_ids):
+    def mutate(self, info, customer_id, product_ids=None, items=None):
         try:
             customer = Customer.objects.get(pk=customer_id)
-        except Customer.DoesNotExist:
+        except (Customer.DoesNotExist, ValueError):
             raise ValidationError("Invalid customer ID.")
 
-        if not product_ids:
-            raise ValidationError("At least one product must be selected.")
+        quantities = order_quantities(product_ids, items)
+        order = place_order(customer, quantities)
+        return CreateOrder(order=order)
 
-        products = Product.objects.filter(pk__in=product_ids)
-        if not products.exists():
-            raise ValidationError("Invalid product IDs.")
 
-        order = Order(customer=customer)
-        order.save()
-        order.products.set(products)
-        order.total_amount = sum(p.price for p in products)
-        order.save()
+class BulkOrderInput(graphene.InputObjectType):
+    customer_id = graphene.ID(required=True)
+    product_ids = graphene.List(graphene.ID)
+    items = graphene.List(graphene.NonNull(OrderItemInput))
 
-        return CreateOrder(order=order)
+
+class BulkCreateOrders(graphene.Mutation):
+    class Arguments:
+        orders = graphene.List(graphene.NonNull(BulkOrderInput), required=True)
+        batch_size = graphene.Int()
+
+    created_orders = graphene.List(OrderType)
+    errors = graphene.List(graphene.String)
+
+    def mutate(self, info, orders, batch_size=None):
+        batch_size = batch_size or getattr(settings, "CRM_BULK_CREATE_BATCH_SIZE", 500)
+        if batch_size <= 0:
+            raise ValidationError("batch_size must be positive.")
+
+        # Inputs that fail on their own are reported without a lookup.
+        requests, positions, messages = [], [], {}
+        for index, entry in enumerate(orders):
+            try:
+                customer_pk = Customer._meta.pk.to_python(entry.customer_id)
+            except ValidationError:
+                messages[index] = "Invalid customer ID."
+                continue
+            try:
+                quantities = order_quantities(entry.product_ids, entry.items)
+            except ValidationError as error:
+                messages[index] = error.messages[0]
+                continue
+            requests.append((customer_pk, quantities))
+            positions.append(index)
+
+        created, rejected = place_orders(requests, batch_size)
+        for position, message in rejected.items():
+            messages[positions[position]] = message
+        errors = [f"Order {index + 1}: {messages[index]}" for index in sorted(messages)]
+
+        get_loaders(info).enqueue(created)
+        return BulkCreateOrders(created_orders=created, errors=errors)
 
 
 class UpdateLowStockProducts(graphene.Mutation):
     class Arguments:
         increment_by = graphene.Int(default_value=10)
+        threshold = graphene.Int(default_value=10)
 
     products = graphene.List(ProductType)
     message = graphene.String()
 
-    def mutate(self, info, increment_by=10):
+    def mutate(self, info, increment_by=10, threshold=10):
         if increment_by <= 0:
             raise ValidationError("increment_by must be positive.")
-        low_stock_qs = Product.objects.filter(stock__lt=10)
-        updated = []
-        for product in low_stock_qs:
-            product.stock += increment_by
-            product.save()
-            updated.append(product)
+        if threshold <= 0:
+            raise ValidationError("threshold must be positive.")
+        updated = restock_low_stock(threshold, increment_by)
         message = f"Updated {len(updated)} low-stock product(s)."
         return UpdateLowStockProducts(products=updated, message=message)
 
@@ -155,6 +309,7 @@ class Mutation(graphene.ObjectType):
     bulk_create_customers = BulkCreateCustomers.Field()
     create_product = CreateProduct.Field()
     create_order = CreateOrder.Field()
+    bulk_create_orders = BulkCreateOrders.Field()
     update_low_stock_products = UpdateLowStockProducts.Field()
 
 
@@ -162,37 +317,81 @@ class Mutation(graphene.ObjectType):
 
 class Query(graphene.ObjectType):
     customer = graphene.relay.Node.Field(CustomerType)
-    all_customers = DjangoFilterConnectionField(
+    all_customers = CRMConnectionField(
         CustomerType,
-        order_by=graphene.List(of_type=graphene.String)
+        order_by=graphene.List(of_type=graphene.String),
+        keyset=True,
     )
 
     product = graphene.relay.Node.Field(ProductType)
-    all_products = DjangoFilterConnectionField(
+    all_products = CRMConnectionField(
         ProductType,
-        order_by=graphene.List(of_type=graphene.String)
+        order_by=graphene.List(of_type=graphene.String),
+        keyset=True,
     )
 
     order = graphene.relay.Node.Field(OrderType)
-    all_orders = DjangoFilterConnectionField(
+    all_orders = CRMConnectionField(
         OrderType,
-        order_by=graphene.List(of_type=graphene.String)
+        order_by=graphene.List(of_type=graphene.String),
+        keyset=True,
     )
 
+    crm_summary = graphene.Field(
+        CRMSummaryType,
+        order_date_gte=graphene.DateTime(),
+        order_date_lte=graphene.DateTime(),
+        period=SummaryPeriod(),
+    )
+
+    def resolve_crm_summary(self, info, order_date_gte=None, order_date_lte=None, period=None):
+        window = Q()
+        order_window = Q(orders__isnull=False)
+        if order_date_gte:
+            window &= Q(order_date__gte=order_date_gte)
+            order_window &= Q(orders__order_date__gte=order_date_gte)
+        if order_date_lte:
+            window &= Q(order_date__lte=order_date_lte)
+            order_window &= Q(orders__order_date__lte=order_date_lte)
+        # Customers LEFT JOIN orders: every order appears exactly once, so the
+        # totals of both tables come back from a single aggregate query.
+        totals = Customer.objects.aggregate(
+            customer_count=Count("id", distinct=True),
+            order_count=Count("orders", filter=order_window),
+            revenue=Coalesce(
+                Sum("orders__total_amount", filter=order_window),
+                0,
+                output_field=DecimalField(max_digits=12, decimal_places=2),
+            ),
+        )
+
+        breakdown = None
+        if period:
+            rows = (
+                Order.objects.filter(window)
+                .annotate(period=Trunc("order_date", period.value))
+                .values("period")
+                .annotate(order_count=Count("id"), revenue=Sum("total_amount"))
+                .order_by("period")
+            )
+            breakdown = [CRMSummaryPeriodType(**row) for row in rows]
+
+        return CRMSummaryType(breakdown=breakdown, **totals)
+
     def resolve_all_customers(self, info, order_by=None, **kwargs):
-        qs = Customer.objects.all()
+        qs = optimize_queryset(Customer.objects.all(), info)
         if order_by:
             qs = qs.order_by(*order_by)
         return qs
 
     def resolve_all_products(self, info, order_by=None, **kwargs):
-        qs = Product.objects.all()
+        qs = optimize_queryset(Product.objects.all(), info)
         if order_by:
             qs = qs.order_by(*order_by)
         return qs
 
     def resolve_all_orders(self, info, order_by=None, **kwargs):
-        qs = Order.objects.all()
+        qs = optimize_queryset(Order.objects.all(), info)
         if order_by:
             qs = qs.order_by(*order_by)
         return qs
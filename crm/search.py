@@ -0,0 +1,142 @@
+"""
+Pluggable search backends behind the CRM name/email filters.
+
+``icontains`` compiles to ``LIKE '%x%'``, which a B-tree index cannot serve.
+The backend is picked by the ``CRM_SEARCH_BACKEND`` setting:
+
+* ``"fts5"``    -- SQLite FTS5 tables with the trigram tokenizer, kept in
+  sync by triggers (migration 0003). Substring matches of three or more
+  characters go through the index; shorter terms fall back to ``icontains``.
+* ``"trigram"`` -- PostgreSQL ``pg_trgm`` GIN indexes, which serve Django's
+  ``icontains`` as-is and rank ``search`` results by word similarity.
+* ``"like"``    -- plain ``icontains`` with no ranking.
+* ``"auto"``    -- (default) whichever of the above the database supports.
+
+Both filtering (``contains``) and the ranked ``search`` argument keep the
+case-insensitive substring semantics of the original filters.
+"""
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import F, FloatField, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from crm.models import Customer, CustomerSearchIndex, Product, ProductSearchIndex
+
+# Ranked searches are annotated with this; higher is more relevant.
+RANK = "search_rank"
+
+
+def resolve_path(model, path):
+    """Split ``"customer__name"`` into ``("customer__", Customer, "name")``."""
+    *relations, column = path.split("__")
+    for relation in relations:
+        model = model._meta.get_field(relation).related_model
+    prefix = "".join(f"{relation}__" for relation in relations)
+    return prefix, model, column
+
+
+class LikeSearchBackend:
+    name = "like"
+
+    def contains(self, queryset, path, value):
+        return queryset.filter(**{f"{path}__icontains": value})
+
+    def search(self, queryset, paths, value):
+        condition = Q()
+        for path in paths:
+            condition |= Q(**{f"{path}__icontains": value})
+        return queryset.filter(condition).annotate(
+            **{RANK: Value(0.0, output_field=FloatField())}
+        )
+
+
+class FTS5SearchBackend(LikeSearchBackend):
+    name = "fts5"
+    min_length = 3  # shortest term the trigram tokenizer can match
+    indexes = {Customer: CustomerSearchIndex, Product: ProductSearchIndex}
+
+    @staticmethod
+    def phrase(columns, value):
+        quoted = '"' + value.replace('"', '""') + '"'
+        return "{%s} : %s" % (" ".join(columns), quoted)
+
+    def _groups(self, queryset, paths):
+        """Group ``paths`` by the indexed model they point at."""
+        groups = {}
+        for path in paths:
+            prefix, model, column = resolve_path(queryset.model, path)
+            if model not in self.indexes:
+                return None
+            groups.setdefault((prefix, model), []).append(column)
+        return groups
+
+    def contains(self, queryset, path, value):
+        return self.search(queryset, [path], value, rank=False)
+
+    def search(self, queryset, paths, value, rank=True):
+        groups = self._groups(queryset, paths)
+        if len(value) < self.min_length or groups is None:
+            if rank:
+                return super().search(queryset, paths, value)
+            return super().contains(queryset, paths[0], value)
+
+        condition = Q()
+        ranks = []
+        for (prefix, model), columns in groups.items():
+            matches = self.indexes[model].objects.filter(
+                document__match=self.phrase(columns, value)
+            )
+            condition |= Q(**{f"{prefix}pk__in": matches.values("rowid")})
+            if rank:
+                # bm25 scores are negative, more negative is more relevant.
+                ranks.append(
+                    Subquery(
+                        matches.filter(rowid=OuterRef(f"{prefix}pk")).values("rank")[:1],
+                        output_field=FloatField(),
+                    )
+                )
+        queryset = queryset.filter(condition)
+        if not rank:
+            return queryset
+        scores = [Coalesce(-score, Value(0.0)) for score in ranks]
+        score = scores[0] if len(scores) == 1 else Greatest(*scores)
+        return queryset.annotate(**{RANK: score})
+
+
+class TrigramSearchBackend(LikeSearchBackend):
+    name = "trigram"
+
+    def search(self, queryset, paths, value):
+        from django.contrib.postgres.search import TrigramWordSimilarity
+
+        queryset = super().search(queryset, paths, value)
+        scores = [TrigramWordSimilarity(value, F(path)) for path in paths]
+        score = scores[0] if len(scores) == 1 else Greatest(*scores)
+        return queryset.annotate(**{RANK: score})
+
+
+BACKENDS = {
+    backend.name: backend()
+    for backend in (LikeSearchBackend, FTS5SearchBackend, TrigramSearchBackend)
+}
+
+
+@lru_cache(maxsize=None)
+def detect_backend(alias):
+    connection = connections[alias]
+    if connection.vendor == "postgresql":
+        return "trigram"
+    if connection.vendor == "sqlite":
+        tables = connection.introspection.table_names()
+        if CustomerSearchIndex._meta.db_table in tables:
+            return "fts5"
+    return "like"
+
+
+def get_search_backend(alias="default"):
+    name = getattr(settings, "CRM_SEARCH_BACKEND", "auto")
+    if name == "auto":
+        name = detect_backend(alias)
+    return BACKENDS[name]
@@ -0,0 +1,312 @@
+"""
+Set-based write paths shared by the CRM mutations and jobs.
+"""
+from django.core.exceptions import ValidationError
+from django.db import connections, router, transaction
+from django.db.models import (
+    Case, DecimalField, F, OuterRef, Q, Subquery, Sum, Value, When,
+)
+from django.db.models.functions import Coalesce, Round
+
+from crm import response_cache
+from crm.models import Customer, Order, OrderItem, Product
+
+
+def supports_update_returning(connection):
+    """PostgreSQL and SQLite >= 3.35 accept ``UPDATE ... RETURNING``."""
+    if connection.vendor == "postgresql":
+        return True
+    if connection.vendor == "sqlite":
+        return connection.Database.sqlite_version_info >= (3, 35)
+    return False
+
+
+def restock_low_stock(threshold, increment_by):
+    """
+    Add ``increment_by`` to every product with ``stock < threshold``.
+
+    The increment is a single ``UPDATE ... SET stock = stock + N`` so it
+    never overwrites a concurrent decrement. Returns the updated products,
+    read back with RETURNING where the backend has it, otherwise with one
+    fetch of the rows locked before the update.
+    """
+    using = router.db_for_write(Product)
+    connection = connections[using]
+    if supports_update_returning(connection):
+        products = _restock_returning(connection, using, threshold, increment_by)
+    else:
+        products = _restock_locked(using, threshold, increment_by)
+    response_cache.invalidate(Product, using=using)
+    return products
+
+
+def _restock_locked(using, threshold, increment_by):
+    with transaction.atomic(using=using):
+        ids = list(
+            Product.objects.using(using)
+            .select_for_update()
+            .filter(stock__lt=threshold)
+            .values_list("pk", flat=True)
+        )
+        Product.objects.using(using).filter(pk__in=ids).update(
+            stock=F("stock") + increment_by
+        )
+        return list(Product.objects.using(using).filter(pk__in=ids).order_by("pk"))
+
+
+def _restock_returning(connection, using, threshold, increment_by):
+    quote = connection.ops.quote_name
+    stock = quote(Product._meta.get_field("stock").column)
+    sql = "UPDATE {table} SET {stock} = {stock} + %s WHERE {stock} < %s RETURNING {columns}".format(
+        table=quote(Product._meta.db_table),
+        stock=stock,
+        columns=", ".join(quote(f.column) for f in Product._meta.concrete_fields),
+    )
+    # raw() maps the returned rows onto Product instances with the usual
+    # field conversions.
+    with transaction.atomic(using=using):
+        products = list(
+            Product.objects.db_manager(using).raw(sql, [increment_by, threshold])
+        )
+    return sorted(products, key=lambda product: product.pk)
+
+
+def order_total():
+    """Expression for an order's total, correlated on the outer order's pk."""
+    output_field = Order._meta.get_field("total_amount")
+    totals = (
+        OrderItem.objects.filter(order=OuterRef("pk"))
+        .values("order")
+        # Rounded to the column's scale: SQLite sums decimals as floats, and
+        # 43.15 stored must compare equal to 16.89 + 26.26 summed.
+        .annotate(total=Round(
+            Sum(F("quantity") * F("product__price")),
+            output_field.decimal_places,
+        ))
+        .values("total")
+    )
+    return Coalesce(
+        Subquery(totals, output_field=output_field),
+        Value(0, output_field=DecimalField()),
+        output_field=output_field,
+    )
+
+
+def refresh_order_totals(orders):
+    """Recompute ``total_amount`` for the ``orders`` queryset in one UPDATE.
+
+    Only rows whose stored total is wrong are written; returns their number.
+    """
+    total = order_total()
+    fixed = orders.exclude(total_amount=total).update(total_amount=total)
+    if fixed:
+        response_cache.invalidate(Order, using=router.db_for_write(Order))
+    return fixed
+
+
+class StockUnavailable(Exception):
+    """Raised inside a transaction to roll back a partial reservation."""
+
+
+def place_order(customer, quantities):
+    """
+    Create an order for ``customer`` from ``{product_pk: quantity}``.
+
+    Everything happens in one transaction: the stock of every product is
+    taken with a single conditional ``UPDATE`` (which also locks the rows,
+    so concurrent checkouts cannot oversell), the products are read once,
+    and the order and its items are inserted with the total computed from
+    those rows. Raises ValidationError, with nothing written, when a product
+    does not exist or has too little stock.
+    """
+    using = router.db_for_write(Order)
+    try:
+        with transaction.atomic(using=using):
+            products = reserve_stock(quantities, using)
+            if len(products) != len(quantities):
+                raise StockUnavailable
+            order = Order(
+                customer=customer,
+                total_amount=sum(
+                    products[pk].price * quantity for pk, quantity in quantities.items()
+                ),
+            )
+            order.save(using=using)
+            OrderItem.objects.using(using).bulk_create(
+                OrderItem(order=order, product=products[pk], quantity=quantity)
+                for pk, quantity in sorted(quantities.items())
+            )
+            # The order's own post_save covers orders.
+            response_cache.invalidate(Product, using=using)
+    except StockUnavailable:
+        raise_unavailable(quantities, using)
+    return order
+
+
+def place_orders(requests, batch_size):
+    """
+    Create many orders from ``[(customer_pk, {product_pk: quantity}), ...]``.
+
+    Customers and products are each validated with one set lookup per
+    ``batch_size`` ids; the products are locked while stock is allocated
+    to the orders in payload order. Stock is then taken with one
+    conditional UPDATE per batch of products, and the orders and their
+    items are written with ``bulk_create``. Returns ``(orders, errors)``
+    where ``errors`` maps the index of each rejected request to a message;
+    the other orders are created.
+    """
+    using = router.db_for_write(Order)
+    customer_pks = sorted({customer_pk for customer_pk, _ in requests})
+    product_pks = sorted({pk for _, quantities in requests for pk in quantities})
+
+    with transaction.atomic(using=using):
+        customers = set()
+        for chunk in _chunks(customer_pks, batch_size):
+            customers.update(
+                Customer.objects.using(using)
+                .filter(pk__in=chunk)
+                .values_list("pk", flat=True)
+            )
+        products = {}
+        for chunk in _chunks(product_pks, batch_size):
+            products.update(
+                Product.objects.using(using).select_for_update().in_bulk(chunk)
+            )
+
+        stock = {pk: product.stock for pk, product in products.items()}
+        orders, order_items, errors = [], [], {}
+        for index, (customer_pk, quantities) in enumerate(requests):
+            missing = sorted(pk for pk in quantities if pk not in products)
+            if customer_pk not in customers:
+                errors[index] = "Invalid customer ID."
+            elif missing:
+                errors[index] = "Invalid product IDs: " + ", ".join(map(str, missing)) + "."
+            elif any(stock[pk] < quantity for pk, quantity in quantities.items()):
+                short = sorted(pk for pk, quantity in quantities.items() if stock[pk] < quantity)
+                errors[index] = (
+                    "Insufficient stock for product IDs: " + ", ".join(map(str, short)) + "."
+                )
+            else:
+                for pk, quantity in quantities.items():
+                    stock[pk] -= quantity
+                orders.append(
+                    Order(
+                        customer_id=customer_pk,
+                        total_amount=sum(
+                            products[pk].price * quantity
+                            for pk, quantity in quantities.items()
+                        ),
+                    )
+                )
+                order_items.append(quantities)
+
+        taken = {
+            pk: product.stock - stock[pk]
+            for pk, product in products.items()
+            if stock[pk] != product.stock
+        }
+        for chunk in _chunks(sorted(taken), batch_size):
+            reserved = reserve_stock({pk: taken[pk] for pk in chunk}, using)
+            if len(reserved) != len(chunk):
+                # Only possible if the rows changed despite the lock.
+                raise ValidationError("Stock changed during the import; please retry.")
+
+        create_orders(orders, using, batch_size)
+        OrderItem.objects.using(using).bulk_create(
+            (
+                OrderItem(order=order, product_id=pk, quantity=quantity)
+                for order, quantities in zip(orders, order_items)
+                for pk, quantity in sorted(quantities.items())
+            ),
+            batch_size=batch_size,
+        )
+        response_cache.invalidate(Order, Product, using=using)
+    return orders, errors
+
+
+def create_orders(orders, using, batch_size):
+    """
+    Insert ``orders`` and set their primary keys, for the items that
+    reference them.
+
+    ``bulk_create`` only reads the new ids back on backends that return
+    rows from bulk inserts (PostgreSQL, SQLite, MariaDB); elsewhere (MySQL,
+    Oracle) each order is saved on its own.
+    """
+    if connections[using].features.can_return_rows_from_bulk_insert:
+        Order.objects.using(using).bulk_create(orders, batch_size=batch_size)
+    else:
+        for order in orders:
+            order.save(using=using)
+
+
+def _chunks(values, size):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def reserve_stock(quantities, using):
+    """
+    Subtract ``{product_pk: quantity}`` from stock where there is enough.
+
+    Returns the updated products by pk. Products that are missing or short
+    are left alone and absent from the result; the caller is expected to
+    roll back its transaction in that case.
+    """
+    connection = connections[using]
+    if supports_update_returning(connection):
+        return _reserve_returning(connection, using, quantities)
+    enough = Q()
+    for pk, quantity in quantities.items():
+        enough |= Q(pk=pk, stock__gte=quantity)
+    taken = Case(
+        *(When(pk=pk, then=Value(quantity)) for pk, quantity in quantities.items())
+    )
+    updated = Product.objects.using(using).filter(enough).update(stock=F("stock") - taken)
+    if updated != len(quantities):
+        return {}
+    return Product.objects.using(using).in_bulk(list(quantities))
+
+
+def _reserve_returning(connection, using, quantities):
+    quote = connection.ops.quote_name
+    pk = quote(Product._meta.pk.column)
+    stock = quote(Product._meta.get_field("stock").column)
+    cases = " ".join(["WHEN %s THEN %s"] * len(quantities))
+    sql = (
+        "UPDATE {table} SET {stock} = {stock} - CASE {pk} {cases} END "
+        "WHERE {pk} IN ({pks}) AND {stock} >= CASE {pk} {cases} END "
+        "RETURNING {columns}"
+    ).format(
+        table=quote(Product._meta.db_table),
+        stock=stock,
+        pk=pk,
+        cases=cases,
+        pks=", ".join(["%s"] * len(quantities)),
+        columns=", ".join(quote(f.column) for f in Product._meta.concrete_fields),
+    )
+    case_params = [value for item in quantities.items() for value in item]
+    params = case_params + list(quantities) + case_params
+    products = Product.objects.db_manager(using).raw(sql, params)
+    return {product.pk: product for product in products}
+
+
+def raise_unavailable(quantities, using):
+    """Raise a ValidationError naming the missing or short products."""
+    stock = dict(
+        Product.objects.using(using)
+        .filter(pk__in=list(quantities))
+        .values_list("pk", "stock")
+    )
+    missing = sorted(pk for pk in quantities if pk not in stock)
+    if missing:
+        raise ValidationError(
+            "Invalid product IDs: " + ", ".join(str(pk) for pk in missing) + "."
+        )
+    # Empty only if stock was replenished concurrently; name them all then.
+    short = sorted(
+        pk for pk, quantity in quantities.items() if stock[pk] < quantity
+    ) or sorted(quantities)
+    raise ValidationError(
+        "Insufficient stock for product IDs: " + ", ".join(str(pk) for pk in short) + "."
+    )
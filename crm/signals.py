@@ -0,0 +1,61 @@
+"""
+Keep ``Order.total_amount`` in step with the order's products, and the
+GraphQL response cache in step with the data.
+
+Adding or removing products through the ``Order.products`` managers (on
+either side of the relation) recomputes the affected totals with one
+aggregate query, so saving an order never has to re-read its items.
+Orders created by :func:`crm.services.place_order` get their total at
+insert time and write items directly, which sends no signal.
+
+Saving or deleting a customer, product or order, or changing an order's
+products, invalidates the cached responses that read that model
+(:mod:`crm.response_cache`).
+"""
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from crm import response_cache
+from crm.models import Customer, Order, OrderItem, Product
+from crm.services import refresh_order_totals
+
+
+@receiver(m2m_changed, sender=OrderItem)
+def update_order_totals(sender, instance, action, reverse, pk_set, using, **kwargs):
+    if reverse and action == "pre_clear":
+        # post_clear has no pk_set; remember the orders losing this product.
+        instance._cleared_order_pks = set(
+            OrderItem.objects.using(using)
+            .filter(product=instance)
+            .values_list("order_id", flat=True)
+        )
+        return
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+
+    if not reverse:
+        total = instance.calculate_total()
+        Order.objects.using(using).filter(pk=instance.pk).update(total_amount=total)
+        instance.total_amount = total
+        return
+
+    if action == "post_clear":
+        pk_set = instance.__dict__.pop("_cleared_order_pks", set())
+    if pk_set:
+        refresh_order_totals(Order.objects.using(using).filter(pk__in=pk_set))
+
+
+@receiver(post_save, sender=Customer)
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Customer)
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Order)
+def invalidate_responses(sender, using, **kwargs):
+    response_cache.invalidate(sender, using=using)
+
+
+@receiver(m2m_changed, sender=OrderItem)
+def invalidate_order_responses(sender, action, using, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear"):
+        response_cache.invalidate(Order, using=using)
@@ -1,9 +1,8 @@
 from celery import shared_task
 from datetime import datetime
-from gql import Client, gql
-from gql.transport.requests import RequestsHTTPTransport
 import logging
-import requests
+
+from crm.graphql_client import execute
 
 logger = logging.getLogger(__name__)
 
@@ -11,50 +10,22 @@ logger = logging.getLogger(__name__)
 def generate_crm_report():
     """Generate a weekly CRM report with total customers, orders, and revenue."""
     try:
-        query = gql("""
+        query = """
         query GetCRMSummary {
-            allCustomers {
-                edges {
-                    node {
-                        id
-                    }
-                }
-            }
-            allOrders {
-                edges {
-                    node {
-                        totalAmount
-                    }
-                }
+            crmSummary {
+                customerCount
+                orderCount
+                revenue
             }
         }
-        """)
-        
-        transport = RequestsHTTPTransport(
-            url="http://localhost:8000/graphql",
-            headers={"Content-Type": "application/json"},
-            use_json=True,
-            verify=True,
-            retries=2,
-            timeout=15,
-        )
-        
-        client = Client(transport=transport, fetch_schema_from_transport=False)
-        result = client.execute(query)
-        
-        # Count customers from edges
-        customers_data = result.get('allCustomers', {}).get('edges', [])
-        total_customers = len(customers_data)
+        """
         
-        # Count orders and calculate revenue from edges
-        orders_data = result.get('allOrders', {}).get('edges', [])
-        total_orders = len(orders_data)
+        result = execute(query, timeout=15)
         
-        total_revenue = sum(
-            float(edge['node']['totalAmount']) 
-            for edge in orders_data 
-            if edge['node']['totalAmount'] is not None
-        )
+        summary = result.get('crmSummary') or {}
+        total_customers = summary.get('customerCount') or 0
+        total_orders = summary.get('orderCount') or 0
+        total_revenue = float(summary.get('revenue') or 0)
         
         timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         report_message = f"{timestamp} - Report: {total_customers} customers, {total_orders} orders, ${total_revenue:.2f} revenue\n"
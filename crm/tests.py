@@ -1,3 +1,1622 @@
-from django.test import TestCase
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import StringIO
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db import models
+from django.db.models import Exists, OuterRef
+from django.test import AsyncRequestFactory, RequestFactory, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from gql.transport.exceptions import TransportQueryError
+from graphql_relay import offset_to_cursor
+
+from alx_backend_graphql.schema import schema
+from crm.graphql_client import execute as run_graphql
+from crm import query_cost, response_cache
+from crm.documents import DocumentCache, get_document_cache
+from crm.loaders import Loaders
+from crm.profiling import ProfilingMiddleware, ResolverProfilingMiddleware
+from crm.views import AsyncCRMGraphQLView
+from crm.models import Customer, Product, Order
+from crm.search import get_search_backend
+from crm.tasks import generate_crm_report
+
+
+def execute(query, variables=None):
+    result = schema.execute(
+        query, variables=variables, context_value=SimpleNamespace()
+    )
+    assert result.errors is None, result.errors
+    return result.data
+
+
+def create_orders(count, products_per_order=2):
+    products = [
+        Product.objects.get_or_create(
+            name=f"Product {i}", defaults={"price": 10 + i, "stock": 50}
+        )[0]
+        for i in range(products_per_order)
+    ]
+    orders = []
+    start = Customer.objects.count()
+    for i in range(start, start + count):
+        customer = Customer.objects.create(
+            name=f"Customer {i}", email=f"customer{i}@example.com"
+        )
+        order = Order.objects.create(customer=customer)
+        order.products.set(products)
+        orders.append(order)
+    return orders
+
+
+class LoaderBatchingTests(TestCase):
+    ORDERS_QUERY = """
+        query {
+            allOrders {
+                edges {
+                    node {
+                        id
+                        customer { email }
+                        products { edges { node { name } } }
+                    }
+                }
+            }
+        }
+    """
+
+    CUSTOMERS_QUERY = """
+        query {
+            allCustomers {
+                edges {
+                    node {
+                        name
+                        orders {
+                            edges {
+                                node {
+                                    customer { name }
+                                    products { edges { node { name } } }
+                                }
+                            }
+                        }
+                    }
+                }
+            }
+        }
+    """
+
+    def test_order_relations_use_fixed_query_count(self):
+        create_orders(3)
+        # page joined with customers, order products
+        with self.assertNumQueries(2):
+            small = execute(self.ORDERS_QUERY)
+        create_orders(20)
+        with self.assertNumQueries(2):
+            large = execute(self.ORDERS_QUERY)
+        self.assertEqual(len(small["allOrders"]["edges"]), 3)
+        self.assertEqual(len(large["allOrders"]["edges"]), 23)
+
+    def test_relations_resolve_to_the_right_rows(self):
+        orders = create_orders(2)
+        data = execute(self.ORDERS_QUERY)
+        emails = [e["node"]["customer"]["email"] for e in data["allOrders"]["edges"]]
+        self.assertEqual(emails, [o.customer.email for o in orders])
+        names = [
+            p["node"]["name"]
+            for p in data["allOrders"]["edges"][0]["node"]["products"]["edges"]
+        ]
+        self.assertEqual(names, ["Product 0", "Product 1"])
+
+    def test_reverse_customer_orders_are_batched(self):
+        create_orders(3)
+        # page, customer orders, order customers, order products
+        with self.assertNumQueries(4):
+            small = execute(self.CUSTOMERS_QUERY)
+        create_orders(10)
+        with self.assertNumQueries(4):
+            execute(self.CUSTOMERS_QUERY)
+        node = small["allCustomers"]["edges"][0]["node"]
+        self.assertEqual(node["orders"]["edges"][0]["node"]["customer"]["name"], node["name"])
+
+    def test_customer_orders_read_only_the_requested_page(self):
+        customers = [order.customer for order in create_orders(2)]
+        for customer in customers:
+            Order.objects.bulk_create([Order(customer=customer) for _ in range(9)])
+        query = """
+            query($after: String) {
+                allCustomers {
+                    edges { node { orders(first: 2, after: $after) {
+                        totalCount
+                        pageInfo { hasNextPage }
+                        edges { node { id } }
+                    } } }
+                }
+            }
+        """
+        with CaptureQueriesContext(connection) as queries:
+            data = execute(query)
+        orders_sql = [q["sql"] for q in queries.captured_queries if "ROW_NUMBER" in q["sql"]]
+        self.assertEqual(len(orders_sql), 1)
+        for edge in data["allCustomers"]["edges"]:
+            orders = edge["node"]["orders"]
+            self.assertEqual(len(orders["edges"]), 2)
+            self.assertTrue(orders["pageInfo"]["hasNextPage"])
+            self.assertEqual(orders["totalCount"], 10)
+
+        loaded = Loaders().customer_orders
+        loaded.enqueue(customers)
+        self.assertEqual([len(rows) for rows in (loaded.load((c.pk, 3)) for c in customers)], [3, 3])
+
+        last_page = execute(query, {"after": offset_to_cursor(7)})
+        for edge in last_page["allCustomers"]["edges"]:
+            orders = edge["node"]["orders"]
+            self.assertEqual(len(orders["edges"]), 2)
+            self.assertFalse(orders["pageInfo"]["hasNextPage"])
+
+    def test_filtered_relation_falls_back_to_queryset(self):
+        create_orders(1, products_per_order=3)
+        data = execute("""
+            query {
+                allOrders {
+                    edges { node { products(name: "Product 2") { edges { node { name } } } } }
+                }
+            }
+        """)
+        products = data["allOrders"]["edges"][0]["node"]["products"]["edges"]
+        self.assertEqual([p["node"]["name"] for p in products], ["Product 2"])
+
+
+class SelectionProjectionTests(TestCase):
+    def page_sql(self, query):
+        with CaptureQueriesContext(connection) as queries:
+            data = execute(query)
+        return data, queries.captured_queries[-1]["sql"]
+
+    def test_id_only_selection_loads_only_the_primary_key(self):
+        create_orders(2)
+        data, sql = self.page_sql("{ allOrders { edges { node { id } } } }")
+        self.assertEqual(len(data["allOrders"]["edges"]), 2)
+        self.assertNotIn("total_amount", sql)
+        self.assertNotIn("order_date", sql)
+
+    def test_selected_columns_are_loaded_without_extra_queries(self):
+        create_orders(3)
+        with self.assertNumQueries(1):
+            data, sql = self.page_sql(
+                "{ allOrders { edges { node { totalAmount orderDate } } } }"
+            )
+        self.assertIn("total_amount", sql)
+        self.assertNotIn("customer_id", sql)
+        self.assertEqual(len(data["allOrders"]["edges"]), 3)
+
+    def test_selected_foreign_key_is_joined(self):
+        create_orders(3)
+        with self.assertNumQueries(1):
+            data, sql = self.page_sql("""
+                query {
+                    allOrders { edges { node { ...OrderCustomer } } }
+                }
+                fragment OrderCustomer on OrderType { customer { name } }
+            """)
+        self.assertIn("JOIN", sql)
+        self.assertNotIn('"crm_customer"."email"', sql)
+        names = [e["node"]["customer"]["name"] for e in data["allOrders"]["edges"]]
+        self.assertEqual(names, ["Customer 0", "Customer 1", "Customer 2"])
+
+
+class CRMSummaryTests(TestCase):
+    def test_totals_come_from_one_query(self):
+        create_orders(3)
+        Customer.objects.create(name="No orders", email="idle@example.com")
+        Order.objects.update(total_amount=25)
+        with self.assertNumQueries(1):
+            data = execute("{ crmSummary { customerCount orderCount revenue } }")
+        summary = data["crmSummary"]
+        self.assertEqual((summary["customerCount"], summary["orderCount"]), (4, 3))
+        self.assertEqual(Decimal(summary["revenue"]), Decimal("75"))
+
+    def test_empty_tables(self):
+        data = execute("{ crmSummary { customerCount orderCount revenue breakdown { period } } }")
+        summary = data["crmSummary"]
+        self.assertEqual((summary["customerCount"], summary["orderCount"]), (0, 0))
+        self.assertEqual(Decimal(summary["revenue"]), 0)
+        self.assertIsNone(summary["breakdown"])
+
+    def test_date_window_and_breakdown(self):
+        orders = create_orders(3)
+        dates = [
+            datetime(2025, 1, 5, tzinfo=dt_timezone.utc),
+            datetime(2025, 1, 20, tzinfo=dt_timezone.utc),
+            datetime(2025, 3, 1, tzinfo=dt_timezone.utc),
+        ]
+        for order, date in zip(orders, dates):
+            Order.objects.filter(pk=order.pk).update(order_date=date, total_amount=10)
+        data = execute("""
+            {
+                crmSummary(orderDateGte: "2025-01-01T00:00:00+00:00", period: MONTH) {
+                    orderCount
+                    breakdown { period orderCount revenue }
+                }
+            }
+        """)
+        summary = data["crmSummary"]
+        self.assertEqual(summary["orderCount"], 3)
+        self.assertEqual(
+            [
+                (b["period"][:7], b["orderCount"], Decimal(b["revenue"]))
+                for b in summary["breakdown"]
+            ],
+            [("2025-01", 2, Decimal("20")), ("2025-03", 1, Decimal("10"))],
+        )
+        data = execute("""
+            { crmSummary(orderDateLte: "2025-02-01T00:00:00+00:00") { orderCount revenue } }
+        """)
+        self.assertEqual(data["crmSummary"]["orderCount"], 2)
+        self.assertEqual(Decimal(data["crmSummary"]["revenue"]), Decimal("20"))
+
+
+class GraphQLClientTests(TestCase):
+    def test_local_execution_returns_data(self):
+        create_orders(2)
+        data = run_graphql("{ crmSummary { orderCount } }")
+        self.assertEqual(data, {"crmSummary": {"orderCount": 2}})
+
+    def test_local_execution_raises_like_gql(self):
+        with self.assertRaises(TransportQueryError) as ctx:
+            run_graphql("{ noSuchField }")
+        self.assertIn("noSuchField", str(ctx.exception))
+
+    def test_report_task_runs_in_process(self):
+        create_orders(2)
+        Order.objects.update(total_amount=5)
+        with mock.patch("builtins.open", mock.mock_open()):
+            report = generate_crm_report()
+        self.assertEqual(report["customers"], 2)
+        self.assertEqual(report["orders"], 2)
+        self.assertEqual(report["revenue"], 10.0)
+
+
+class BulkCreateCustomersTests(TestCase):
+    MUTATION = """
+        mutation Bulk($customers: [CustomerInput], $batchSize: Int) {
+            bulkCreateCustomers(customers: $customers, batchSize: $batchSize) {
+                createdCustomers { email }
+                errors
+            }
+        }
+    """
+
+    def test_reports_existing_and_repeated_emails(self):
+        Customer.objects.create(name="Alice", email="alice@example.com")
+        data = execute(self.MUTATION, {"customers": [
+            {"name": "Alice", "email": "alice@example.com"},
+            {"name": "Bob", "email": "bob@example.com"},
+            {"name": "Bob again", "email": "bob@example.com"},
+            {"name": "Carol", "email": "carol@example.com", "phone": "+1234567890"},
+        ]})["bulkCreateCustomers"]
+        self.assertEqual(
+            [c["email"] for c in data["createdCustomers"]],
+            ["bob@example.com", "carol@example.com"],
+        )
+        self.assertEqual(data["errors"], [
+            "Email alice@example.com already exists.",
+            "Email bob@example.com already exists.",
+        ])
+        self.assertEqual(Customer.objects.count(), 3)
+
+    def test_query_count_grows_with_batches_not_rows(self):
+        customers = [
+            {"name": f"C{i}", "email": f"c{i}@example.com"} for i in range(50)
+        ]
+        # 2 lookups + savepoint + 2 inserts + release
+        with self.assertNumQueries(6):
+            data = execute(self.MUTATION, {"customers": customers, "batchSize": 25})
+        self.assertEqual(len(data["bulkCreateCustomers"]["createdCustomers"]), 50)
+        self.assertEqual(Customer.objects.count(), 50)
+
+
+class UpdateLowStockProductsTests(TestCase):
+    MUTATION = """
+        mutation Restock($threshold: Int) {
+            updateLowStockProducts(threshold: $threshold, incrementBy: 5) {
+                products { name stock price }
+                message
+            }
+        }
+    """
+
+    def setUp(self):
+        for name, stock in [("Empty", 0), ("Low", 7), ("Edge", 10), ("Full", 40)]:
+            Product.objects.create(name=name, price="9.99", stock=stock)
+
+    def test_restocks_below_default_threshold(self):
+        data = execute(self.MUTATION)["updateLowStockProducts"]
+        self.assertEqual(
+            [(p["name"], p["stock"]) for p in data["products"]],
+            [("Empty", 5), ("Low", 12)],
+        )
+        self.assertEqual(Decimal(data["products"][0]["price"]), Decimal("9.99"))
+        self.assertEqual(data["message"], "Updated 2 low-stock product(s).")
+        self.assertEqual(Product.objects.get(name="Edge").stock, 10)
+
+    def test_threshold_argument_and_constant_queries(self):
+        Product.objects.bulk_create(
+            Product(name=f"Bulk {i}", price=1, stock=1) for i in range(30)
+        )
+        # savepoint + UPDATE ... RETURNING + release
+        with self.assertNumQueries(3):
+            data = execute(self.MUTATION, {"threshold": 11})
+        self.assertEqual(len(data["updateLowStockProducts"]["products"]), 33)
+        self.assertEqual(Product.objects.get(name="Edge").stock, 15)
+
+    def test_locked_fetch_fallback(self):
+        with mock.patch("crm.services.supports_update_returning", return_value=False):
+            data = execute(self.MUTATION)["updateLowStockProducts"]
+        self.assertEqual(
+            [(p["name"], p["stock"]) for p in data["products"]],
+            [("Empty", 5), ("Low", 12)],
+        )
+
+
+class CleanupInactiveCustomersTests(TestCase):
+    def setUp(self):
+        orders = create_orders(4)
+        old = timezone.now() - timedelta(days=400)
+        for order in orders[:3]:
+            Order.objects.filter(pk=order.pk).update(order_date=old)
+        Customer.objects.create(name="Never ordered", email="never@example.com")
+
+    def run_command(self, *args):
+        out = StringIO()
+        call_command("cleanup_inactive_customers", *args, stdout=out)
+        return out.getvalue()
+
+    def test_dry_run_deletes_nothing(self):
+        output = self.run_command("--dry-run")
+        self.assertIn("Would delete 4 inactive customers", output)
+        self.assertEqual(Customer.objects.count(), 5)
+
+    def test_deletes_inactive_customers_in_chunks(self):
+        output = self.run_command("--chunk-size", "3")
+        self.assertIn("Deleted 3 inactive customers so far", output)
+        self.assertTrue(output.strip().endswith("Deleted 4 inactive customers"))
+        self.assertEqual(
+            list(Customer.objects.values_list("name", flat=True)), ["Customer 3"]
+        )
+        self.assertEqual(Order.objects.count(), 1)
+
+
+class OrderRemindersTests(TestCase):
+    def test_logs_only_last_week_orders_across_pages(self):
+        from crm.cron_jobs import send_order_reminders as job
+
+        orders = create_orders(4)
+        Order.objects.filter(pk=orders[0].pk).update(
+            order_date=timezone.now() - timedelta(days=30)
+        )
+        with tempfile.NamedTemporaryFile("r", suffix=".txt") as log, \
+                mock.patch.object(job, "LOG_FILE", log.name), \
+                mock.patch.object(job, "PAGE_SIZE", 2), \
+                mock.patch("builtins.print"):
+            job.send_order_reminders()
+            lines = log.read().splitlines()
+        self.assertEqual(len(lines), 4)
+        self.assertIn("customer3@example.com", lines[0])
+        self.assertNotIn("customer0@example.com", "".join(lines))
+        self.assertTrue(lines[-1].endswith("3 recent orders found."))
+
+    def test_pages_of_the_largest_accepted_size(self):
+        from crm.cron_jobs import send_order_reminders as job
+
+        self.assertLessEqual(job.PAGE_SIZE, settings.CRM_MAX_PAGE_SIZE)
+        customer = create_orders(1)[0].customer
+        Order.objects.bulk_create(Order(customer=customer) for _ in range(job.PAGE_SIZE))
+        with tempfile.NamedTemporaryFile("r", suffix=".txt") as log, \
+                mock.patch.object(job, "LOG_FILE", log.name), \
+                mock.patch("builtins.print"):
+            job.send_order_reminders()
+            lines = log.read().splitlines()
+        self.assertTrue(lines[-1].endswith(f"{job.PAGE_SIZE + 1} recent orders found."))
+
+    def test_order_by_argument_sorts_connection(self):
+        create_orders(3)
+        data = execute('{ allOrders(orderBy: ["-id"]) { edges { node { customer { name } } } } }')
+        self.assertEqual(
+            [e["node"]["customer"]["name"] for e in data["allOrders"]["edges"]],
+            ["Customer 2", "Customer 1", "Customer 0"],
+        )
+
+
+class KeysetPaginationTests(TestCase):
+    QUERY = """
+        query Page($first: Int, $last: Int, $after: String, $before: String, $orderBy: [String]) {
+            allOrders(
+                keyset: true, first: $first, last: $last,
+                after: $after, before: $before, orderBy: $orderBy
+            ) {
+                pageInfo { hasNextPage hasPreviousPage startCursor endCursor }
+                edges { cursor node { customer { name } } }
+            }
+        }
+    """
+
+    def setUp(self):
+        orders = create_orders(7)
+        # Pairs of orders share a timestamp so the id tiebreaker matters.
+        base = timezone.now() - timedelta(days=10)
+        for i, order in enumerate(orders):
+            Order.objects.filter(pk=order.pk).update(
+                order_date=base + timedelta(hours=i // 2, microseconds=1)
+            )
+
+    def page(self, **variables):
+        connection = execute(self.QUERY, variables)["allOrders"]
+        names = [e["node"]["customer"]["name"] for e in connection["edges"]]
+        return names, connection["pageInfo"]
+
+    def walk_forward(self, order_by):
+        names, after = [], None
+        while True:
+            page, info = self.page(first=3, after=after, orderBy=order_by)
+            names += page
+            if not info["hasNextPage"]:
+                return names
+            after = info["endCursor"]
+
+    def test_forward_walk_visits_every_row_once(self):
+        names = self.walk_forward(["-order_date"])
+        expected = list(
+            Order.objects.order_by("-order_date", "-id").values_list(
+                "customer__name", flat=True
+            )
+        )
+        self.assertEqual(names, expected)
+
+    def test_seek_query_does_not_count_or_offset(self):
+        _, info = self.page(first=2, orderBy=["order_date"])
+        with CaptureQueriesContext(connection) as queries:
+            self.page(first=2, after=info["endCursor"], orderBy=["order_date"])
+        sql = queries.captured_queries[0]["sql"]
+        self.assertEqual(len(queries.captured_queries), 1)  # page joined with customers
+        self.assertNotIn("COUNT", sql)
+        self.assertNotIn("OFFSET", sql)
+        self.assertIn('"crm_order"."order_date" >=', sql)
+
+    def test_backward_page_with_before(self):
+        names, info = self.page(first=4)
+        back, back_info = self.page(last=2, before=info["endCursor"])
+        self.assertEqual(back, names[1:3])
+        self.assertTrue(back_info["hasPreviousPage"])
+        self.assertTrue(back_info["hasNextPage"])
+        tail, _ = self.page(last=2)
+        self.assertEqual(tail, ["Customer 5", "Customer 6"])
+
+    def test_rejects_nullable_sort_key_and_foreign_cursor(self):
+        result = schema.execute(
+            '{ allCustomers(keyset: true, orderBy: ["phone"]) { edges { cursor } } }',
+            context_value=SimpleNamespace(),
+        )
+        self.assertIn("cannot order by 'phone'", result.errors[0].message)
+        offset_cursor = execute("{ allOrders(first: 1) { edges { cursor } } }")[
+            "allOrders"]["edges"][0]["cursor"]
+        result = schema.execute(
+            self.QUERY,
+            variable_values={"after": offset_cursor, "first": 1},
+            context_value=SimpleNamespace(),
+        )
+        self.assertIn("Invalid keyset cursor", result.errors[0].message)
+
+
+class TotalCountTests(TestCase):
+    def setUp(self):
+        create_orders(5)
+
+    def count(self, arguments=""):
+        return execute(
+            "{ allOrders%s { totalCount countStrategy totalCountIsExact edges { cursor } } }"
+            % arguments
+        )["allOrders"]
+
+    def test_offset_pages_do_not_count_unless_asked(self):
+        with CaptureQueriesContext(connection) as queries:
+            data = execute("{ allOrders(first: 2) { pageInfo { hasNextPage } edges { cursor } } }")
+        self.assertEqual(len(queries.captured_queries), 1)
+        self.assertNotIn("COUNT", queries.captured_queries[0]["sql"])
+        self.assertTrue(data["allOrders"]["pageInfo"]["hasNextPage"])
+
+    def test_offset_pages_walk_without_count(self):
+        seen, after = [], None
+        while True:
+            page = execute(
+                "query($after: String) { allOrders(first: 2, after: $after) "
+                "{ pageInfo { hasNextPage endCursor } edges { node { customer { name } } } } }",
+                {"after": after},
+            )["allOrders"]
+            seen += [e["node"]["customer"]["name"] for e in page["edges"]]
+            if not page["pageInfo"]["hasNextPage"]:
+                break
+            after = page["pageInfo"]["endCursor"]
+        self.assertEqual(seen, [f"Customer {i}" for i in range(5)])
+
+    def test_exact_count(self):
+        data = self.count("(first: 2)")
+        self.assertEqual(
+            (data["totalCount"], data["countStrategy"], data["totalCountIsExact"]),
+            (5, "EXACT", True),
+        )
+
+    def test_last_pages_reuse_their_count(self):
+        with self.assertNumQueries(2):
+            data = self.count("(last: 2, countStrategy: CAPPED)")
+        self.assertEqual((data["totalCount"], data["countStrategy"]), (5, "EXACT"))
+
+    def test_capped_count(self):
+        with self.settings(CRM_COUNT_CAP=3):
+            data = self.count("(first: 1, countStrategy: CAPPED)")
+            self.assertEqual(
+                (data["totalCount"], data["countStrategy"], data["totalCountIsExact"]),
+                (3, "CAPPED", False),
+            )
+            data = self.count("(first: 1, countStrategy: CAPPED, customerName: \"Customer 1\")")
+            self.assertEqual((data["totalCount"], data["totalCountIsExact"]), (1, True))
+
+    def test_estimate_falls_back_to_capped_off_postgres(self):
+        data = self.count("(countStrategy: ESTIMATE)")
+        self.assertEqual((data["totalCount"], data["countStrategy"]), (5, "CAPPED"))
+
+    def test_cached_count_is_keyed_by_filters(self):
+        cache.clear()
+        self.assertEqual(self.count("(countStrategy: CACHED)")["totalCount"], 5)
+        create_orders(1)
+        data = self.count("(first: 1, countStrategy: CACHED)")
+        self.assertEqual(
+            (data["totalCount"], data["countStrategy"], data["totalCountIsExact"]),
+            (5, "CACHED", False),
+        )
+        filtered = self.count('(countStrategy: CACHED, customerName: "Customer 5")')
+        self.assertEqual(filtered["totalCount"], 1)
+
+    def test_default_strategy_setting(self):
+        with self.settings(CRM_COUNT_STRATEGY="capped"):
+            self.assertEqual(self.count()["countStrategy"], "CAPPED")
+
+
+class IndexUsageTests(TestCase):
+    """Filtered and ordered connection queries must not fall back to table scans."""
+
+    def assertUsesIndex(self, queryset, index):
+        plan = queryset.explain()
+        self.assertIn(index, plan)
+
+    def test_order_filters_use_indexes(self):
+        since = timezone.now() - timedelta(days=7)
+        self.assertUsesIndex(
+            Order.objects.filter(customer_id=1, order_date__gte=since),
+            "crm_order_cust_date_idx",
+        )
+        self.assertUsesIndex(
+            Order.objects.filter(order_date__gte=since).order_by("-order_date", "-id")[:20],
+            "crm_order_date_id_idx",
+        )
+        self.assertUsesIndex(
+            Order.objects.filter(total_amount__gte=100), "crm_order_total_idx"
+        )
+
+    def test_order_customer_has_no_separate_index(self):
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, Order._meta.db_table)
+        customer_indexes = [
+            name for name, constraint in constraints.items()
+            if constraint["index"] and constraint["columns"][0] == "customer_id"
+        ]
+        self.assertEqual(customer_indexes, ["crm_order_cust_date_idx"])
+
+    def test_inactive_customer_subquery_uses_index(self):
+        recent = Order.objects.filter(
+            customer=OuterRef("pk"), order_date__gte=timezone.now()
+        )
+        self.assertUsesIndex(
+            Customer.objects.filter(~Exists(recent)), "crm_order_cust_date_idx"
+        )
+
+    def test_customer_and_product_filters_use_indexes(self):
+        self.assertUsesIndex(
+            Customer.objects.filter(created_at__gte=timezone.now()),
+            "crm_customer_created_idx",
+        )
+        self.assertUsesIndex(
+            Product.objects.filter(stock__lt=10), "crm_product_stock_idx"
+        )
+        self.assertUsesIndex(
+            Product.objects.filter(price__gte=1, price__lte=100), "crm_product_price_idx"
+        )
+
+
+class SearchBackendTests(TestCase):
+    def setUp(self):
+        for name, email in [
+            ("Alice Smith", "alice@example.com"),
+            ("Bob Malice", "bob@example.com"),
+            ("Carol", "carol.alice@example.com"),
+            ("Al", "al@example.com"),
+        ]:
+            Customer.objects.create(name=name, email=email)
+
+    def names(self, arguments):
+        data = execute("{ allCustomers%s { edges { node { name } } } }" % arguments)
+        return [e["node"]["name"] for e in data["allCustomers"]["edges"]]
+
+    def test_fts5_backend_is_active_on_sqlite(self):
+        self.assertEqual(get_search_backend().name, "fts5")
+
+    def test_name_filter_uses_the_index_with_icontains_semantics(self):
+        with CaptureQueriesContext(connection) as queries:
+            names = self.names('(name: "ALIC")')
+        self.assertEqual(names, ["Alice Smith", "Bob Malice"])
+        self.assertIn("MATCH", queries.captured_queries[0]["sql"])
+
+    def test_short_terms_fall_back_to_icontains(self):
+        with CaptureQueriesContext(connection) as queries:
+            names = self.names('(name: "Al")')
+        self.assertEqual(names, ["Alice Smith", "Bob Malice", "Al"])
+        self.assertNotIn("MATCH", queries.captured_queries[0]["sql"])
+
+    def test_index_follows_updates_and_deletes(self):
+        Customer.objects.filter(name="Carol").update(name="Caroline Alicia")
+        Customer.objects.filter(name="Bob Malice").delete()
+        self.assertEqual(self.names('(name: "alic")'), ["Alice Smith", "Caroline Alicia"])
+
+    def test_updates_of_other_columns_leave_the_index_alone(self):
+        product = Product.objects.create(name="Widget", price=1, stock=1)
+        # Rows written by the statements and by their triggers.
+        before = connection.connection.total_changes
+        Product.objects.filter(pk=product.pk).update(stock=5)
+        Customer.objects.filter(name="Al").update(phone="+15550100")
+        self.assertEqual(connection.connection.total_changes - before, 2)
+        Product.objects.filter(pk=product.pk).update(name="Gadget")
+        self.assertGreater(connection.connection.total_changes - before, 3)
+
+    def test_search_ranks_matches(self):
+        names = self.names('(search: "alice")')
+        self.assertEqual(set(names), {"Alice Smith", "Bob Malice", "Carol"})
+        self.assertEqual(names[0], "Alice Smith")
+
+    def test_search_respects_explicit_ordering(self):
+        names = self.names('(search: "alice", orderBy: ["name"])')
+        self.assertEqual(names, ["Alice Smith", "Bob Malice", "Carol"])
+
+    def test_order_filters_search_through_customers(self):
+        customer = Customer.objects.get(name="Carol")
+        Order.objects.bulk_create([Order(customer=customer)])
+        data = execute("""
+            {
+                byName: allOrders(customerName: "aro") { edges { node { id } } }
+                bySearch: allOrders(search: "carol.alice") { edges { node { id } } }
+                none: allOrders(search: "nobody") { edges { node { id } } }
+            }
+        """)
+        self.assertEqual(len(data["byName"]["edges"]), 1)
+        self.assertEqual(len(data["bySearch"]["edges"]), 1)
+        self.assertEqual(len(data["none"]["edges"]), 0)
+
+    def test_like_backend_setting(self):
+        with self.settings(CRM_SEARCH_BACKEND="like"):
+            self.assertEqual(self.names('(name: "alic")'), ["Alice Smith", "Bob Malice"])
+            self.assertEqual(len(self.names('(search: "alice")')), 3)
+
+
+class OrderProductFilterTests(TestCase):
+    def setUp(self):
+        self.red = Product.objects.create(name="Red Widget", price=5, stock=10)
+        self.blue = Product.objects.create(name="Blue Widget", price=6, stock=10)
+        self.gear = Product.objects.create(name="Gear", price=7, stock=10)
+        for name, products in [
+            ("Both widgets", [self.red, self.blue]),
+            ("Red only", [self.red]),
+            ("Gear only", [self.gear]),
+        ]:
+            customer = Customer.objects.create(name=name, email=f"{len(name)}{name[0]}@example.com")
+            order = Order.objects.bulk_create([Order(customer=customer)])[0]
+            order.products.set(products)
+
+    def customers(self, arguments):
+        data = execute(
+            "{ allOrders(%s, orderBy: [\"id\"]) { totalCount edges { node { customer { name } } } } }"
+            % arguments
+        )
+        names = [e["node"]["customer"]["name"] for e in data["allOrders"]["edges"]]
+        self.assertEqual(data["allOrders"]["totalCount"], len(names))
+        return names
+
+    def test_product_name_returns_each_order_once(self):
+        with CaptureQueriesContext(connection) as queries:
+            names = self.customers('productName: "widget"')
+        self.assertEqual(names, ["Both widgets", "Red only"])
+        sql = next(q["sql"] for q in queries.captured_queries if 'FROM "crm_order"' in q["sql"])
+        self.assertIn("EXISTS", sql)
+        self.assertNotIn("DISTINCT", sql)
+
+    def test_product_id(self):
+        self.assertEqual(
+            self.customers(f"productId: {self.red.pk}"), ["Both widgets", "Red only"]
+        )
+
+    def test_products_argument_uses_exists(self):
+        with CaptureQueriesContext(connection) as queries:
+            names = self.customers(f'products: "{self.blue.pk}"')
+        self.assertEqual(names, ["Both widgets"])
+        sql = next(q["sql"] for q in queries.captured_queries if 'FROM "crm_order"' in q["sql"])
+        self.assertIn("EXISTS", sql)
+        self.assertNotIn("DISTINCT", sql)
+
+    def test_product_ids_any(self):
+        self.assertEqual(
+            self.customers(f'productIdsAny: ["{self.blue.pk}", "{self.gear.pk}"]'),
+            ["Both widgets", "Gear only"],
+        )
+        self.assertEqual(self.customers("productIdsAny: []"), [])
+
+    def test_product_ids_all(self):
+        self.assertEqual(
+            self.customers(f'productIdsAll: ["{self.red.pk}", "{self.blue.pk}", "{self.red.pk}"]'),
+            ["Both widgets"],
+        )
+        self.assertEqual(
+            self.customers(f'productIdsAll: ["{self.red.pk}", "{self.gear.pk}"]'), []
+        )
+
+
+class CreateOrderTests(TestCase):
+    MUTATION = """
+        mutation Create($customerId: ID!, $productIds: [ID], $items: [OrderItemInput!]) {
+            createOrder(customerId: $customerId, productIds: $productIds, items: $items) {
+                order {
+                    totalAmount
+                    customer { name }
+                    items { quantity product { name stock } }
+                }
+            }
+        }
+    """
+
+    def setUp(self):
+        self.customer = Customer.objects.create(name="Buyer", email="buyer@example.com")
+        self.pen = Product.objects.create(name="Pen", price="1.50", stock=10)
+        self.pad = Product.objects.create(name="Pad", price="4.00", stock=3)
+
+    def create(self, **variables):
+        return schema.execute(
+            self.MUTATION,
+            variables={"customerId": str(self.customer.pk), **variables},
+            context_value=SimpleNamespace(),
+        )
+
+    def test_creates_items_and_takes_stock(self):
+        result = self.create(
+            productIds=[str(self.pen.pk)],
+            items=[
+                {"productId": str(self.pen.pk), "quantity": 3},
+                {"productId": str(self.pad.pk), "quantity": 2},
+            ],
+        )
+        self.assertIsNone(result.errors)
+        order = result.data["createOrder"]["order"]
+        self.assertEqual(Decimal(order["totalAmount"]), Decimal("14.00"))
+        self.assertEqual(order["customer"]["name"], "Buyer")
+        self.assertEqual(order["items"], [
+            {"quantity": 4, "product": {"name": "Pen", "stock": 6}},
+            {"quantity": 2, "product": {"name": "Pad", "stock": 1}},
+        ])
+        self.assertEqual(Order.objects.get().total_amount, Decimal("14.00"))
+
+    def test_constant_queries(self):
+        items = [{"productId": str(self.pen.pk)}, {"productId": str(self.pad.pk)}]
+        # customer, savepoint, UPDATE ... RETURNING, order INSERT, items
+        # INSERT, release
+        with self.assertNumQueries(6):
+            result = schema.execute(
+                "mutation($c: ID!, $i: [OrderItemInput!]) { createOrder(customerId: $c, items: $i) { order { id } } }",
+                variables={"c": str(self.customer.pk), "i": items},
+            )
+        self.assertIsNone(result.errors)
+
+    def test_insufficient_stock_writes_nothing(self):
+        result = self.create(items=[
+            {"productId": str(self.pen.pk), "quantity": 2},
+            {"productId": str(self.pad.pk), "quantity": 4},
+        ])
+        self.assertEqual(
+            result.errors[0].message, f"Insufficient stock for product IDs: {self.pad.pk}."
+        )
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(Product.objects.get(pk=self.pen.pk).stock, 10)
+        self.assertEqual(Product.objects.get(pk=self.pad.pk).stock, 3)
+
+    def test_invalid_input(self):
+        result = self.create(productIds=[str(self.pen.pk), "999"])
+        self.assertEqual(result.errors[0].message, "Invalid product IDs: 999.")
+        result = self.create(items=[{"productId": str(self.pen.pk), "quantity": 0}])
+        self.assertEqual(result.errors[0].message, "Quantity must be positive.")
+        result = self.create(productIds=[])
+        self.assertEqual(result.errors[0].message, "At least one product must be selected.")
+        self.assertEqual(Product.objects.get(pk=self.pen.pk).stock, 10)
+
+    def test_conditional_update_fallback(self):
+        with mock.patch("crm.services.supports_update_returning", return_value=False):
+            ok = self.create(items=[{"productId": str(self.pad.pk), "quantity": 3}])
+            short = self.create(items=[{"productId": str(self.pad.pk)}])
+        self.assertIsNone(ok.errors)
+        self.assertEqual(ok.data["createOrder"]["order"]["items"][0]["product"]["stock"], 0)
+        self.assertEqual(short.errors[0].message, f"Insufficient stock for product IDs: {self.pad.pk}.")
+        self.assertEqual(Order.objects.count(), 1)
+
+
+class OrderTotalTests(TestCase):
+    def setUp(self):
+        self.customer = Customer.objects.create(name="Totals", email="totals@example.com")
+        self.pen = Product.objects.create(name="Pen", price="1.50", stock=10)
+        self.pad = Product.objects.create(name="Pad", price="4.00", stock=10)
+        self.order = Order.objects.create(customer=self.customer)
+
+    def stored_total(self, order=None):
+        return Order.objects.get(pk=(order or self.order).pk).total_amount
+
+    def test_save_does_not_read_products(self):
+        with self.assertNumQueries(1):
+            self.order.save()
+
+    def test_total_follows_product_changes(self):
+        self.order.products.add(self.pen, self.pad)
+        self.assertEqual(self.order.total_amount, Decimal("5.50"))
+        self.assertEqual(self.stored_total(), Decimal("5.50"))
+        self.order.products.remove(self.pad)
+        self.assertEqual(self.stored_total(), Decimal("1.50"))
+        self.order.products.set([self.pad], through_defaults={"quantity": 3})
+        self.assertEqual(self.stored_total(), Decimal("12.00"))
+        self.order.products.clear()
+        self.assertEqual(self.stored_total(), Decimal("0"))
+
+    def test_total_follows_reverse_changes(self):
+        other = Order.objects.create(customer=self.customer)
+        self.pen.order_set.add(self.order, other)
+        self.assertEqual(self.stored_total(other), Decimal("1.50"))
+        self.pad.order_set.add(other)
+        self.pen.order_set.clear()
+        self.assertEqual(self.stored_total(), Decimal("0"))
+        self.assertEqual(self.stored_total(other), Decimal("4.00"))
+
+    def test_recompute_command_fixes_totals_in_chunks(self):
+        orders = create_orders(5)
+        create_orders(1)
+        Order.objects.filter(pk__in=[o.pk for o in orders[1:4]]).update(total_amount=99)
+        out = StringIO()
+        call_command("recompute_order_totals", "--dry-run", stdout=out)
+        self.assertIn("Would fix 3 order totals", out.getvalue())
+
+        out = StringIO()
+        call_command("recompute_order_totals", "--chunk-size", "2", stdout=out)
+        self.assertIn("Fixed 2 order totals so far", out.getvalue())
+        self.assertTrue(out.getvalue().strip().endswith("Fixed 3 order totals"))
+        self.assertEqual(
+            set(Order.objects.filter(pk__in=[o.pk for o in orders]).values_list("total_amount", flat=True)),
+            {Decimal("21")},
+        )
+
+
+class BulkCreateOrdersTests(TestCase):
+    MUTATION = """
+        mutation Bulk($orders: [BulkOrderInput!]!, $batchSize: Int) {
+            bulkCreateOrders(orders: $orders, batchSize: $batchSize) {
+                createdOrders {
+                    totalAmount
+                    customer { name }
+                    items { quantity product { name } }
+                }
+                errors
+            }
+        }
+    """
+
+    def setUp(self):
+        self.ann = Customer.objects.create(name="Ann", email="ann@example.com")
+        self.ben = Customer.objects.create(name="Ben", email="ben@example.com")
+        self.pen = Product.objects.create(name="Pen", price="1.50", stock=5)
+        self.pad = Product.objects.create(name="Pad", price="4.00", stock=1)
+
+    def test_creates_valid_orders_and_reports_the_rest(self):
+        ann, ben, pen, pad = (str(x.pk) for x in (self.ann, self.ben, self.pen, self.pad))
+        data = execute(self.MUTATION, {"orders": [
+            {"customerId": ann, "productIds": [pen, pad]},
+            {"customerId": "999", "productIds": [pen]},
+            {"customerId": ben, "productIds": [pad]},
+            {"customerId": ben, "productIds": [pen, "999"]},
+            {"customerId": ben, "items": [{"productId": pen, "quantity": 0}]},
+            {"customerId": ben, "items": [{"productId": pen, "quantity": 4}]},
+        ]})["bulkCreateOrders"]
+        self.assertEqual(data["errors"], [
+            "Order 2: Invalid customer ID.",
+            f"Order 3: Insufficient stock for product IDs: {pad}.",
+            "Order 4: Invalid product IDs: 999.",
+            "Order 5: Quantity must be positive.",
+        ])
+        self.assertEqual(
+            [(o["customer"]["name"], Decimal(o["totalAmount"]), o["items"]) for o in data["createdOrders"]],
+            [
+                ("Ann", Decimal("5.50"), [
+                    {"quantity": 1, "product": {"name": "Pen"}},
+                    {"quantity": 1, "product": {"name": "Pad"}},
+                ]),
+                ("Ben", Decimal("6.00"), [{"quantity": 4, "product": {"name": "Pen"}}]),
+            ],
+        )
+        self.assertEqual(Product.objects.get(pk=self.pen.pk).stock, 0)
+        self.assertEqual(Product.objects.get(pk=self.pad.pk).stock, 0)
+        self.assertEqual(Order.objects.get(customer=self.ben).total_amount, Decimal("6.00"))
+
+    def test_query_count_does_not_grow_with_orders(self):
+        Product.objects.filter(pk=self.pen.pk).update(stock=1000)
+        orders = [
+            {"customerId": str(customer.pk), "productIds": [str(self.pen.pk)]}
+            for customer in [self.ann, self.ben] * 50
+        ]
+        # savepoint, customers, products, stock UPDATE, orders INSERT, items
+        # INSERT, release, then the response's customers and items
+        with self.assertNumQueries(9):
+            data = execute(self.MUTATION, {"orders": orders, "batchSize": 500})
+        self.assertEqual(len(data["bulkCreateOrders"]["createdOrders"]), 100)
+        self.assertEqual(Product.objects.get(pk=self.pen.pk).stock, 900)
+
+
+    def test_backends_without_bulk_insert_ids_save_each_order(self):
+        orders = [{"customerId": str(self.ann.pk), "productIds": [str(self.pen.pk)]}] * 2
+        features = type(connection.features)
+        with mock.patch.object(features, "can_return_rows_from_bulk_insert", False), \
+                CaptureQueriesContext(connection) as queries:
+            data = execute(self.MUTATION, {"orders": orders})
+        inserts = [q for q in queries.captured_queries if q["sql"].startswith('INSERT INTO "crm_order"')]
+        self.assertEqual(len(inserts), 2)
+        self.assertEqual(
+            [o["items"] for o in data["bulkCreateOrders"]["createdOrders"]],
+            [[{"quantity": 1, "product": {"name": "Pen"}}]] * 2,
+        )
+
+
+class ImportTests(TestCase):
+    CUSTOMERS = (
+        b'{"name": "Ann", "email": "ann@example.com", "phone": "+15550001"}\n'
+        b'{"name": "Ben", "email": "not-an-email"}\n'
+        b"\n"
+        b'{"name": "Cy", "email": "cy@example.com"}\n'
+        b"not json\n"
+        b'{"name": "Ann Updated", "email": "ann@example.com"}\n'
+    )
+    PRODUCTS = (
+        "name,price,stock\n"
+        "Pen,1.50,10\n"
+        "Pad,0,5\n"
+        '"Desk, oak",120.00,\n'
+        "Lamp,30,2\n"
+    ).encode()
+
+    def run_command(self, *args):
+        out, err = StringIO(), StringIO()
+        call_command("import_crm_data", *args, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def write(self, directory, name, content):
+        path = f"{directory}/{name}"
+        with open(path, "wb") as handle:
+            handle.write(content)
+        return path
+
+    def test_command_imports_ndjson_in_batches(self):
+        Customer.objects.create(name="Old Cy", email="cy@example.com")
+        with tempfile.TemporaryDirectory() as directory:
+            path = self.write(directory, "customers.ndjson", self.CUSTOMERS)
+            out, err = self.run_command("customers", path, "--batch-size", "2")
+        self.assertIn("Processed 2 rows: 1 imported, 1 errors", out)
+        self.assertTrue(out.strip().endswith("Imported 3 customers from 5 rows (2 errors)"))
+        self.assertIn("Row 2: email: Enter a valid email address.", err)
+        self.assertIn("Row 4: Invalid JSON", err)
+        self.assertEqual(
+            list(Customer.objects.order_by("email").values_list("name", "phone")),
+            [("Ann Updated", None), ("Cy", None)],
+        )
+
+    def test_command_imports_csv_and_upserts_products_by_name(self):
+        Product.objects.create(name="Lamp", price=10, stock=0)
+        with tempfile.TemporaryDirectory() as directory:
+            path = self.write(directory, "products.csv", self.PRODUCTS)
+            out, err = self.run_command("products", path)
+        self.assertIn("Row 2: price: Price must be positive.", err)
+        self.assertEqual(
+            list(Product.objects.order_by("name").values_list("name", "price", "stock")),
+            [("Desk, oak", Decimal("120.00"), 0), ("Lamp", Decimal("30"), 2), ("Pen", Decimal("1.50"), 10)],
+        )
+
+    def test_resume_from_checkpoint(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = self.write(directory, "products.csv", self.PRODUCTS)
+            batches = []
+
+            def fail_on_second_batch(*args, **kwargs):
+                batches.append(1)
+                if len(batches) == 2:
+                    raise RuntimeError("worker died")
+                return original(*args, **kwargs)
+
+            from crm.importers import ProductImporter
+            original = ProductImporter.upsert.__get__(ProductImporter())
+            with mock.patch.object(ProductImporter, "upsert", side_effect=fail_on_second_batch):
+                with self.assertRaises(RuntimeError):
+                    self.run_command("products", path, "--batch-size", "2")
+            self.assertEqual(list(Product.objects.values_list("name", flat=True)), ["Pen"])
+
+            out, _ = self.run_command("products", path, "--batch-size", "2", "--resume")
+            self.assertTrue(out.strip().endswith("Imported 3 products from 4 rows (1 errors)"))
+            self.assertFalse(os.path.exists(f"{path}.checkpoint"))
+        self.assertEqual(Product.objects.count(), 3)
+
+    def test_http_endpoint_streams_progress(self):
+        from django.contrib.auth.models import User
+
+        url = "/crm/import/customers?batch_size=2"
+        response = self.client.post(url, self.CUSTOMERS, content_type="application/x-ndjson")
+        self.assertEqual(response.status_code, 403)
+
+        self.client.force_login(User.objects.create_superuser("admin", "admin@example.com", "pw"))
+        response = self.client.post(url + "&skip=1", self.CUSTOMERS, content_type="application/x-ndjson")
+        self.assertEqual(response.status_code, 200)
+        lines = [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+        self.assertEqual(lines[0], {"rows": 3, "imported": 1, "error_count": 1})
+        self.assertTrue(lines[-1]["done"])
+        self.assertEqual(lines[-1]["imported"], 2)
+        self.assertEqual(Customer.objects.get(email="ann@example.com").name, "Ann Updated")
+
+        response = self.client.post("/crm/import/customers?format=xml", b"", content_type="text/plain")
+        self.assertEqual(response.status_code, 400)
+
+
+    def test_http_endpoint_requires_the_csrf_token(self):
+        from django.contrib.auth.models import User
+        from django.test import Client
+
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(User.objects.create_superuser("admin", "admin@example.com", "pw"))
+        response = client.post("/crm/import/customers", self.CUSTOMERS, content_type="text/plain")
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(Customer.objects.exists())
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        from django.contrib.auth.models import User
+
+        self.orders = create_orders(5)
+        self.client.force_login(User.objects.create_superuser("admin", "admin@example.com", "pw"))
+
+    def get(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return b"".join(response.streaming_content).decode()
+
+    def test_orders_csv_with_filters(self):
+        body = self.get("/crm/export/orders?customer_name=customer%203")
+        lines = body.splitlines()
+        self.assertEqual(
+            lines[0], "id,customer_id,customer_name,customer_email,order_date,total_amount,items"
+        )
+        self.assertEqual(len(lines), 2)
+        order = self.orders[3]
+        product_ids = sorted(order.products.values_list("pk", flat=True))
+        self.assertTrue(lines[1].startswith(f"{order.pk},{order.customer_id},Customer 3,customer3@example.com,"))
+        self.assertTrue(lines[1].endswith(f",21.00,{product_ids[0]}:1;{product_ids[1]}:1"))
+
+    def test_orders_ndjson_reads_a_fixed_number_of_queries_per_chunk(self):
+        with CaptureQueriesContext(connection) as queries:
+            body = self.get("/crm/export/orders?format=ndjson&chunk_size=2")
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([row["id"] for row in rows], [order.pk for order in self.orders])
+        self.assertEqual(rows[0]["customer_name"], "Customer 0")
+        self.assertEqual(
+            [item["quantity"] for item in rows[0]["items"]], [1, 1]
+        )
+        # One cursor over the orders (customer joined in) and one items
+        # prefetch per chunk of two.
+        order_queries = [q for q in queries.captured_queries if 'FROM "crm_order"' in q["sql"]]
+        item_queries = [q for q in queries.captured_queries if 'FROM "crm_order_products"' in q["sql"]]
+        self.assertEqual((len(order_queries), len(item_queries)), (1, 3))
+
+    def test_customers_and_list_filters(self):
+        body = self.get("/crm/export/customers?format=ndjson&email=customer1%40")
+        self.assertEqual([json.loads(line)["name"] for line in body.splitlines()], ["Customer 1"])
+        product = self.orders[0].products.first()
+        body = self.get(f"/crm/export/orders?product_ids_any={product.pk}&product_ids_any=999")
+        self.assertEqual(len(body.splitlines()), 6)
+
+    def test_rejects_bad_requests(self):
+        self.assertEqual(self.client.get("/crm/export/orders?format=xml").status_code, 400)
+        self.assertEqual(
+            self.client.get("/crm/export/orders?order_date__gte=yesterday").status_code, 400
+        )
+        self.assertEqual(self.client.get("/crm/export/invoices").status_code, 404)
+        self.client.logout()
+        self.assertEqual(self.client.get("/crm/export/orders").status_code, 403)
+
+
+class ProfilingTests(TestCase):
+    QUERY = """
+        {
+            allCustomers {
+                edges { node { name orders(totalAmount_Gte: 0) { edges { node { id } } } } }
+            }
+        }
+    """
+
+    def setUp(self):
+        create_orders(3)
+
+    def post(self, query):
+        response = self.client.post("/graphql", {"query": query}, content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_disabled_by_default(self):
+        self.assertNotIn("profile", self.post(self.QUERY)["extensions"])
+
+    def test_attributes_queries_to_resolvers_and_flags_duplicates(self):
+        with self.settings(CRM_PROFILING=True, CRM_PROFILING_EXTENSIONS=True), self.assertLogs("crm.profiling") as logs:
+            body = self.post(self.QUERY)
+        profile = body["extensions"]["profile"]
+        self.assertEqual(len(body["data"]["allCustomers"]["edges"]), 3)
+        resolvers = {entry["path"]: entry for entry in profile["resolvers"]}
+        self.assertEqual(resolvers["allCustomers"]["queries"], 1)
+        # A filtered nested connection bypasses the loaders: one query each.
+        orders = resolvers["allCustomers.edges.node.orders"]
+        self.assertEqual((orders["calls"], orders["queries"]), (3, 3))
+        self.assertEqual(profile["sql"]["count"], 4)
+        [duplicate] = profile["sql"]["duplicates"]
+        self.assertEqual(duplicate["count"], 3)
+        self.assertEqual(duplicate["distinct_params"], 3)
+        self.assertEqual(duplicate["paths"], ["allCustomers.edges.node.orders"])
+        self.assertGreaterEqual(profile["serialization_ms"], 0)
+
+        logged = json.loads(logs.records[0].getMessage())
+        self.assertEqual((logged["path"], logged["status"]), ("/graphql", 200))
+        self.assertEqual(logged["sql"]["count"], 4)
+
+    def test_profile_is_only_logged_by_default(self):
+        with self.settings(CRM_PROFILING=True), self.assertLogs("crm.profiling") as logs:
+            body = self.post(self.QUERY)
+        self.assertNotIn("profile", body["extensions"])
+        self.assertEqual(json.loads(logs.records[0].getMessage())["sql"]["count"], 4)
+
+    def test_batched_query_has_no_duplicates(self):
+        with self.settings(CRM_PROFILING=True), self.assertLogs("crm.profiling") as logs:
+            body = self.post("{ allOrders { edges { node { customer { name } products { edges { node { name } } } } } } }")
+        self.assertNotIn("profile", body["extensions"])
+        logged = json.loads(logs.records[0].getMessage())
+        self.assertEqual(logged["sql"]["duplicates"], [])
+        # Orders joined with their customers, then one items batch.
+        self.assertEqual(logged["sql"]["count"], 2)
+
+
+class GenerateCRMDataTests(TestCase):
+    ARGS = ["--customers", "40", "--products", "30", "--orders", "400",
+            "--until", "2025-06-30", "--batch-size", "100"]
+
+    def generate(self, *args):
+        out = StringIO()
+        call_command("generate_crm_data", *self.ARGS, *args, stdout=out)
+        return out.getvalue()
+
+    def fingerprint(self):
+        return list(
+            Order.objects.order_by("pk").values_list(
+                "customer__email", "order_date", "total_amount"
+            )
+        )
+
+    def test_generates_consistent_skewed_data(self):
+        output = self.generate()
+        self.assertIn("Generated 40 customers, 30 products and 400 orders", output)
+        self.assertEqual(Order.objects.count(), 400)
+
+        out = StringIO()
+        call_command("recompute_order_totals", "--dry-run", stdout=out)
+        self.assertIn("Would fix 0 order totals", out.getvalue())
+
+        until = datetime(2025, 7, 1, tzinfo=dt_timezone.utc)
+        self.assertFalse(Order.objects.filter(order_date__gte=until).exists())
+        self.assertFalse(
+            Order.objects.filter(order_date__lt=models.F("customer__created_at")).exists()
+        )
+        popularity = sorted(
+            Product.objects.annotate(n=models.Count("order")).values_list("n", flat=True)
+        )
+        self.assertGreater(popularity[-1], 4 * popularity[len(popularity) // 2])
+        repeat = Customer.objects.annotate(n=models.Count("orders")).filter(n__gt=1).count()
+        self.assertGreater(repeat, 10)
+
+    def test_same_seed_same_data(self):
+        self.generate("--seed", "7")
+        first = self.fingerprint()
+        with self.assertRaisesMessage(Exception, "Data for seed 7 already exists"):
+            self.generate("--seed", "7")
+        Order.objects.all().delete()
+        Customer.objects.all().delete()
+        Product.objects.all().delete()
+        self.generate("--seed", "7")
+        self.assertEqual(self.fingerprint(), first)
+
+
+class ResponseCacheTests(TestCase):
+    PRODUCTS = "query($min: Decimal) { allProducts(price_Gte: $min) { edges { node { name stock } } } }"
+
+    def setUp(self):
+        create_orders(2)
+        response_cache.get_cache().clear()
+        settings = self.settings(CRM_RESPONSE_CACHE=True)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def post(self, query, variables=None):
+        response = self.client.post(
+            "/graphql", {"query": query, "variables": variables}, content_type="application/json"
+        )
+        return response, response.json()
+
+    def test_repeated_query_is_served_from_cache(self):
+        first, body = self.post(self.PRODUCTS, {"min": "0"})
+        self.assertEqual(first["X-CRM-Cache"], "MISS")
+        with self.assertNumQueries(0):
+            second, cached = self.post("query ($min: Decimal) {\n  allProducts(price_Gte: $min) "
+                                       "{ edges { node { name  stock } } }  # poll\n}", {"min": "0"})
+        self.assertEqual(second["X-CRM-Cache"], "HIT")
+        self.assertEqual(cached, body)
+        response, _ = self.post(self.PRODUCTS, {"min": "11"})
+        self.assertEqual(response["X-CRM-Cache"], "MISS")
+
+    def test_writes_invalidate_only_the_models_read(self):
+        self.post(self.PRODUCTS)
+        self.post("{ allCustomers { edges { node { name } } } }")
+
+        Customer.objects.create(name="Dora", email="dora@example.com")
+        response, _ = self.post(self.PRODUCTS)
+        self.assertEqual(response["X-CRM-Cache"], "HIT")
+        response, body = self.post("{ allCustomers { edges { node { name } } } }")
+        self.assertEqual(response["X-CRM-Cache"], "MISS")
+        self.assertEqual(len(body["data"]["allCustomers"]["edges"]), 3)
+
+        # A set-based UPDATE sends no signal; the mutation invalidates explicitly.
+        Product.objects.update(stock=1)
+        response, body = self.post(
+            "mutation { updateLowStockProducts(threshold: 5, incrementBy: 4) { message } }"
+        )
+        self.assertNotIn("X-CRM-Cache", response)
+        response, body = self.post(self.PRODUCTS)
+        self.assertEqual(response["X-CRM-Cache"], "MISS")
+        self.assertEqual({edge["node"]["stock"] for edge in body["data"]["allProducts"]["edges"]}, {5})
+
+    def test_orders_invalidate_nested_and_aggregated_reads(self):
+        summary = "{ crmSummary { orderCount } }"
+        nested = "{ allCustomers { edges { node { orders { edges { node { totalAmount } } } } } } }"
+        self.post(summary)
+        self.post(nested)
+        customer = Customer.objects.first()
+        execute(
+            "mutation($c: ID!, $p: [ID!]) { createOrder(customerId: $c, productIds: $p) { order { id } } }",
+            {"c": str(customer.pk), "p": [str(Product.objects.first().pk)]},
+        )
+        response, body = self.post(summary)
+        self.assertEqual(response["X-CRM-Cache"], "MISS")
+        self.assertEqual(body["data"]["crmSummary"]["orderCount"], 3)
+        response, _ = self.post(nested)
+        self.assertEqual(response["X-CRM-Cache"], "MISS")
+
+    def test_errors_and_other_users_are_not_shared(self):
+        self.post("{ allProducts(first: -1) { edges { node { name } } } }")
+        response, body = self.post("{ allProducts(first: -1) { edges { node { name } } } }")
+        self.assertIn("errors", body)
+        self.assertEqual(response["X-CRM-Cache"], "MISS")
+
+        self.post(self.PRODUCTS)
+        from django.contrib.auth.models import User
+
+        self.client.force_login(User.objects.create_user("staff", is_staff=True))
+        response, _ = self.post(self.PRODUCTS)
+        self.assertEqual(response["X-CRM-Cache"], "MISS")
+
+        stats = self.client.get("/crm/cache/stats").json()
+        self.assertEqual((stats["hits"], stats["misses"]), (0, 4))
+
+    def test_commit_bumps_the_generation_again(self):
+        self.post(self.PRODUCTS)
+        with self.captureOnCommitCallbacks() as callbacks:
+            with transaction.atomic():
+                Product.objects.create(name="Late", price=5, stock=1)
+        self.assertEqual(len(callbacks), 1)
+        # A response computed before the commit, cached under the bumped generation...
+        self.post(self.PRODUCTS)
+        callbacks[0]()
+        # ...is orphaned by the bump on commit.
+        response, _ = self.post(self.PRODUCTS)
+        self.assertEqual(response["X-CRM-Cache"], "MISS")
+
+
+    def test_local_memory_backend_is_flagged(self):
+        from crm.checks import check_response_cache_backend
+
+        [warning] = check_response_cache_backend(None)
+        self.assertEqual(warning.id, "crm.W001")
+        redis = {"BACKEND": "django.core.cache.backends.redis.RedisCache", "LOCATION": "redis://localhost"}
+        with self.settings(CACHES={**settings.CACHES, "graphql": redis}):
+            self.assertEqual(check_response_cache_backend(None), [])
+
+
+class PersistedQueryTests(TestCase):
+    QUERY = "{ allProducts { edges { node { name } } } }"
+
+    def setUp(self):
+        create_orders(1)
+        get_document_cache().clear()
+        caches["persisted-queries"].clear()
+        self.hash = hashlib.sha256(self.QUERY.encode()).hexdigest()
+
+    def post(self, payload):
+        return self.client.post("/graphql", payload, content_type="application/json")
+
+    def test_register_then_send_only_the_hash(self):
+        persisted = {"persistedQuery": {"version": 1, "sha256Hash": self.hash}}
+        response = self.post({"extensions": persisted})
+        self.assertEqual(response.json()["errors"][0]["message"], "PersistedQueryNotFound")
+
+        response = self.post({"query": self.QUERY, "extensions": persisted})
+        self.assertEqual(response.status_code, 200)
+        expected = response.json()
+
+        # Another process: nothing parsed yet, the hash is found in the cache.
+        get_document_cache().clear()
+        self.assertEqual(self.post({"extensions": persisted}).json(), expected)
+        with mock.patch("crm.documents.parse") as parse, mock.patch("crm.documents.validate") as validate:
+            response = self.client.get(
+                "/graphql", {"extensions": json.dumps(persisted)}, HTTP_ACCEPT="application/json"
+            )
+        self.assertEqual(response.json(), expected)
+        parse.assert_not_called()
+        validate.assert_not_called()
+
+    def test_hash_must_match_the_query(self):
+        response = self.post({
+            "query": "{ allCustomers { edges { node { name } } } }",
+            "extensions": {"persistedQuery": {"version": 1, "sha256Hash": self.hash}},
+        })
+        self.assertEqual(response.status_code, 400)
+
+    def test_only_valid_documents_are_registered(self):
+        query = "{ noSuchField }"
+        persisted = {"persistedQuery": {"version": 1, "sha256Hash": hashlib.sha256(query.encode()).hexdigest()}}
+        response = self.post({"query": query, "extensions": persisted})
+        self.assertIn("noSuchField", response.json()["errors"][0]["message"])
+        response = self.post({"extensions": persisted})
+        self.assertEqual(response.json()["errors"][0]["message"], "PersistedQueryNotFound")
+
+    def test_parsed_but_unregistered_documents_are_not_found(self):
+        self.post({"query": self.QUERY})
+        persisted = {"persistedQuery": {"version": 1, "sha256Hash": self.hash}}
+        response = self.post({"extensions": persisted})
+        self.assertEqual(response.json()["errors"][0]["message"], "PersistedQueryNotFound")
+
+    def test_batch_entries_do_not_share_state(self):
+        from crm.views import CRMGraphQLView
+
+        view = CRMGraphQLView.as_view(schema=schema, batch=True)
+        unknown = {"persistedQuery": {"version": 1, "sha256Hash": "0" * 64}}
+        request = RequestFactory().post("/graphql", [
+            {"query": self.QUERY},
+            {"extensions": unknown},
+            {"query": self.QUERY},
+        ], content_type="application/json")
+        first, missing, third = json.loads(view(request).content)
+        self.assertEqual(missing["errors"][0]["message"], "PersistedQueryNotFound")
+        self.assertNotIn("extensions", missing)
+        self.assertEqual(third["data"], first["data"])
+        self.assertEqual(third["extensions"]["cost"], first["extensions"]["cost"])
+
+    def test_document_cache_evicts_least_recently_used(self):
+        documents = DocumentCache(2)
+        for key in "abc":
+            documents.put(key, key)
+            documents.get("a")
+        self.assertEqual(list(documents.entries), ["c", "a"])
+
+    def test_invalid_documents_are_cached_with_their_errors(self):
+        self.post({"query": "{ noSuchField }"})
+        with mock.patch("crm.documents.validate") as validate:
+            response = self.post({"query": "{ noSuchField }"})
+        self.assertIn("noSuchField", response.json()["errors"][0]["message"])
+        validate.assert_not_called()
+
+    def test_http_client_sends_the_hash_first(self):
+        payloads = []
+
+        def post(session, url, json, timeout):
+            payloads.append(json)
+            response = self.post(json)
+            return SimpleNamespace(json=response.json, status_code=response.status_code, reason="")
+
+        with self.settings(CRM_GRAPHQL_TRANSPORT="http"), mock.patch("requests.Session.post", post):
+            first = run_graphql(self.QUERY)
+            second = run_graphql(self.QUERY)
+        self.assertEqual(first, second)
+        self.assertEqual(["query" in payload for payload in payloads], [False, True, False])
+
+
+class QueryCostTests(TestCase):
+    NESTED = """
+        query($customers: Int, $orders: Int = 5) {
+            allCustomers(first: $customers) {
+                totalCount
+                edges { node { ...Orders } }
+            }
+        }
+        fragment Orders on CustomerType {
+            orders(first: $orders) {
+                pageInfo { hasNextPage }
+                edges { node { customer { name } items { quantity } products(first: 3) { edges { node { name } } } } }
+            }
+        }
+    """
+
+    def setUp(self):
+        create_orders(3)
+
+    def analyze(self, query, variables=None):
+        from graphql import parse
+
+        return query_cost.analyze(schema.graphql_schema, parse(query), variables=variables)
+
+    def post(self, query, variables=None):
+        return self.client.post(
+            "/graphql", {"query": query, "variables": variables}, content_type="application/json"
+        )
+
+    def test_cost_multiplies_page_sizes_down_the_tree(self):
+        cost = self.analyze(self.NESTED, {"customers": 10})
+        # 10 customers, 50 orders, then per order: 100 items, 3 products; the
+        # order's customer is free.
+        self.assertEqual(cost.cost, 10 + 50 + 50 * (100 + 3))
+        self.assertEqual(cost.depth, 3)
+        # Without first, a connection counts as the default page size.
+        self.assertEqual(self.analyze(self.NESTED).cost, 100 + 500 + 500 * 103)
+
+    def test_expensive_queries_are_rejected_before_execution(self):
+        query = "{ allCustomers { edges { node { orders { edges { node { products { edges { node { name } } } } } } } } } }"
+        with self.assertNumQueries(0):
+            response = self.post(query)
+        self.assertEqual(response.status_code, 400)
+        [error] = response.json()["errors"]
+        self.assertEqual(error["extensions"]["code"], "QUERY_TOO_COMPLEX")
+        self.assertIn("1010100", error["message"])
+
+        response = self.post(self.NESTED, {"customers": 10, "orders": 2})
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(len(body["data"]["allCustomers"]["edges"]), 3)
+        self.assertEqual(body["extensions"]["cost"]["estimated"], 10 + 20 + 20 * 103)
+
+    def test_full_pages_with_related_objects_are_accepted(self):
+        for query in (
+            "{ allOrders(first: 100) { edges { node { id items { quantity product { name } } } } } }",
+            "{ allCustomers { edges { node { orders { edges { node { customer { name } } } } } } } }",
+        ):
+            response = self.post(query)
+            self.assertEqual(response.status_code, 200, response.json())
+            self.assertEqual(response.json()["extensions"]["cost"]["estimated"], 100 + 100 * 100)
+
+    def test_depth_limit(self):
+        with self.settings(CRM_QUERY_MAX_DEPTH=2):
+            response = self.post(self.NESTED, {"customers": 1})
+        [error] = response.json()["errors"]
+        self.assertEqual(error["extensions"]["code"], "QUERY_TOO_DEEP")
+
+    def test_default_and_max_page_size(self):
+        with self.settings(CRM_DEFAULT_PAGE_SIZE=2):
+            data = execute("{ allCustomers { edges { node { name } } pageInfo { hasNextPage } } }")
+        self.assertEqual(len(data["allCustomers"]["edges"]), 2)
+        self.assertTrue(data["allCustomers"]["pageInfo"]["hasNextPage"])
+        response = self.post("{ allProducts(first: 101) { edges { node { name } } } }")
+        self.assertIn("exceeds the `first` limit of 100", response.json()["errors"][0]["message"])
+
+    def test_cost_and_profile_share_extensions(self):
+        with self.settings(CRM_PROFILING=True, CRM_PROFILING_EXTENSIONS=True), self.assertLogs("crm.profiling"):
+            body = self.post("{ allProducts(first: 5) { edges { node { name } } } }").json()
+        self.assertEqual(body["extensions"]["cost"]["estimated"], 5)
+        self.assertIn("resolvers", body["extensions"]["profile"])
+
+
+class RootFieldBarrier:
+    """Graphene middleware holding each top-level field until all have started."""
+
+    def __init__(self, parties):
+        self.barrier = threading.Barrier(parties, timeout=5)
+        self.threads = {}
+
+    def resolve(self, next, root, info, **args):
+        if info.path.prev is None:
+            self.threads[info.field_name] = threading.get_ident()
+            self.barrier.wait()
+        return next(root, info, **args)
+
+
+class AsyncGraphQLViewTests(TransactionTestCase):
+    # Fields resolve on pool threads with their own connections, which only
+    # see committed rows.
+    QUERY = """
+        {
+            allCustomers(orderBy: ["name"]) { edges { node { name orders { totalCount } } } }
+            allOrders(first: 10) { edges { node { customer { name } products { edges { node { name } } } } } }
+        }
+    """
+
+    def setUp(self):
+        create_orders(3)
+        response_cache.get_cache().clear()
+
+    def view(self, *middleware):
+        return AsyncCRMGraphQLView.as_view(schema=schema, middleware=list(middleware))
+
+    async def post(self, view, query):
+        request = AsyncRequestFactory().post("/graphql", {"query": query}, content_type="application/json")
+        return await view(request)
+
+    async def test_top_level_fields_resolve_concurrently(self):
+        barrier = RootFieldBarrier(2)
+        response = await self.post(self.view(barrier), self.QUERY)
+        self.assertEqual(response.status_code, 200)
+        body = json.loads(response.content)
+        self.assertNotIn("errors", body)
+        # Both fields waited on the barrier: they were resolving at once.
+        self.assertEqual(len(set(barrier.threads.values())), 2)
+        self.assertNotIn(threading.get_ident(), barrier.threads.values())
+        expected = await sync_to_async(execute)(self.QUERY)
+        self.assertEqual(body["data"], expected)
+
+    async def test_mutations_and_response_cache(self):
+        view = self.view()
+        with self.settings(CRM_RESPONSE_CACHE=True):
+            query = "{ allCustomers { totalCount } }"
+            first = await self.post(view, query)
+            second = await self.post(view, query)
+            self.assertEqual((first["X-CRM-Cache"], second["X-CRM-Cache"]), ("MISS", "HIT"))
+            self.assertEqual(second.content, first.content)
+
+            response = await self.post(
+                view, 'mutation { createCustomer(name: "Dora", email: "dora@example.com") { message } }'
+            )
+            self.assertNotIn("errors", json.loads(response.content))
+            response = await self.post(view, query)
+            self.assertEqual(response["X-CRM-Cache"], "MISS")
+            self.assertEqual(json.loads(response.content)["data"]["allCustomers"]["totalCount"], 4)
+
+    async def test_profile_counts_queries_of_every_thread(self):
+        middleware = ProfilingMiddleware(self.view(ResolverProfilingMiddleware()))
+        with self.settings(CRM_PROFILING=True, CRM_PROFILING_EXTENSIONS=True), self.assertLogs("crm.profiling") as logs:
+            response = await self.post(middleware, self.QUERY)
+        profile = json.loads(response.content)["extensions"]["profile"]
+        resolvers = {entry["path"]: entry for entry in profile["resolvers"]}
+        self.assertEqual(resolvers["allCustomers"]["queries"], 1)
+        self.assertEqual(resolvers["allOrders"]["queries"], 1)
+        self.assertEqual(profile["sql"]["count"], json.loads(logs.records[0].getMessage())["sql"]["count"])
+        self.assertEqual(profile["sql"]["count"], 4)
@@ -0,0 +1,9 @@
+from django.urls import path
+
+from crm import views
+
+urlpatterns = [
+    path("import/<str:model>", views.import_data, name="crm-import"),
+    path("export/<str:model>", views.export_data, name="crm-export"),
+    path("cache/stats", views.response_cache_stats, name="crm-cache-stats"),
+]
@@ -1,3 +1,431 @@
-from django.shortcuts import render
+import json
+import time
+from inspect import isawaitable
 
-# Create your views here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection, transaction
+from django.http import (
+    Http404,
+    HttpResponse,
+    HttpResponseBadRequest,
+    HttpResponseNotAllowed,
+    JsonResponse,
+    StreamingHttpResponse,
+)
+from django.utils.decorators import method_decorator
+from django.views.decorators.csrf import ensure_csrf_cookie
+from django.views.decorators.http import require_GET, require_POST
+from graphene_django.constants import MUTATION_ERRORS_FLAG
+from graphene_django.filter import ListFilter
+from graphene_django.settings import graphene_settings
+from graphene_django.utils.utils import set_rollback
+from graphene_django.views import GraphQLView, HttpError
+from graphql import ExecutionResult, GraphQLError, OperationType, execute, get_operation_ast, validate_schema
+
+from crm import documents, exporters, query_cost, response_cache
+from crm.async_execution import ConcurrentExecutionContext, run_in_request_thread
+from crm.importers import FORMATS, IMPORTERS, import_batches, read_records
+from crm.profiling import get_profile
+
+
+class CRMGraphQLView(GraphQLView):
+    """
+    GraphQLView that accepts persisted queries and reuses parsed, validated
+    documents (crm.documents), rejects operations over the cost and depth
+    limits (crm.query_cost), serves query operations from the response
+    cache (crm.response_cache) and reports the request profile
+    (crm.profiling).
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        response = super().dispatch(request, *args, **kwargs)
+        return self.mark_cache_status(request, response)
+
+    def mark_cache_status(self, request, response):
+        status = getattr(request, "crm_cache_status", None)
+        if status:
+            response["X-CRM-Cache"] = status
+        return response
+
+    def get_response(self, request, data, show_graphiql=False):
+        params, key, body = self.lookup_response(request, data, show_graphiql)
+        if body is not None:
+            return body, 200
+        query, variables, operation_name, id = params
+        result = self.execute_graphql_request(
+            request, data, query, variables, operation_name, show_graphiql
+        )
+        return self.encode_response(request, result, id, key, show_graphiql)
+
+    def lookup_response(self, request, data, show_graphiql):
+        """
+        The GraphQL params of ``data``, the response cache key (None when
+        the response is not cached) and the cached body, if any.
+        """
+        params = self.get_graphql_params(request, data)
+        # A profiled response carries its own profile; batches their ids.
+        if not response_cache.is_enabled() or self.batch or get_profile(request) is not None:
+            return params, None, None
+        query, variables, operation_name, _ = params
+        pretty = bool(self.pretty or show_graphiql or request.GET.get("pretty"))
+        key = response_cache.response_key(
+            request, self.schema.graphql_schema, query, variables, operation_name, pretty
+        )
+        if key is None:
+            return params, None, None
+        body = response_cache.fetch(key)
+        request.crm_cache_status = "MISS" if body is None else "HIT"
+        return params, key, body
+
+    def encode_response(self, request, execution_result, id, key, show_graphiql):
+        # The second half of GraphQLView.get_response, storing successful
+        # responses under ``key``.
+        if getattr(request, MUTATION_ERRORS_FLAG, False) is True:
+            set_rollback()
+        if not execution_result:
+            return None, 200
+
+        status_code = 200
+        response = {}
+        if execution_result.errors:
+            set_rollback()
+            response["errors"] = [self.format_error(e) for e in execution_result.errors]
+        if execution_result.errors and any(
+            not getattr(e, "path", None) for e in execution_result.errors
+        ):
+            status_code = 400
+        else:
+            response["data"] = execution_result.data
+        if self.batch:
+            response["id"] = id
+            response["status"] = status_code
+
+        body = self.json_encode(request, response, pretty=show_graphiql)
+        if key is not None and status_code == 200 and not execution_result.errors:
+            response_cache.store(key, body)
+        return body, status_code
+
+    def get_graphql_params(self, request, data):
+        query, variables, operation_name, id = super().get_graphql_params(request, data)
+        # Called for every entry of a batch: reset what the last entry set.
+        request.crm_persisted_query_missing = False
+        request.crm_persist_query = False
+        request.crm_query_cost = None
+        extensions = request.GET.get("extensions") or data.get("extensions")
+        try:
+            if isinstance(extensions, str):
+                extensions = json.loads(extensions)
+            query_hash = documents.persisted_query_hash(extensions)
+            if query_hash is not None:
+                if query:
+                    # Registered once it validates (prepare_execution).
+                    documents.verify(query, query_hash)
+                    request.crm_persist_query = True
+                else:
+                    query = documents.lookup(query_hash)
+                    request.crm_persisted_query_missing = query is None
+        except (TypeError, ValueError, AttributeError) as error:
+            raise HttpError(HttpResponseBadRequest(str(error)))
+        return query, variables, operation_name, id
+
+    def execute_graphql_request(self, request, data, query, variables, operation_name, show_graphiql=False):
+        prepared = self.prepare_execution(request, query, variables, operation_name, show_graphiql)
+        if prepared is None or isinstance(prepared, ExecutionResult):
+            return prepared
+        return self.execute_prepared(request, *prepared)
+
+    def prepare_execution(self, request, query, variables, operation_name, show_graphiql):
+        """
+        Everything GraphQLView.execute_graphql_request does before executing,
+        with the parsed and validated document taken from crm.documents
+        instead of built per request, and the cost limits checked.
+
+        Returns the ExecutionResult (or None) to answer with, or the
+        (schema, document, operation_ast, execute_options) to execute.
+        """
+        if getattr(request, "crm_persisted_query_missing", False):
+            return ExecutionResult(errors=[GraphQLError(
+                documents.PERSISTED_QUERY_NOT_FOUND,
+                extensions={"code": "PERSISTED_QUERY_NOT_FOUND"},
+            )])
+        if not query:
+            if show_graphiql:
+                return None
+            raise HttpError(HttpResponseBadRequest("Must provide query string."))
+
+        schema = self.schema.graphql_schema
+        schema_validation_errors = validate_schema(schema)
+        if schema_validation_errors:
+            return ExecutionResult(data=None, errors=schema_validation_errors)
+
+        document = documents.get_document(query)
+        if document.parse_errors:
+            return ExecutionResult(errors=document.parse_errors)
+        operation_ast = get_operation_ast(document.ast, operation_name)
+        if (
+            request.method.lower() == "get"
+            and operation_ast is not None
+            and operation_ast.operation != OperationType.QUERY
+        ):
+            if show_graphiql:
+                return None
+            raise HttpError(
+                HttpResponseNotAllowed(
+                    ["POST"],
+                    f"Can only perform a {operation_ast.operation.value} operation from a POST request.",
+                )
+            )
+
+        validation_errors = document.validate(schema, self.validation_rules)
+        if validation_errors:
+            return ExecutionResult(
+                data=None, errors=validation_errors[:graphene_settings.MAX_VALIDATION_ERRORS]
+            )
+
+        cost = query_cost.analyze(schema, document.ast, operation_name, variables)
+        request.crm_query_cost = cost.as_dict()
+        cost_errors = cost.errors()
+        if cost_errors:
+            return ExecutionResult(data=None, errors=cost_errors)
+        if getattr(request, "crm_persist_query", False):
+            documents.register(query)
+
+        execute_options = {
+            "root_value": self.get_root_value(request),
+            "context_value": self.get_context(request),
+            "variable_values": variables,
+            "operation_name": operation_name,
+            "middleware": self.get_middleware(request),
+        }
+        if self.execution_context_class:
+            execute_options["execution_context_class"] = self.execution_context_class
+        return schema, document, operation_ast, execute_options
+
+    def execute_prepared(self, request, schema, document, operation_ast, execute_options):
+        try:
+            if (
+                operation_ast is not None
+                and operation_ast.operation == OperationType.MUTATION
+                and (
+                    graphene_settings.ATOMIC_MUTATIONS is True
+                    or connection.settings_dict.get("ATOMIC_MUTATIONS", False) is True
+                )
+            ):
+                with transaction.atomic():
+                    result = execute(schema, document.ast, **execute_options)
+                    if getattr(request, MUTATION_ERRORS_FLAG, False) is True:
+                        transaction.set_rollback(True)
+                return result
+
+            return execute(schema, document.ast, **execute_options)
+        except Exception as e:
+            return ExecutionResult(errors=[e])
+
+    def json_encode(self, request, d, pretty=False):
+        cost = getattr(request, "crm_query_cost", None)
+        if cost is not None and getattr(settings, "CRM_QUERY_COST_EXTENSIONS", True):
+            d = {**d, "extensions": {**d.get("extensions", {}), "cost": cost}}
+        profile = get_profile(request)
+        if profile is None:
+            return super().json_encode(request, d, pretty)
+        started = time.perf_counter()
+        body = super().json_encode(request, d, pretty)
+        profile.serialization += time.perf_counter() - started
+        if not getattr(settings, "CRM_PROFILING_EXTENSIONS", False) or not body.endswith("}"):
+            return body
+        if "extensions" in d:
+            extensions = {**d["extensions"], "profile": profile.as_dict()}
+            return super().json_encode(request, {**d, "extensions": extensions}, pretty)
+        # Splice the block in rather than encoding the whole response again.
+        extensions = json.dumps({"profile": profile.as_dict()})
+        separator = "," if d else ""
+        return f'{body[:-1]}{separator}"extensions":{extensions}}}'
+
+
+class AsyncCRMGraphQLView(CRMGraphQLView):
+    """
+    CRMGraphQLView as an async view, for ``/graphql`` served through ASGI
+    (``CRM_GRAPHQL_ASYNC``).
+
+    No thread is held while the request body is read or the response is
+    written, and the top-level fields of a query resolve concurrently
+    (crm.async_execution). The cache lookup, validation and encoding run on
+    the request's sync thread, mutations too, serially and in their
+    transaction.
+    """
+
+    view_is_async = True
+    execution_context_class = ConcurrentExecutionContext
+
+    @method_decorator(ensure_csrf_cookie)
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            if request.method.lower() not in ("get", "post"):
+                raise HttpError(
+                    HttpResponseNotAllowed(
+                        ["GET", "POST"], "GraphQL only supports GET and POST requests."
+                    )
+                )
+            data = self.parse_body(request)
+            if self.graphiql and self.can_display_graphiql(request, data):
+                return await sync_to_async(super().dispatch)(request, *args, **kwargs)
+
+            if self.batch:
+                responses = [await self.get_response_async(request, entry) for entry in data]
+                result = "[{}]".format(",".join([response[0] for response in responses]))
+                status_code = (
+                    responses and max(responses, key=lambda response: response[1])[1] or 200
+                )
+            else:
+                result, status_code = await self.get_response_async(request, data)
+            response = HttpResponse(status=status_code, content=result, content_type="application/json")
+        except HttpError as e:
+            response = e.response
+            response["Content-Type"] = "application/json"
+            response.content = self.json_encode(request, {"errors": [self.format_error(e)]})
+        return self.mark_cache_status(request, response)
+
+    async def get_response_async(self, request, data):
+        key, id, body, prepared = await run_in_request_thread(
+            request, self.prepare_response, request, data
+        )
+        if body is not None:
+            return body, 200
+        if prepared is None or isinstance(prepared, ExecutionResult):
+            result = prepared
+        else:
+            result = await self.execute_prepared_async(request, *prepared)
+        return await run_in_request_thread(
+            request, self.encode_response, request, result, id, key, False
+        )
+
+    def prepare_response(self, request, data):
+        """(cache key, id, cached body, prepare_execution() result)."""
+        params, key, body = self.lookup_response(request, data, False)
+        if body is not None:
+            return key, None, body, None
+        query, variables, operation_name, id = params
+        return key, id, None, self.prepare_execution(request, query, variables, operation_name, False)
+
+    async def execute_prepared_async(self, request, schema, document, operation_ast, execute_options):
+        if operation_ast is None or operation_ast.operation != OperationType.QUERY:
+            return await run_in_request_thread(
+                request, self.execute_prepared, request, schema, document, operation_ast, execute_options
+            )
+        try:
+            # Only top-level fields are resolved, each on a worker thread.
+            result = execute(schema, document.ast, **execute_options)
+            if isawaitable(result):
+                result = await result
+            return result
+        except Exception as e:
+            return ExecutionResult(errors=[e])
+
+
+@require_GET
+def response_cache_stats(request):
+    """Hit and miss counts of the GraphQL response cache (staff only)."""
+    if not request.user.is_staff:
+        return JsonResponse({"error": "Permission denied."}, status=403)
+    return JsonResponse(response_cache.stats())
+
+
+def _non_negative_int(request, name, default):
+    value = request.GET.get(name)
+    if value is None:
+        return default
+    if not value.isdigit():
+        raise ValueError(f"{name} must be a non-negative integer.")
+    return int(value)
+
+
+@require_POST
+def import_data(request, model):
+    """
+    Stream an NDJSON or CSV request body into the customers or products table.
+
+    Query parameters: ``format`` (``ndjson`` or ``csv``; defaults from the
+    content type), ``batch_size`` and ``skip`` (rows already imported, to
+    resume an interrupted upload). Authorization comes from the session, so
+    the CSRF token is required. The body is read line by line and never
+    held in memory. The response is NDJSON: one progress line per committed
+    batch, then a final summary with the first row errors. If a transfer
+    breaks, the last ``rows`` received is the ``skip`` to resume with.
+    """
+    if model not in IMPORTERS:
+        raise Http404(f"Unknown import '{model}'.")
+    importer = IMPORTERS[model]()
+    if not request.user.has_perm(f"crm.add_{importer.model._meta.model_name}"):
+        return JsonResponse({"error": "Permission denied."}, status=403)
+
+    format = request.GET.get("format") or ("csv" if "csv" in request.content_type else "ndjson")
+    try:
+        if format not in FORMATS:
+            raise ValueError(f"format must be one of: {', '.join(FORMATS)}.")
+        batch_size = _non_negative_int(
+            request, "batch_size", getattr(settings, "CRM_IMPORT_BATCH_SIZE", 1000)
+        )
+        skip = _non_negative_int(request, "skip", 0)
+        if batch_size == 0:
+            raise ValueError("batch_size must be positive.")
+    except ValueError as error:
+        return JsonResponse({"error": str(error)}, status=400)
+
+    def progress():
+        records = read_records(request, format)
+        result = None
+        for result in import_batches(importer, records, batch_size, skip=skip):
+            line = {"rows": result.rows, "imported": result.imported, "error_count": result.error_count}
+            yield json.dumps(line) + "\n"
+        yield json.dumps({**result.as_dict(), "done": True}) + "\n"
+
+    return StreamingHttpResponse(progress(), content_type="application/x-ndjson")
+
+
+@require_GET
+def export_data(request, model):
+    """
+    Stream customers, products or orders as CSV or NDJSON.
+
+    Filters are the FilterSet names used by the GraphQL connections, e.g.
+    ``/crm/export/orders?order_date__gte=2025-01-01&customer_name=ann``;
+    list filters are repeated (``product_ids_any=1&product_ids_any=2``).
+    Also takes ``format`` (``csv`` or ``ndjson``) and ``chunk_size``.
+    Rows are read with a server-side cursor and written a chunk at a time.
+    """
+    if model not in exporters.EXPORTERS:
+        raise Http404(f"Unknown export '{model}'.")
+    exporter = exporters.EXPORTERS[model]()
+    if not request.user.has_perm(f"crm.view_{exporter.model._meta.model_name}"):
+        return JsonResponse({"error": "Permission denied."}, status=403)
+
+    format = request.GET.get("format", "csv")
+    try:
+        if format not in exporters.FORMATS:
+            raise ValueError(f"format must be one of: {', '.join(exporters.FORMATS)}.")
+        chunk_size = _non_negative_int(
+            request, "chunk_size", getattr(settings, "CRM_EXPORT_CHUNK_SIZE", 2000)
+        )
+        if chunk_size == 0:
+            raise ValueError("chunk_size must be positive.")
+    except ValueError as error:
+        return JsonResponse({"error": str(error)}, status=400)
+
+    data = {}
+    for name, filter in exporter.filterset_class.base_filters.items():
+        if name in request.GET:
+            data[name] = (
+                request.GET.getlist(name) if isinstance(filter, ListFilter) else request.GET[name]
+            )
+    filterset = exporter.filterset_class(data, queryset=exporter.get_queryset())
+    if not filterset.is_valid():
+        return JsonResponse({"errors": filterset.errors}, status=400)
+
+    content_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    response = StreamingHttpResponse(
+        exporters.stream_rows(exporter, filterset.qs, format, chunk_size),
+        content_type=content_type,
+    )
+    response["Content-Disposition"] = f'attachment; filename="{model}.{format}"'
+    return response